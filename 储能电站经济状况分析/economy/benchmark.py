@@ -0,0 +1,270 @@
+"""
+economy.py 计算引擎的性能基准。
+
+对一组代表性项目参数(无债务、等额本息、等额本金、双倍余额递减折旧 × 10/20/30年寿命)
+分别测量现金流量表、财务指标、敏感性分析与蒙特卡洛模拟(1k/10k/100k次)的耗时与峰值内存,
+结果以JSON输出, 可用 --compare 与另一个版本的结果逐项对比。
+
+用法:
+    uv run benchmark.py --output results.json
+    uv run benchmark.py --quick --fixtures no_debt_20y --draws 1000 10000
+    uv run benchmark.py --output new.json --compare old.json --fail-threshold 1.2
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+import economy
+
+BENCHMARK_SCHEMA_VERSION = 1
+DEFAULT_DRAWS = (1000, 10000, 100000)
+DEFAULT_LIFESPANS = (10, 20, 30)
+
+# 与 README 中参数配置示例一致的基准项目, 各夹具在此基础上修改融资与折旧设置
+_BASE_PARAMETERS = {
+    "project_info": {"name": "基准测试项目", "location": "江苏", "project_type": "电网侧储能"},
+    "cost_structure": {
+        "total_investment_usd": 20000000,
+        "battery_replacement_cost_usd": 8000000,
+        "battery_replacement_year": 8,
+        "annual_opex_rate_of_investment": 0.01,
+        "annual_land_lease_usd": 50000,
+        "annual_insurance_rate_of_investment": 0.005,
+        "investment_tax_credit_rate": 0.10
+    },
+    "technical_specs": {
+        "capacity_mwh": 40,
+        "max_power_mw": 20,
+        "round_trip_efficiency": 0.90,
+        "depth_of_discharge_dod": 0.90,
+        "cycle_life": 8000,
+        "lifespan_years": 15,
+        "annual_efficiency_degradation": 0.015
+    },
+    "market_and_policy": {
+        "peak_valley_price_diff_usd_per_kwh": 0.11,
+        "capacity_price_usd_per_mw_year": 20000,
+        "ancillary_service_revenue_usd_per_mw_year": 45000,
+        "subsidy_per_kwh_discharged_usd": 0.005,
+        "demand_response": {"is_participant": True, "demand_charge_usd_per_kw_month": 5, "peak_load_reduction_kw": 1000},
+        "grid_deferral": {"is_applicable": False, "deferred_investment_usd": 5000000, "deferral_period_years": 5}
+    },
+    "financial_assumptions": {
+        "discount_rate": 0.08,
+        "equity_discount_rate": 0.10,
+        "charge_cycles_per_day": 1.5,
+        "vat_rate": 0.13,
+        "income_tax_rate": 0.25,
+        "depreciation_method": "straight_line",
+        "financing": {"debt_ratio": 0.70, "loan_interest_rate": 0.06, "loan_term_years": 10,
+                      "repayment_type": "equal_installment"},
+        "monte_carlo": {
+            "seed": 20240801,
+            "workers": 1,
+            "peak_valley_price_diff": {"mean": 0.11, "std_dev": 0.02},
+            "initial_investment": {"mean": 20000000, "std_dev": 1500000},
+            "debt_ratio": {"mean": 0.70, "std_dev": 0.05}
+        }
+    }
+}
+
+def _no_debt(params: Dict[str, Any]) -> None:
+    params['financial_assumptions']['financing']['debt_ratio'] = 0
+    params['financial_assumptions']['monte_carlo'].pop('debt_ratio')
+
+def _equal_installment(params: Dict[str, Any]) -> None:
+    params['financial_assumptions']['financing']['repayment_type'] = 'equal_installment'
+
+def _equal_principal(params: Dict[str, Any]) -> None:
+    params['financial_assumptions']['financing']['repayment_type'] = 'equal_principal'
+
+def _double_declining(params: Dict[str, Any]) -> None:
+    params['financial_assumptions']['depreciation_method'] = 'double_declining'
+
+# 夹具结构: 名称前缀 -> 对基准项目的修改
+_FIXTURE_STRUCTURES = {
+    "no_debt": _no_debt,
+    "equal_installment": _equal_installment,
+    "equal_principal": _equal_principal,
+    "double_declining": _double_declining
+}
+
+def build_fixtures(lifespans=DEFAULT_LIFESPANS) -> Dict[str, Dict[str, Any]]:
+    """按 结构 × 寿命 生成基准测试项目, 名称如 equal_principal_20y"""
+    fixtures = {}
+    for structure, apply in _FIXTURE_STRUCTURES.items():
+        for lifespan in lifespans:
+            params = copy.deepcopy(_BASE_PARAMETERS)
+            apply(params)
+            params['technical_specs']['lifespan_years'] = lifespan
+            # 贷款期限不超过寿命, 电池更换放在寿命中点附近
+            params['financial_assumptions']['financing']['loan_term_years'] = min(10, lifespan)
+            params['cost_structure']['battery_replacement_year'] = max(1, lifespan // 2)
+            fixtures[f"{structure}_{lifespan}y"] = params
+    return fixtures
+
+def _stage_functions(params: Dict[str, Any], draws: List[int]) -> Dict[str, Callable[[], Any]]:
+    """各测量阶段: 直接调用计算函数, 不经过结果缓存与调度器"""
+    statement = economy._generate_dynamic_yearly_cashflow_statement(params)
+    stages = {
+        "statement": lambda: economy._generate_dynamic_yearly_cashflow_statement(params),
+        "metrics": lambda: economy._calculate_financial_metrics_v3(params, *statement),
+        "sensitivity": lambda: economy._perform_expanded_sensitivity_analysis(params)
+    }
+    for num_draws in draws:
+        stages[f"monte_carlo_{num_draws}"] = (
+            lambda num_draws=num_draws: economy._perform_monte_carlo_simulation(params, num_draws)
+        )
+    return stages
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    预热一次后计时 repeat 次; 峰值内存在单独一次 tracemalloc 运行中测量, 不影响计时结果。
+    峰值内存为该次运行期间新增分配的峰值 (numpy 数组内存同样计入)。
+    """
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_time_s": {
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.fmean(timings),
+            "max": max(timings)
+        },
+        "peak_memory_bytes": max(peak - baseline, 0)
+    }
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "git_revision": _git_revision()
+    }
+
+def run_benchmarks(fixture_names: List[str], draws: List[int], repeat: int, mc_repeat: int, lifespans=DEFAULT_LIFESPANS) -> Dict[str, Any]:
+    """运行全部夹具与阶段, 返回可直接序列化为JSON的结果"""
+    fixtures = build_fixtures(lifespans)
+    unknown = [name for name in fixture_names if name not in fixtures]
+    if unknown:
+        raise SystemExit(f"未知的夹具: {', '.join(unknown)}; 可选 {', '.join(fixtures)}")
+
+    results = []
+    for name in fixture_names:
+        params = fixtures[name]
+        for stage, func in _stage_functions(params, draws).items():
+            is_monte_carlo = stage.startswith('monte_carlo_')
+            measurement = measure(func, mc_repeat if is_monte_carlo else repeat)
+            results.append({
+                "fixture": name,
+                "stage": stage,
+                "lifespan_years": params['technical_specs']['lifespan_years'],
+                "draws": int(stage.rsplit('_', 1)[1]) if is_monte_carlo else None,
+                "repeat": mc_repeat if is_monte_carlo else repeat,
+                **measurement
+            })
+            print(f"{name:<24} {stage:<20} median {measurement['wall_time_s']['median'] * 1000:>10.2f} ms"
+                  f"  peak {measurement['peak_memory_bytes'] / 2**20:>8.2f} MiB", file=sys.stderr)
+
+    return {
+        "schema_version": BENCHMARK_SCHEMA_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        "environment": _environment(),
+        "settings": {"fixtures": fixture_names, "draws": draws, "repeat": repeat, "monte_carlo_repeat": mc_repeat},
+        "results": results
+    }
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], fail_threshold: float = None) -> bool:
+    """
+    按 (夹具, 阶段) 对比两次结果的中位耗时与峰值内存, 打印比值 (当前/基线)。
+    给定 fail_threshold 时, 任一中位耗时比值超过阈值即视为性能回退, 返回False。
+    """
+    baseline_index = {(item['fixture'], item['stage']): item for item in baseline['results']}
+    passed = True
+    print(f"{'fixture':<24} {'stage':<20} {'time ratio':>10} {'memory ratio':>13}", file=sys.stderr)
+    for item in current['results']:
+        reference = baseline_index.get((item['fixture'], item['stage']))
+        if reference is None:
+            continue
+        time_ratio = item['wall_time_s']['median'] / reference['wall_time_s']['median']
+        memory_ratio = (item['peak_memory_bytes'] / reference['peak_memory_bytes']
+                        if reference['peak_memory_bytes'] else float('nan'))
+        regressed = fail_threshold is not None and time_ratio > fail_threshold
+        passed = passed and not regressed
+        print(f"{item['fixture']:<24} {item['stage']:<20} {time_ratio:>10.2f} {memory_ratio:>13.2f}"
+              f"{'  <- 回退' if regressed else ''}", file=sys.stderr)
+    return passed
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="economy.py 计算引擎性能基准")
+    parser.add_argument('--fixtures', nargs='+', help="只运行指定夹具, 默认全部 (如 no_debt_20y equal_principal_30y)")
+    parser.add_argument('--draws', nargs='+', type=int, default=list(DEFAULT_DRAWS), help="蒙特卡洛模拟次数, 默认 1000 10000 100000")
+    parser.add_argument('--repeat', type=int, default=5, help="现金流量表/指标/敏感性阶段的计时次数, 默认5")
+    parser.add_argument('--mc-repeat', type=int, default=3, help="蒙特卡洛阶段的计时次数, 默认3")
+    parser.add_argument('--quick', action='store_true', help="快速模式: 只测 1000/10000 次模拟, 各阶段计时1次")
+    parser.add_argument('--output', help="结果JSON的输出路径, 默认打印到标准输出")
+    parser.add_argument('--compare', help="与之对比的基线结果JSON")
+    parser.add_argument('--fail-threshold', type=float, help="与基线对比时中位耗时比值的上限, 超过则以非零状态退出")
+    args = parser.parse_args(argv)
+
+    draws = args.draws
+    repeat, mc_repeat = args.repeat, args.mc_repeat
+    if args.quick:
+        draws = [n for n in draws if n <= 10000] or [1000]
+        repeat = mc_repeat = 1
+
+    fixture_names = args.fixtures or list(build_fixtures())
+    results = run_benchmarks(fixture_names, draws, repeat, mc_repeat)
+
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare_results(results, baseline, args.fail_threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,309 +1,1102 @@
-import copy
-import pandas as pd
+import asyncio
+import cProfile
+import hashlib
+import importlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import repeat
+from statistics import NormalDist
+from dataclasses import asdict, dataclass, fields, is_dataclass, replace
 import numpy as np
-import numpy_financial as npf 
-from typing import Any, Dict, Union
-from mcp.server.fastmcp import FastMCP
+from typing import Any, Dict, Iterator, List, Optional, Union
+from mcp.server.fastmcp import Context, FastMCP
 from typing_extensions import Tuple
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块, 不报告内存高水位
+    resource = None
+
+# --- 启动: pandas 与 numpy_financial 延迟导入, MCP initialize 无需等待重量级依赖 ---
+
+# 延迟导入的依赖: 模块全局名 -> 模块名
+_LAZY_MODULES = {'pd': 'pandas', 'npf': 'numpy_financial'}
+
+class _LazyModule:
+    """
+    (新增) 延迟导入的模块代理: 首次访问属性时导入真实模块, 并将模块全局名替换为真实模块,
+    此后的访问不再经过代理。类型注解在定义时求值, 引用这些模块的注解需写成字符串。
+    """
+
+    def __init__(self, alias: str):
+        self._alias = alias
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(_import_lazy_module(self._alias), attr)
+
+def _import_lazy_module(alias: str) -> Any:
+    """(新增) 导入延迟依赖并替换模块全局名; 重复调用只是一次 sys.modules 查找"""
+    module = importlib.import_module(_LAZY_MODULES[alias])
+    globals()[alias] = module
+    return module
+
+def _warm_up_lazy_modules() -> None:
+    """(新增) 服务启动后在后台线程中预先导入延迟依赖, 使首个工具调用通常无需等待导入"""
+    for alias in _LAZY_MODULES:
+        _import_lazy_module(alias)
+
+pd = _LazyModule('pd')
+npf = _LazyModule('npf')
 
 mcp = FastMCP("economy")
 
-def _calculate_demand_response_revenue(params: Dict[str, Any]) -> float:
+# --- 参数模型: 请求时一次性编译并校验项目参数 ---
+
+# 数值参数既可以是标量, 也可以是情景列向量 (向量化内核按情景覆盖)
+ScenarioValue = Union[float, np.ndarray]
+
+class ParameterValidationError(ValueError):
+    """(新增) 项目参数校验失败, problems 列出全部问题而不是只报告第一个"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("; ".join(problems))
+
+@dataclass(frozen=True, slots=True)
+class TechnicalSpecs:
+    capacity_mwh: ScenarioValue
+    max_power_mw: ScenarioValue
+    round_trip_efficiency: ScenarioValue
+    depth_of_discharge_dod: ScenarioValue
+    lifespan_years: int
+    annual_efficiency_degradation: ScenarioValue = 0.0
+
+@dataclass(frozen=True, slots=True)
+class CostStructure:
+    total_investment_usd: ScenarioValue
+    annual_opex_rate_of_investment: ScenarioValue
+    annual_land_lease_usd: ScenarioValue = 0.0
+    annual_insurance_rate_of_investment: ScenarioValue = 0.0
+    investment_tax_credit_rate: ScenarioValue = 0.0
+    battery_replacement_cost_usd: ScenarioValue = 0.0
+    battery_replacement_year: Optional[int] = None
+
+@dataclass(frozen=True, slots=True)
+class DemandResponse:
+    is_participant: bool = False
+    demand_charge_usd_per_kw_month: ScenarioValue = 0.0
+    peak_load_reduction_kw: ScenarioValue = 0.0
+
+@dataclass(frozen=True, slots=True)
+class GridDeferral:
+    is_applicable: bool = False
+    deferred_investment_usd: ScenarioValue = 0.0
+    deferral_period_years: ScenarioValue = 1.0
+
+@dataclass(frozen=True, slots=True)
+class MarketAndPolicy:
+    demand_response: DemandResponse
+    grid_deferral: GridDeferral
+    peak_valley_price_diff_usd_per_kwh: Optional[ScenarioValue] = None
+    capacity_price_usd_per_mw_year: ScenarioValue = 0.0
+    ancillary_service_revenue_usd_per_mw_year: ScenarioValue = 0.0
+    subsidy_per_kwh_discharged_usd: ScenarioValue = 0.0
+    price_curve: Optional[Dict[str, Any]] = None
+
+@dataclass(frozen=True, slots=True)
+class Financing:
+    debt_ratio: ScenarioValue = 0.0
+    loan_interest_rate: ScenarioValue = 0.0
+    loan_term_years: int = 1
+    repayment_type: str = 'equal_installment'
+
+@dataclass(frozen=True, slots=True)
+class FinancialAssumptions:
+    discount_rate: ScenarioValue
+    charge_cycles_per_day: ScenarioValue
+    financing: Financing
+    # 未配置时为 None, 取 折现率 + 2%, 随折现率的情景取值变化
+    equity_discount_rate: Optional[ScenarioValue] = None
+    vat_rate: ScenarioValue = 0.13
+    income_tax_rate: ScenarioValue = 0.25
+    degradation_cost_per_kwh: ScenarioValue = 0.05
+    depreciation_method: str = 'straight_line'
+
+    @property
+    def resolved_equity_discount_rate(self) -> ScenarioValue:
+        if self.equity_discount_rate is None:
+            return self.discount_rate + 0.02
+        return self.equity_discount_rate
+
+@dataclass(frozen=True, slots=True)
+class ProjectModel:
+    """(新增) 编译后的项目参数: 已校验并补全默认值, 字段名与参数字典的键一致, 参数路径可直接定位字段"""
+    technical_specs: TechnicalSpecs
+    cost_structure: CostStructure
+    market_and_policy: MarketAndPolicy
+    financial_assumptions: FinancialAssumptions
+
+_DEPRECIATION_METHODS = ('straight_line', 'double_declining')
+_REPAYMENT_TYPES = ('equal_installment', 'equal_principal')
+_REQUIRED = object()
+
+# 数值参数的取值范围 (下限, 上限, 是否不含下限), 编译项目参数与校验情景覆盖值共用; 未列出的参数不限范围
+_MODEL_VALUE_BOUNDS = {
+    ('technical_specs', 'capacity_mwh'): (0, None, True),
+    ('technical_specs', 'max_power_mw'): (0, None, True),
+    ('technical_specs', 'round_trip_efficiency'): (0, 1, True),
+    ('technical_specs', 'depth_of_discharge_dod'): (0, 1, True),
+    ('technical_specs', 'lifespan_years'): (1, None, False),
+    ('technical_specs', 'annual_efficiency_degradation'): (0, 1, False),
+    ('cost_structure', 'total_investment_usd'): (0, None, False),
+    ('cost_structure', 'annual_opex_rate_of_investment'): (0, None, False),
+    ('cost_structure', 'annual_land_lease_usd'): (0, None, False),
+    ('cost_structure', 'annual_insurance_rate_of_investment'): (0, None, False),
+    ('cost_structure', 'investment_tax_credit_rate'): (0, 1, False),
+    ('cost_structure', 'battery_replacement_cost_usd'): (0, None, False),
+    ('cost_structure', 'battery_replacement_year'): (1, None, False),
+    ('market_and_policy', 'demand_response', 'demand_charge_usd_per_kw_month'): (0, None, False),
+    ('market_and_policy', 'demand_response', 'peak_load_reduction_kw'): (0, None, False),
+    ('market_and_policy', 'grid_deferral', 'deferred_investment_usd'): (0, None, False),
+    ('market_and_policy', 'grid_deferral', 'deferral_period_years'): (0, None, False),
+    ('market_and_policy', 'capacity_price_usd_per_mw_year'): (0, None, False),
+    ('market_and_policy', 'ancillary_service_revenue_usd_per_mw_year'): (0, None, False),
+    ('market_and_policy', 'subsidy_per_kwh_discharged_usd'): (0, None, False),
+    ('financial_assumptions', 'discount_rate'): (-1, None, True),
+    ('financial_assumptions', 'equity_discount_rate'): (-1, None, True),
+    ('financial_assumptions', 'charge_cycles_per_day'): (0, None, False),
+    ('financial_assumptions', 'vat_rate'): (0, None, False),
+    ('financial_assumptions', 'income_tax_rate'): (0, 1, False),
+    ('financial_assumptions', 'degradation_cost_per_kwh'): (0, None, False),
+    ('financial_assumptions', 'financing', 'debt_ratio'): (0, 1, False),
+    ('financial_assumptions', 'financing', 'loan_interest_rate'): (0, None, False),
+    ('financial_assumptions', 'financing', 'loan_term_years'): (1, None, False)
+}
+
+class _MissingBlock(dict):
+    """缺失的参数块: 已报告过一次, 其中的字段不再逐个报告缺失"""
+
+class _ParameterReader:
+    """(新增) 按参数块读取并校验取值, 收集全部问题后统一报告"""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self.problems = []
+
+    def block(self, *path: str, required: bool = True) -> Dict[str, Any]:
+        current_level = self.params
+        for key in path:
+            if not isinstance(current_level, dict) or key not in current_level:
+                if required:
+                    self.problems.append(f"缺少参数块 {'.'.join(path)}")
+                    return _MissingBlock()
+                return {}
+            current_level = current_level[key]
+        if not isinstance(current_level, dict):
+            self.problems.append(f"{'.'.join(path)} 必须为字典")
+            return _MissingBlock()
+        return current_level
+
+    def number(
+        self,
+        block: Dict[str, Any],
+        path: Tuple[str, ...],
+        default: Any = _REQUIRED,
+        integer: bool = False
+    ) -> Any:
+        """读取数值字段; 缺失时取默认值, 类型或超出 _MODEL_VALUE_BOUNDS 的范围时记录问题并返回默认值 (无默认值时返回NaN)"""
+        name = '.'.join(path)
+        minimum, maximum, exclusive_minimum = _MODEL_VALUE_BOUNDS.get(path, (None, None, False))
+        fallback = default if default is not _REQUIRED else math.nan
+        if path[-1] not in block or block[path[-1]] is None:
+            if default is _REQUIRED and not isinstance(block, _MissingBlock):
+                self.problems.append(f"缺少必填参数 {name}")
+            return fallback
+
+        value = block[path[-1]]
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.number)) or not math.isfinite(value):
+            self.problems.append(f"{name} 必须为有限数值, 当前为 {value!r}")
+            return fallback
+        if integer and float(value) != int(value):
+            self.problems.append(f"{name} 必须为整数, 当前为 {value!r}")
+            return fallback
+        too_small = minimum is not None and (value <= minimum if exclusive_minimum else value < minimum)
+        too_large = maximum is not None and value > maximum
+        if too_small or too_large:
+            lower = f"{'(' if exclusive_minimum else '['}{minimum if minimum is not None else '-∞'}"
+            upper = f"{maximum}]" if maximum is not None else "+∞)"
+            self.problems.append(f"{name} 必须在 {lower}, {upper} 范围内, 当前为 {value!r}")
+            return fallback
+        if integer:
+            return int(value)
+        # 保留整数/浮点的原始类型, 报告中的数值格式与输入一致
+        return float(value) if isinstance(value, np.number) else value
+
+    def choice(self, block: Dict[str, Any], path: Tuple[str, ...], default: str, options: Tuple[str, ...]) -> str:
+        value = block.get(path[-1], default)
+        if value not in options:
+            self.problems.append(f"{'.'.join(path)} 必须为 {', '.join(options)} 之一, 当前为 {value!r}")
+            return default
+        return value
+
+def _compile_project_parameters(params: Dict[str, Any]) -> ProjectModel:
+    """
+    (新增) 将项目参数字典编译为已校验、补全默认值的 ProjectModel。
+    所有缺失字段、类型与取值范围问题一次性收集, 以 ParameterValidationError 在请求入口处报告。
+    """
+    reader = _ParameterReader(params)
+    number = reader.number
+    T, C, M, F = 'technical_specs', 'cost_structure', 'market_and_policy', 'financial_assumptions'
+
+    tech = reader.block(T)
+    technical_specs = TechnicalSpecs(
+        capacity_mwh=number(tech, (T, 'capacity_mwh')),
+        max_power_mw=number(tech, (T, 'max_power_mw')),
+        round_trip_efficiency=number(tech, (T, 'round_trip_efficiency')),
+        depth_of_discharge_dod=number(tech, (T, 'depth_of_discharge_dod')),
+        lifespan_years=number(tech, (T, 'lifespan_years'), integer=True),
+        annual_efficiency_degradation=number(tech, (T, 'annual_efficiency_degradation'), 0.0)
+    )
+
+    cost = reader.block(C)
+    replacement_year = number(cost, (C, 'battery_replacement_year'), None, integer=True)
+    replacement_due = replacement_year is not None and replacement_year <= (technical_specs.lifespan_years or 0)
+    cost_structure = CostStructure(
+        total_investment_usd=number(cost, (C, 'total_investment_usd')),
+        annual_opex_rate_of_investment=number(cost, (C, 'annual_opex_rate_of_investment')),
+        annual_land_lease_usd=number(cost, (C, 'annual_land_lease_usd'), 0.0),
+        annual_insurance_rate_of_investment=number(cost, (C, 'annual_insurance_rate_of_investment'), 0.0),
+        investment_tax_credit_rate=number(cost, (C, 'investment_tax_credit_rate'), 0.0),
+        battery_replacement_cost_usd=number(cost, (C, 'battery_replacement_cost_usd'),
+                                            _REQUIRED if replacement_due else 0.0),
+        battery_replacement_year=replacement_year
+    )
+
+    market = reader.block(M)
+    demand_response = reader.block(M, 'demand_response', required=False)
+    grid_deferral = reader.block(M, 'grid_deferral', required=False)
+    price_curve = market.get('price_curve')
+    if price_curve is not None and not isinstance(price_curve, dict):
+        reader.problems.append(f"{M}.price_curve 必须为字典")
+        price_curve = None
+    market_and_policy = MarketAndPolicy(
+        demand_response=DemandResponse(
+            is_participant=bool(demand_response.get('is_participant', False)),
+            demand_charge_usd_per_kw_month=number(
+                demand_response, (M, 'demand_response', 'demand_charge_usd_per_kw_month'), 0.0),
+            peak_load_reduction_kw=number(demand_response, (M, 'demand_response', 'peak_load_reduction_kw'), 0.0)
+        ),
+        grid_deferral=GridDeferral(
+            is_applicable=bool(grid_deferral.get('is_applicable', False)),
+            deferred_investment_usd=number(grid_deferral, (M, 'grid_deferral', 'deferred_investment_usd'), 0.0),
+            deferral_period_years=number(grid_deferral, (M, 'grid_deferral', 'deferral_period_years'), 1.0)
+        ),
+        # 配置电价曲线时峰谷价差仅作为情景缩放的基准, 可以省略
+        peak_valley_price_diff_usd_per_kwh=number(market, (M, 'peak_valley_price_diff_usd_per_kwh'),
+                                                  None if price_curve is not None else _REQUIRED),
+        capacity_price_usd_per_mw_year=number(market, (M, 'capacity_price_usd_per_mw_year'), 0.0),
+        ancillary_service_revenue_usd_per_mw_year=number(
+            market, (M, 'ancillary_service_revenue_usd_per_mw_year'), 0.0),
+        subsidy_per_kwh_discharged_usd=number(market, (M, 'subsidy_per_kwh_discharged_usd'), 0.0),
+        price_curve=price_curve
+    )
+
+    finance = reader.block(F)
+    financing = reader.block(F, 'financing', required=False)
+    debt_ratio = number(financing, (F, 'financing', 'debt_ratio'), 0.0)
+    # 基准无债务但蒙特卡洛对债务比例抽样时, 情景中仍需要贷款条件
+    needs_loan = bool(debt_ratio) or 'debt_ratio' in (finance.get('monte_carlo') or {})
+    financial_assumptions = FinancialAssumptions(
+        discount_rate=number(finance, (F, 'discount_rate')),
+        charge_cycles_per_day=number(finance, (F, 'charge_cycles_per_day')),
+        financing=Financing(
+            debt_ratio=debt_ratio,
+            loan_interest_rate=number(financing, (F, 'financing', 'loan_interest_rate'),
+                                      _REQUIRED if needs_loan else 0.0),
+            loan_term_years=number(financing, (F, 'financing', 'loan_term_years'),
+                                   _REQUIRED if needs_loan else 1, integer=True),
+            repayment_type=reader.choice(financing, (F, 'financing', 'repayment_type'),
+                                         'equal_installment', _REPAYMENT_TYPES)
+        ),
+        equity_discount_rate=number(finance, (F, 'equity_discount_rate'), None),
+        vat_rate=number(finance, (F, 'vat_rate'), 0.13),
+        income_tax_rate=number(finance, (F, 'income_tax_rate'), 0.25),
+        degradation_cost_per_kwh=number(finance, (F, 'degradation_cost_per_kwh'), 0.05),
+        depreciation_method=reader.choice(finance, (F, 'depreciation_method'), 'straight_line', _DEPRECIATION_METHODS)
+    )
+
+    if reader.problems:
+        raise ParameterValidationError(reader.problems)
+    return ProjectModel(technical_specs, cost_structure, market_and_policy, financial_assumptions)
+
+def _as_project_model(params: Union[ProjectModel, Dict[str, Any]]) -> ProjectModel:
+    """(新增) 内核入口统一接受参数字典或已编译的 ProjectModel"""
+    return params if isinstance(params, ProjectModel) else _compile_project_parameters(params)
+
+def _is_vector_field(field_type: Any) -> bool:
+    return field_type in (ScenarioValue, Optional[ScenarioValue])
+
+def _collect_vector_paths(model_type: type, prefix: Tuple[str, ...] = ()) -> Tuple[Tuple[str, ...], ...]:
+    """(新增) 按字段声明顺序收集可作为情景数组覆盖的数值参数路径"""
+    paths = []
+    for item in fields(model_type):
+        if is_dataclass(item.type):
+            paths.extend(_collect_vector_paths(item.type, prefix + (item.name,)))
+        elif _is_vector_field(item.type):
+            paths.append(prefix + (item.name,))
+    return tuple(paths)
+
+# 参数向量各分量对应的参数路径; 其余字段(寿命、贷款期限、换电年份、开关与方法选择)决定现金流结构
+_MODEL_VECTOR_PATHS = _collect_vector_paths(ProjectModel)
+_MODEL_VECTOR_INDEX = {path: index for index, path in enumerate(_MODEL_VECTOR_PATHS)}
+
+def _model_value(model: ProjectModel, path: Tuple[str, ...]) -> Any:
+    """(新增) 按参数路径读取模型字段, 路径不存在时抛出KeyError"""
+    current_level = model
+    for key in path:
+        if not is_dataclass(current_level) or key not in current_level.__dataclass_fields__:
+            raise KeyError('.'.join(path))
+        current_level = getattr(current_level, key)
+    return current_level
+
+def _model_vector(model: ProjectModel) -> np.ndarray:
+    """(新增) 模型的扁平数值向量 (按 _MODEL_VECTOR_PATHS 顺序, 未配置的可选数值为NaN)"""
+    return np.array([_model_value(model, path) for path in _MODEL_VECTOR_PATHS], dtype=float)
+
+def _overrides_from_matrix(model: ProjectModel, matrix: np.ndarray) -> Dict[Tuple[str, ...], np.ndarray]:
+    """
+    (新增) 将(情景数 × 参数向量长度)的参数矩阵转换为内核的覆盖项: 只保留与模型基准值不同的列,
+    批量引擎可以直接对参数矩阵做扰动
+    """
+    base = _model_vector(model)
+    different = ~np.all((matrix == base) | (np.isnan(matrix) & np.isnan(base)), axis=0)
+    return {_MODEL_VECTOR_PATHS[index]: matrix[:, index] for index in np.flatnonzero(different)}
+
+def _replace_model_path(node: Any, path: Tuple[str, ...], value: Any) -> Any:
+    if path[0] not in node.__dataclass_fields__:
+        raise KeyError(path[0])
+    if len(path) == 1:
+        return replace(node, **{path[0]: value})
+    return replace(node, **{path[0]: _replace_model_path(getattr(node, path[0]), path[1:], value)})
+
+def _model_with_overrides(model: ProjectModel, overrides: Dict[Tuple[str, ...], np.ndarray]) -> ProjectModel:
+    """(新增) 按参数路径写入情景数组(列向量), 只重建路径上的冻结对象, 其余字段共享"""
+    for path, values in (overrides or {}).items():
+        if path not in _MODEL_VECTOR_INDEX:
+            raise ValueError(f"参数 {'.'.join(path)} 不是可按情景取值的数值参数")
+        model = _replace_model_path(model, path, np.asarray(values, dtype=float).reshape(-1, 1))
+    return model
+
+def _calculate_demand_response_revenue(model: ProjectModel) -> float:
     """(新增) 计算需求侧响应年收益 (削峰填谷)"""
-    market = params.get('market_and_policy', {})
-    dr_params = market.get('demand_response', {})
-    if not dr_params.get('is_participant', False):
+    dr_params = model.market_and_policy.demand_response
+    if not dr_params.is_participant:
         return 0.0
     
     # 收益主要来自于为大工业用户削减高峰负荷，从而降低其需量电费
-    monthly_savings = dr_params.get('demand_charge_usd_per_kw_month', 0) * dr_params.get('peak_load_reduction_kw', 0)
-    return round(monthly_savings * 12, 2)
+    monthly_savings = dr_params.demand_charge_usd_per_kw_month * dr_params.peak_load_reduction_kw
+    return np.round(monthly_savings * 12, 2)
 
-def _calculate_grid_deferral_value(params: Dict[str, Any]) -> float:
+def _calculate_grid_deferral_value(model: ProjectModel) -> float:
     """(新增) 计算延缓电网投资的年化价值"""
-    market = params.get('market_and_policy', {})
-    deferral_params = market.get('grid_deferral', {})
-    if not deferral_params.get('is_applicable', False):
+    deferral_params = model.market_and_policy.grid_deferral
+    if not deferral_params.is_applicable:
         return 0.0
 
     # 将一次性的延缓投资价值，通过资本回收系数年金化
-    deferred_investment = deferral_params.get('deferred_investment_usd', 0)
-    deferral_period = deferral_params.get('deferral_period_years', 1)
-    discount_rate = params['financial_assumptions']['discount_rate']
+    deferred_investment = deferral_params.deferred_investment_usd
+    deferral_period = deferral_params.deferral_period_years
+    discount_rate = np.asarray(model.financial_assumptions.discount_rate, dtype=float)
     
-    if discount_rate > 0:
-        # 资本回收系数 (CRF)
+    # 资本回收系数 (CRF); 折现率为0时按延缓年限平均分摊。各参数均可为情景数组
+    with np.errstate(divide='ignore', invalid='ignore'):
         crf = (discount_rate * (1 + discount_rate)**deferral_period) / ((1 + discount_rate)**deferral_period - 1)
-        annualized_value = deferred_investment * crf
-    else:
-        annualized_value = deferred_investment / deferral_period if deferral_period > 0 else 0
+        straight_line_value = np.where(np.asarray(deferral_period) > 0, np.divide(deferred_investment, deferral_period), 0)
+    annualized_value = np.where(discount_rate > 0, deferred_investment * crf, straight_line_value)
         
-    return round(annualized_value, 2)
+    return np.round(annualized_value, 2)
 
 # --- V3 细化的成本计算模块 ---
 
-def _calculate_detailed_annual_costs(params: Dict[str, Any]) -> Dict[str, float]:
+def _calculate_detailed_annual_costs(model: ProjectModel) -> Dict[str, float]:
     """(重构) 计算更详细的年度运营成本"""
-    cost = params['cost_structure']
+    cost = model.cost_structure
     
     # 基础运维成本
-    base_opex = cost['total_investment_usd'] * cost['annual_opex_rate_of_investment']
+    base_opex = cost.total_investment_usd * cost.annual_opex_rate_of_investment
     # 新增成本项
-    land_lease_cost = cost.get('annual_land_lease_usd', 0)
-    insurance_cost = cost.get('annual_insurance_rate_of_investment', 0) * cost['total_investment_usd']
+    land_lease_cost = cost.annual_land_lease_usd
+    insurance_cost = cost.annual_insurance_rate_of_investment * cost.total_investment_usd
     
     total_fixed_opex = base_opex + land_lease_cost + insurance_cost
     return {
-        "annual_base_opex_usd": round(base_opex, 2),
-        "annual_land_lease_usd": round(land_lease_cost, 2),
-        "annual_insurance_usd": round(insurance_cost, 2),
-        "total_annual_fixed_opex_usd": round(total_fixed_opex, 2)
+        "annual_base_opex_usd": np.round(base_opex, 2),
+        "annual_land_lease_usd": np.round(land_lease_cost, 2),
+        "annual_insurance_usd": np.round(insurance_cost, 2),
+        "total_annual_fixed_opex_usd": np.round(total_fixed_opex, 2)
     }
 
 # === 资本结构与融资模型 (新增) ===
 
-def _calculate_debt_service_schedule(params: Dict[str, Any], loan_amount: float) -> pd.DataFrame:
-    """计算债务还本付息表"""
-    finance = params['financial_assumptions']['financing']
-    loan_term = finance['loan_term_years']
-    interest_rate = finance['loan_interest_rate']
-    repayment_type = finance.get('repayment_type', 'equal_installment')  # equal_installment or equal_principal
-    
-    years = range(1, loan_term + 1)
-    schedule = []
-    remaining_principal = loan_amount
-    
+def _calculate_debt_service_arrays(model: ProjectModel, loan_amount: np.ndarray, num_years: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(新增) 向量化的债务还本付息计划, 返回按项目年份排列的(本金, 利息)矩阵"""
+    finance = model.financial_assumptions.financing
+    loan_term = finance.loan_term_years
+    interest_rate = np.asarray(finance.loan_interest_rate, dtype=float).reshape(-1, 1)
+    repayment_type = finance.repayment_type
+
+    loan_amount = np.asarray(loan_amount, dtype=float).reshape(-1, 1)
+    num_scenarios = max(len(loan_amount), len(interest_rate))
+    principal = np.zeros((num_scenarios, num_years))
+    interest = np.zeros((num_scenarios, num_years))
+
+    # 超出项目寿命期的还款年份不计入现金流
+    periods = np.arange(min(loan_term, num_years))
     if repayment_type == 'equal_installment':
-        # 等额本息还款
-        installment = npf.pmt(
-            rate=interest_rate,
-            nper=loan_term,
-            pv=-loan_amount
-        )
-        for year in years:
-            interest_payment = remaining_principal * interest_rate
-            principal_payment = installment - interest_payment
-            remaining_principal -= principal_payment
-            schedule.append({
-                'year': year,
-                'beginning_balance': remaining_principal + principal_payment,
-                'principal_payment': principal_payment,
-                'interest_payment': interest_payment,
-                'total_payment': principal_payment + interest_payment,
-                'ending_balance': remaining_principal
-            })
-    
+        # 等额本息: 第k年期初余额 = L(1+r)^(k-1) - A[(1+r)^(k-1) - 1]/r
+        installment = npf.pmt(rate=interest_rate, nper=loan_term, pv=-loan_amount)
+        growth = (1 + interest_rate) ** periods
+        safe_rate = np.where(interest_rate == 0, 1, interest_rate)
+        paid_factor = np.where(interest_rate == 0, periods, (growth - 1) / safe_rate)
+        beginning_balance = loan_amount * growth - installment * paid_factor
+        interest[:, :len(periods)] = beginning_balance * interest_rate
+        principal[:, :len(periods)] = installment - beginning_balance * interest_rate
     elif repayment_type == 'equal_principal':
-        # 等额本金还款
+        # 等额本金: 每年偿还固定本金, 利息按期初余额计算
         principal_payment = loan_amount / loan_term
-        for year in years:
-            interest_payment = remaining_principal * interest_rate
-            total_payment = principal_payment + interest_payment
-            remaining_principal -= principal_payment
-            schedule.append({
-                'year': year,
-                'beginning_balance': remaining_principal + principal_payment,
-                'principal_payment': principal_payment,
-                'interest_payment': interest_payment,
-                'total_payment': total_payment,
-                'ending_balance': remaining_principal
-            })
-    
-    return pd.DataFrame(schedule)
+        beginning_balance = loan_amount - principal_payment * periods
+        interest[:, :len(periods)] = beginning_balance * interest_rate
+        principal[:, :len(periods)] = principal_payment
+
+    return principal, interest
 
 # === 宏观政策与税务细节 (新增) ===
 
-def _calculate_depreciation(
-    params: Dict[str, Any], 
-    net_investment: float,
-    year: int,
-    accumulated_depreciation: float
-) -> Tuple[float, float]:
-    """计算不同折旧方法下的折旧额"""
-    finance = params['financial_assumptions']
-    depreciation_method = finance.get('depreciation_method', 'straight_line')
-    lifespan = params['technical_specs']['lifespan_years']
-    
+def _calculate_depreciation_schedule(model: ProjectModel, net_investment: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """(新增) 按年份向量化计算折旧额"""
+    depreciation_method = model.financial_assumptions.depreciation_method
+    lifespan = model.technical_specs.lifespan_years
+
     if depreciation_method == 'double_declining':
-        # 双倍余额递减法
+        # 与逐年计算一致: 每年按净投资 × 2/寿命 计提, 直至提足净投资
         rate = 2 / lifespan
-        depreciation = min(
-            net_investment * rate,
-            net_investment - accumulated_depreciation
-        )
-    else:  # 默认直线折旧法
-        depreciation = net_investment / lifespan
-        
-    return depreciation
+        depreciated_share = np.minimum(years * rate, 1) - np.minimum((years - 1) * rate, 1)
+        return net_investment * depreciated_share
+    return net_investment / lifespan * np.ones(len(years))
 
-def _apply_tax_credits(params: Dict[str, Any], initial_investment_net_vat: float) -> float:
+def _apply_tax_credits(model: ProjectModel, initial_investment_net_vat: float) -> float:
     """应用投资税收抵免(ITC)"""
-    cost = params['cost_structure']
-    itc_rate = cost.get('investment_tax_credit_rate', 0)
-    return initial_investment_net_vat * itc_rate
+    return initial_investment_net_vat * model.cost_structure.investment_tax_credit_rate
 
-# --- V3 核心：动态现金流量表与财务指标计算 (重构以包含融资和税务细节) ---
+# --- V3 批量收益率求解器 (IRR / NPV / 折现回收期) ---
+
+IRR_STATUS_UNIQUE = 0
+IRR_STATUS_NO_SOLUTION = 1
+IRR_STATUS_MULTIPLE = 2
+IRR_STATUS_NOT_CONVERGED = 3
+IRR_STATUS_LABELS = {
+    IRR_STATUS_UNIQUE: "唯一解",
+    IRR_STATUS_NO_SOLUTION: "无解 (现金流不变号或根不在搜索区间内)",
+    IRR_STATUS_MULTIPLE: "存在多个解 (取绝对值最小的解)",
+    IRR_STATUS_NOT_CONVERGED: "未收敛"
+}
+
+def _npv_on_rate_grid(cash_flows: np.ndarray, rates: np.ndarray) -> np.ndarray:
+    """(新增) 用Horner法则在一组折现率上批量计算NPV, 返回(行数 × 折现率个数)矩阵"""
+    discount = 1 / (1 + np.asarray(rates, dtype=float))
+    npv = np.repeat(cash_flows[:, -1:], len(discount), axis=1)
+    for t in range(cash_flows.shape[1] - 2, -1, -1):
+        npv = npv * discount + cash_flows[:, t:t + 1]
+    return npv
+
+def _count_sign_changes(values: np.ndarray) -> np.ndarray:
+    """(新增) 按行统计符号变化次数, 0值沿用前一个非零符号"""
+    signs = np.sign(values)
+    last_nonzero = np.where(signs != 0, np.arange(signs.shape[1]), 0)
+    np.maximum.accumulate(last_nonzero, axis=1, out=last_nonzero)
+    filled = np.take_along_axis(signs, last_nonzero, axis=1)
+    return np.count_nonzero((filled[:, 1:] != filled[:, :-1]) & (filled[:, :-1] != 0), axis=1)
 
-def _generate_dynamic_yearly_cashflow_statement(params: Dict[str, Any]) -> pd.DataFrame:
+# 唯一根不在 [lower, upper] 内时向外扩展的折现率 (依次检查, 与numpy_financial一样可解出极高或接近-100%的IRR)
+_IRR_EXTENDED_LOWER = (-0.9999, -0.999)
+_IRR_EXTENDED_UPPER = (100.0, 1e3, 1e4, 1e5, 1e6)
+
+def _first_crossing(cash_flows: np.ndarray, rates: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(新增) 在递增的折现率序列上找各行第一个NPV变号区间, 返回(是否找到, 区间下界, 区间上界)"""
+    rates = np.asarray(rates, dtype=float)
+    # 接近-100%的折现率上NPV可能溢出为无穷大, 只需要其符号
+    with np.errstate(over='ignore', invalid='ignore'):
+        npv = _npv_on_rate_grid(cash_flows, rates)
+    crossings = np.signbit(npv[:, :-1]) != np.signbit(npv[:, 1:])
+    first = crossings.argmax(axis=1)
+    return crossings.any(axis=1), rates[first], rates[first + 1]
+
+def _solve_irr_batch(
+    cash_flows: np.ndarray,
+    lower: float = -0.99,
+    upper: float = 10.0,
+    tol: float = 1e-10,
+    max_iter: int = 100
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    (重构) 生成考虑了税收、效率衰减、融资结构和税务政策的动态年度现金流量表
+    (新增) 对二维现金流矩阵的每一行求解IRR, 返回(IRR数组, 求解状态数组)。
+    现金流仅变号一次的行按笛卡尔符号法则在(-1, +∞)上有唯一根, 满足Norstrom准则的行有唯一正根
+    (在(-1, 0)上另有负根时标记为多解); 其余行先在折现率网格上扫描变号区间, 多个区间时标记为多解。
+    有多个解时与numpy_financial一致取绝对值最小的解: 分别求出最接近0的负根和非负根, 再取绝对值较小者。
+    根不在 [lower, upper] 内时依次扩展到 _IRR_EXTENDED_LOWER / _IRR_EXTENDED_UPPER。
+    定位区间后用带二分保护的牛顿法按区间收敛掩码迭代。
     """
-    tech = params['technical_specs']
-    cost = params['cost_structure']
-    finance = params['financial_assumptions']
-    
-    lifespan = tech['lifespan_years']
-    years = range(1, lifespan + 1)
-    
-    # 初始投资 (考虑增值税进项税抵扣)
-    vat_rate = finance.get('vat_rate', 0.13)
-    initial_investment_net_vat = cost['total_investment_usd'] / (1 + vat_rate)
-    
-    # 应用投资税收抵免(ITC)
-    itc_credit = _apply_tax_credits(params, initial_investment_net_vat)
-    
-    # 融资结构计算
-    financing = finance.get('financing', {})
-    debt_ratio = financing.get('debt_ratio', 0)
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    num_rows, num_periods = cash_flows.shape
+    periods = np.arange(num_periods)
+
+    irr = np.full(num_rows, np.nan)
+    status = np.full(num_rows, IRR_STATUS_NO_SOLUTION)
+    # 待求解的候选区间 (行号, 下界, 上界), 每行最多两个: 最接近0的负根和非负根
+    candidate_rows, candidate_low, candidate_high = [], [], []
+
+    # 笛卡尔符号法则: 现金流恰好变号一次 => 关于1/(1+r)的多项式恰有一个正根
+    unique_root = _count_sign_changes(cash_flows) == 1
+    unique_rows = np.flatnonzero(unique_root)
+    found, low, high = _first_crossing(cash_flows[unique_rows], [*_IRR_EXTENDED_LOWER, lower, upper, *_IRR_EXTENDED_UPPER])
+    candidate_rows.append(unique_rows[found])
+    candidate_low.append(low[found])
+    candidate_high.append(high[found])
+    status[unique_rows[found]] = IRR_STATUS_UNIQUE
+
+    # Norstrom准则: 累计现金流恰好变号一次且总和为正 => 恰有一个正根
+    cumulative = np.cumsum(cash_flows, axis=1)
+    unique_positive = ~unique_root & (_count_sign_changes(cumulative) == 1) & (cumulative[:, -1] > 0)
+    positive_rows = np.flatnonzero(unique_positive)
+    found, low, high = _first_crossing(cash_flows[positive_rows], [0.0, upper, *_IRR_EXTENDED_UPPER])
+    candidate_rows.append(positive_rows[found])
+    candidate_low.append(low[found])
+    candidate_high.append(high[found])
+    status[positive_rows[found]] = IRR_STATUS_UNIQUE
+    # 正根唯一, 但 (-1, 0) 上仍可能有负根: 从0向下扫描, 找到最接近0的变号区间即为多解, 两个根都参与取舍
+    negative_grid = np.concatenate([_IRR_EXTENDED_LOWER, np.linspace(lower, 0.0, 150)])[::-1]
+    negative_found, high, low = _first_crossing(cash_flows[positive_rows], negative_grid)
+    candidate_rows.append(positive_rows[negative_found])
+    candidate_low.append(low[negative_found])
+    candidate_high.append(high[negative_found])
+    status[positive_rows[negative_found]] = np.where(found[negative_found], IRR_STATUS_MULTIPLE, IRR_STATUS_UNIQUE)
+
+    # 其余非常规现金流: 在折现率网格上扫描全部变号区间 (网格包含0, 每个区间都不跨越0)
+    other_rows = np.flatnonzero(~unique_root & ~unique_positive)
+    if other_rows.size:
+        grid = np.unique(np.concatenate([_IRR_EXTENDED_LOWER, np.linspace(lower, 0.5, 150), [0.0],
+                                         np.geomspace(0.5, upper, 50), _IRR_EXTENDED_UPPER]))
+        with np.errstate(over='ignore', invalid='ignore'):
+            grid_npv = _npv_on_rate_grid(cash_flows[other_rows], grid)
+        crossings = np.signbit(grid_npv[:, :-1]) != np.signbit(grid_npv[:, 1:])
+        num_crossings = crossings.sum(axis=1)
+        # 最接近0的非负根区间 (第一个非负变号区间) 和负根区间 (最后一个负变号区间)
+        non_negative = crossings & (grid[:-1] >= 0)
+        negative = crossings & (grid[:-1] < 0)
+        first_non_negative = np.argmax(non_negative, axis=1)
+        last_negative = crossings.shape[1] - 1 - np.argmax(negative[:, ::-1], axis=1)
+        for side, index in ((non_negative, first_non_negative), (negative, last_negative)):
+            has_root = side.any(axis=1)
+            candidate_rows.append(other_rows[has_root])
+            candidate_low.append(grid[index[has_root]])
+            candidate_high.append(grid[index[has_root] + 1])
+        found = num_crossings > 0
+        status[other_rows[found]] = np.where(num_crossings[found] > 1, IRR_STATUS_MULTIPLE, IRR_STATUS_UNIQUE)
+
+    # 带二分保护的牛顿迭代, 每轮只计算尚未收敛的区间
+    candidate_rows = np.concatenate(candidate_rows).astype(int)
+    low, high = np.concatenate(candidate_low), np.concatenate(candidate_high)
+    roots = np.full(candidate_rows.size, np.nan)
+    active = np.arange(candidate_rows.size)
+    npv_low = np.sum(cash_flows[candidate_rows] * (1 + low[:, None]) ** -periods, axis=1)
+    rate = np.clip(0.1, low, high)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        flows = cash_flows[candidate_rows[active]]
+        discount = (1 + rate[:, None]) ** -periods
+        npv = np.sum(flows * discount, axis=1)
+        slope = -np.sum(periods * flows * discount, axis=1) / (1 + rate)
+
+        # 收缩区间: 与下界同号则替换下界, 否则替换上界
+        same_side = np.signbit(npv) == np.signbit(npv_low)
+        low = np.where(same_side, rate, low)
+        npv_low = np.where(same_side, npv, npv_low)
+        high = np.where(same_side, high, rate)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = rate - npv / slope
+        use_bisection = ~np.isfinite(newton) | (newton <= low) | (newton >= high)
+        next_rate = np.where(use_bisection, (low + high) / 2, newton)
+
+        converged = (npv == 0) | (np.abs(next_rate - rate) <= tol * (1 + np.abs(rate)))
+        roots[active[converged]] = np.where(npv == 0, rate, next_rate)[converged]
+        pending = ~converged
+        active, rate, low, high, npv_low = active[pending], next_rate[pending], low[pending], high[pending], npv_low[pending]
+
+    # 每行取绝对值最小的根; 任一候选区间未收敛时整行记为未收敛
+    order = np.lexsort((np.abs(roots), candidate_rows))
+    rows, first = np.unique(candidate_rows[order], return_index=True)
+    irr[rows] = roots[order[first]]
+    status[candidate_rows[active]] = IRR_STATUS_NOT_CONVERGED
+    irr[candidate_rows[active]] = np.nan
+    return irr, status
+
+def _solve_cashflow_returns(cash_flows: np.ndarray, discount_rate: Union[float, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    (新增) 批量计算每行现金流的NPV、IRR(含求解状态)和折现回收期。
+    第0列为期初投资, discount_rate 可为标量或与行数一致的数组。
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    periods = np.arange(cash_flows.shape[1])
+    discount_factors = (1 + np.asarray(discount_rate, dtype=float).reshape(-1, 1)) ** -periods
+    discounted = cash_flows * discount_factors
+    npv = discounted.sum(axis=1)
+
+    # 折现回收期: 累计折现现金流首次转正的年份, 年内按线性插值
+    cumulative = np.cumsum(discounted, axis=1)
+    recovered = (cumulative >= 0) & (np.arange(cash_flows.shape[1]) > 0)
+    has_payback = recovered.any(axis=1) & (cumulative[:, 0] < 0)
+    payback_year = np.argmax(recovered, axis=1)
+    previous = np.take_along_axis(cumulative, np.maximum(payback_year - 1, 0)[:, None], axis=1)[:, 0]
+    current = np.take_along_axis(discounted, payback_year[:, None], axis=1)[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discounted_payback = np.where(has_payback, payback_year - 1 - previous / current, np.nan)
+
+    irr, irr_status = _solve_irr_batch(cash_flows)
+    return {
+        "npv": npv,
+        "irr": irr,
+        "irr_status": irr_status,
+        "discounted_payback_years": discounted_payback
+    }
+
+# --- 电价曲线调度引擎: 按分时电价逐日优化充放电 ---
+
+# 已解析的日内电价曲线与各年份调度边际表的缓存容量 (进程内LRU)
+_PRICE_PROFILE_CACHE_SIZE = 8
+_DISPATCH_TABLE_CACHE_SIZE = 256
+_price_profile_cache = OrderedDict()
+_dispatch_table_cache = OrderedDict()
+_dispatch_cache_lock = threading.Lock()
+
+def _lru_get(cache: OrderedDict, key: Any) -> Any:
+    with _dispatch_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+def _lru_put(cache: OrderedDict, key: Any, value: Any, max_entries: int) -> None:
+    with _dispatch_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+def _price_curve_source_key(curve: Dict[str, Any]) -> Tuple:
+    """(新增) 电价曲线的缓存键: 内联序列按内容哈希, CSV文件按路径、大小与修改时间"""
+    interval = float(curve.get('interval_minutes', 60))
+    if 'prices_usd_per_kwh' in curve:
+        prices = np.ascontiguousarray(curve['prices_usd_per_kwh'], dtype=float)
+        return ('inline', hashlib.sha256(prices.tobytes()).hexdigest(), interval)
+    if 'file_path' in curve:
+        stat = os.stat(curve['file_path'])
+        return ('file', os.path.abspath(curve['file_path']), stat.st_size, stat.st_mtime_ns,
+                curve.get('price_column'), interval)
+    raise ValueError("price_curve 需要提供 prices_usd_per_kwh 序列或 file_path")
+
+def _load_daily_price_profiles(curve: Dict[str, Any]) -> Tuple[np.ndarray, float]:
+    """
+    (新增) 将电价时间序列整理为逐日升序电价曲线 (天数 × 日内时段数), 并返回每个时段的小时数。
+    排序后的日内曲线即调度所需的全部信息, 按曲线内容缓存, 蒙特卡洛各批次与各年份共用。
+    """
+    key = _price_curve_source_key(curve)
+    cached = _lru_get(_price_profile_cache, key)
+    if cached is not None:
+        return cached
+
+    interval_minutes = key[-1]
+    steps_per_day = 24 * 60 / interval_minutes
+    if interval_minutes <= 0 or not float(steps_per_day).is_integer():
+        raise ValueError(f"price_curve.interval_minutes 必须能整除一天的分钟数, 当前为 {interval_minutes}")
+    steps_per_day = int(steps_per_day)
+
+    if 'prices_usd_per_kwh' in curve:
+        prices = np.asarray(curve['prices_usd_per_kwh'], dtype=float)
+    else:
+        frame = pd.read_csv(curve['file_path'])
+        column = curve.get('price_column')
+        series = frame[column] if column else frame.select_dtypes('number').iloc[:, 0]
+        prices = series.to_numpy(dtype=float)
+
+    if prices.size == 0 or prices.size % steps_per_day:
+        raise ValueError(f"电价序列长度 {prices.size} 不是整天的时段数 ({steps_per_day} 个/天)")
+    if not np.all(np.isfinite(prices)):
+        raise ValueError("电价序列中存在缺失值或非数值")
+
+    profiles = np.sort(prices.reshape(-1, steps_per_day), axis=1)
+    profiles.setflags(write=False)
+    result = (profiles, interval_minutes / 60)
+    _lru_put(_price_profile_cache, key, result, _PRICE_PROFILE_CACHE_SIZE)
+    return result
+
+def _dispatch_margin_table(
+    profiles: np.ndarray,
+    profile_key: Tuple,
+    step_hours: float,
+    power_mw: float,
+    daily_throughput_mwh: float,
+    efficiency: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (新增) 给定功率、日吞吐上限与当年效率, 计算全年各"储能电量分段"的套利边际并降序排列。
+    每日以最便宜的时段充电、最贵的时段放电 (按排序配对, 不考虑日内先后顺序);
+    充电每时段存入至多 功率×时长, 放电每时段取出至多 功率×时长/效率。
+    分段边际 = 效率×放电电价 - 充电电价 (USD/kWh), 逐日随存储电量单调递减。
+    返回 (降序边际, 对应的累计 边际×电量, 累计电量), 电量单位 MWh。
+    """
+    key = (profile_key, step_hours, power_mw, daily_throughput_mwh, efficiency)
+    cached = _lru_get(_dispatch_table_cache, key)
+    if cached is not None:
+        return cached
+
+    num_steps = profiles.shape[1]
+    charge_step_mwh = power_mw * step_hours
+    daily_energy = min(daily_throughput_mwh, num_steps * charge_step_mwh)
+    if daily_energy <= 0 or efficiency <= 0:
+        table = (np.zeros(1), np.zeros(1), np.zeros(1))
+    else:
+        # 充电与放电的功率边界在存储电量轴上的断点合并为分段, 每段内买卖电价都不变
+        discharge_step_mwh = charge_step_mwh / efficiency
+        breaks = np.union1d(
+            np.arange(1, math.ceil(daily_energy / charge_step_mwh)) * charge_step_mwh,
+            np.arange(1, math.ceil(daily_energy / discharge_step_mwh)) * discharge_step_mwh
+        )
+        breaks = np.concatenate(([0.0], breaks[breaks < daily_energy], [daily_energy]))
+        midpoints = (breaks[:-1] + breaks[1:]) / 2
+        widths = np.diff(breaks)
+        buy_prices = profiles[:, (midpoints // charge_step_mwh).astype(int)]
+        sell_prices = profiles[:, num_steps - 1 - (midpoints // discharge_step_mwh).astype(int)]
+        margins = (efficiency * sell_prices - buy_prices).ravel()
+        energy = np.broadcast_to(widths, buy_prices.shape).ravel()
+
+        order = np.argsort(-margins, kind='stable')
+        margins = margins[order]
+        energy = energy[order]
+        table = (margins, np.cumsum(margins * energy), np.cumsum(energy))
+
+    for array in table:
+        array.setflags(write=False)
+    _lru_put(_dispatch_table_cache, key, table, _DISPATCH_TABLE_CACHE_SIZE)
+    return table
+
+def _price_curve_scale(base_model: ProjectModel, view: ProjectModel) -> Union[float, np.ndarray]:
+    """
+    (新增) 配置电价曲线时, 峰谷价差的情景取值 (敏感性/蒙特卡洛/目标求解) 按其相对基准值的比例缩放整条曲线
+    """
+    base = base_model.market_and_policy.peak_valley_price_diff_usd_per_kwh
+    current = view.market_and_policy.peak_valley_price_diff_usd_per_kwh
+    if base is None or current is None or base == 0:
+        return 1.0
+    return np.asarray(current, dtype=float) / base
+
+def _calculate_price_curve_arbitrage(
+    model: ProjectModel,
+    price_scale: Union[float, np.ndarray] = 1.0
+) -> Dict[str, Any]:
+    """
+    (新增) 基于分时电价曲线的套利收益, 替代单一峰谷价差的估算。
+    模型中的效率可以是逐年数组, 容量/功率/放电深度/循环次数可以是情景列向量;
+    相同(功率, 日吞吐, 效率)组合只构建一次边际表, 各情景的电价缩放与衰减成本阈值通过二分查找取累计值。
+    仅当边际高于单位电量衰减成本时才调度, 衰减成本按实际存储吞吐电量计。
+    """
+    tech = model.technical_specs
+    finance = model.financial_assumptions
+
+    price_curve = model.market_and_policy.price_curve
+    profiles, step_hours = _load_daily_price_profiles(price_curve)
+    profile_key = _price_curve_source_key(price_curve)
+    annual_days_scale = 365 / profiles.shape[0]
+
+    power, throughput, efficiency, scale, degradation = np.broadcast_arrays(
+        np.asarray(tech.max_power_mw, dtype=float),
+        np.asarray(tech.capacity_mwh * tech.depth_of_discharge_dod * finance.charge_cycles_per_day, dtype=float),
+        np.asarray(tech.round_trip_efficiency, dtype=float),
+        np.asarray(price_scale, dtype=float),
+        np.asarray(finance.degradation_cost_per_kwh, dtype=float)
+    )
+    combos, inverse = np.unique(
+        np.stack([power.ravel(), throughput.ravel(), efficiency.ravel()], axis=1), axis=0, return_inverse=True
+    )
+    inverse = inverse.ravel()
+
+    # 电价整体缩放 k 后, 边际 k·m 高于衰减成本 c 等价于 m > c/k
+    flat_scale = scale.ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thresholds = np.where(flat_scale > 0, degradation.ravel() / flat_scale, np.inf)
+
+    margin_energy = np.zeros(inverse.size)
+    stored_energy = np.zeros(inverse.size)
+    for index, (combo_power, combo_throughput, combo_efficiency) in enumerate(combos):
+        margins, cumulative_value, cumulative_energy = _dispatch_margin_table(
+            profiles, profile_key, step_hours, combo_power, combo_throughput, combo_efficiency
+        )
+        rows = np.flatnonzero(inverse == index)
+        counts = np.searchsorted(-margins, -thresholds[rows], side='left')
+        dispatched = counts > 0
+        last = np.maximum(counts - 1, 0)
+        margin_energy[rows] = np.where(dispatched, cumulative_value[last], 0.0)
+        stored_energy[rows] = np.where(dispatched, cumulative_energy[last], 0.0)
+
+    shape = power.shape
+    annual_stored_kwh = stored_energy.reshape(shape) * 1000 * annual_days_scale
+    annual_revenue = flat_scale.reshape(shape) * margin_energy.reshape(shape) * 1000 * annual_days_scale
+    return {
+        'annual_gross_revenue_usd': annual_revenue,
+        'annual_battery_degradation_cost_usd': annual_stored_kwh * degradation,
+        'annual_stored_energy_kwh': annual_stored_kwh
+    }
+
+# --- V3 向量化计算内核 (批量情景) ---
+
+def _generate_cashflow_arrays(
+    params: Union[ProjectModel, Dict[str, Any]],
+    overrides: Dict[Tuple[str, ...], np.ndarray] = None
+) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (新增) 向量化现金流内核: 一次性计算(情景数 × 年份)的全部现金流矩阵。
+    overrides 以参数路径为键、情景数组为值; 未覆盖的参数由所有情景共享。
+    返回列名与动态现金流量表一致的矩阵字典, 以及各情景的贷款金额、股权金额和ITC抵免。
+    """
+    model = _as_project_model(params)
+    view = _model_with_overrides(model, overrides)
+    num_scenarios = max((len(values) for values in overrides.values()), default=1) if overrides else 1
+
+    tech = view.technical_specs
+    cost = view.cost_structure
+    finance = view.financial_assumptions
+
+    lifespan = model.technical_specs.lifespan_years
+    years = np.arange(1, lifespan + 1)
+    shape = (num_scenarios, lifespan)
+
+    # 初始投资、ITC与融资结构 (与逐年计算口径一致)
+    initial_investment_net_vat = cost.total_investment_usd / (1 + finance.vat_rate)
+    itc_credit = _apply_tax_credits(view, initial_investment_net_vat)
+    debt_ratio = finance.financing.debt_ratio
     loan_amount = initial_investment_net_vat * debt_ratio
     equity_amount = initial_investment_net_vat - loan_amount
-    
-    # 生成债务还本付息表
-    if debt_ratio > 0:
-        debt_schedule = _calculate_debt_service_schedule(params, loan_amount)
+
+    # 效率衰减曲线一次算出, 套利与补贴收入按年份广播
+    efficiency = tech.round_trip_efficiency * (1 - tech.annual_efficiency_degradation) ** (years - 1)
+    yearly_view = replace(view, technical_specs=replace(tech, round_trip_efficiency=efficiency))
+    if view.market_and_policy.price_curve is not None:
+        arbitrage = _calculate_price_curve_arbitrage(yearly_view, _price_curve_scale(model, view))
     else:
-        debt_schedule = pd.DataFrame(columns=[
-            'year', 'beginning_balance', 'principal_payment', 
-            'interest_payment', 'total_payment', 'ending_balance'
-        ])
-    
-    # 初始化年度数据列表
-    df_data = {
-        '年份': years,
-        '峰谷套利毛收入': [], '容量电价收入': [], '辅助服务收入': [], '需求响应收入': [],
-        '电网延缓价值': [], '补贴收入': [], '年度总收入': [],
-        '固定运维成本': [], '电池衰减成本': [], '年度总运营成本': [],
-        '折旧摊销': [], '息税前利润(EBIT)': [], '可抵扣亏损累计': [],
-        '税前利润': [], '所得税': [], '税后净利润': [],
-        '电池更换成本': [], 
-        '项目自由现金流': [],
-        '债务本金偿还': [], '债务利息支付': [], 
-        '股权自由现金流': []
+        arbitrage = _calculate_peak_valley_arbitrage_v2(yearly_view)
+    subsidy = _calculate_subsidy_revenue(yearly_view)
+
+    capacity_revenue = _calculate_capacity_tariff_revenue(view)
+    ancillary_revenue = _calculate_ancillary_services_revenue(view)
+    demand_response_revenue = _calculate_demand_response_revenue(view)
+    grid_deferral_value = _calculate_grid_deferral_value(view)
+    fixed_opex = _calculate_detailed_annual_costs(view)['total_annual_fixed_opex_usd']
+
+    total_revenue = (arbitrage['annual_gross_revenue_usd'] + capacity_revenue + ancillary_revenue +
+                     demand_response_revenue + grid_deferral_value + subsidy)
+    degradation_cost = arbitrage['annual_battery_degradation_cost_usd']
+    total_opex = fixed_opex + degradation_cost
+
+    depreciation = _calculate_depreciation_schedule(view, initial_investment_net_vat, years)
+    ebit = np.broadcast_to(total_revenue - total_opex - depreciation, shape)
+
+    # 亏损结转: 累计亏损 = 累计EBIT历史峰值(不低于0) - 当前累计EBIT
+    cumulative_ebit = np.cumsum(ebit, axis=1)
+    accumulated_losses = np.maximum.accumulate(np.maximum(cumulative_ebit, 0), axis=1) - cumulative_ebit
+    prior_losses = np.concatenate([np.zeros((num_scenarios, 1)), accumulated_losses[:, :-1]], axis=1)
+    taxable_income = np.maximum(ebit - prior_losses, 0)
+
+    income_tax = np.maximum(0, taxable_income * finance.income_tax_rate)
+    net_profit = ebit - income_tax
+
+    replacement_year = cost.battery_replacement_year
+    if replacement_year in years:
+        battery_replacement_cost = np.where(years == replacement_year, cost.battery_replacement_cost_usd, 0.0)
+    else:
+        battery_replacement_cost = np.zeros(lifespan)
+    project_cashflow = net_profit + depreciation - battery_replacement_cost
+
+    if np.any(np.asarray(debt_ratio) > 0):
+        principal_payment, interest_payment = _calculate_debt_service_arrays(view, loan_amount, lifespan)
+    else:
+        principal_payment = interest_payment = np.zeros(lifespan)
+    equity_cashflow = project_cashflow - principal_payment - interest_payment
+
+    columns = {
+        '峰谷套利毛收入': arbitrage['annual_gross_revenue_usd'], '容量电价收入': capacity_revenue,
+        '辅助服务收入': ancillary_revenue, '需求响应收入': demand_response_revenue,
+        '电网延缓价值': grid_deferral_value, '补贴收入': subsidy, '年度总收入': total_revenue,
+        '固定运维成本': fixed_opex, '电池衰减成本': degradation_cost, '年度总运营成本': total_opex,
+        '折旧摊销': depreciation, '息税前利润(EBIT)': ebit, '可抵扣亏损累计': accumulated_losses,
+        '税前利润': taxable_income, '所得税': income_tax, '税后净利润': net_profit,
+        '电池更换成本': battery_replacement_cost,
+        '项目自由现金流': project_cashflow,
+        '债务本金偿还': principal_payment, '债务利息支付': interest_payment,
+        '股权自由现金流': equity_cashflow
     }
+    columns = {name: np.broadcast_to(values, shape) for name, values in columns.items()}
+    scenario_vector = lambda values: np.broadcast_to(np.ravel(values), (num_scenarios,))
+    return columns, scenario_vector(loan_amount), scenario_vector(equity_amount), scenario_vector(itc_credit)
+
+def _calculate_financial_metrics_batch(
+    params: Union[ProjectModel, Dict[str, Any]],
+    columns: Dict[str, np.ndarray],
+    loan_amount: np.ndarray,
+    equity_amount: np.ndarray,
+    itc_credit: np.ndarray,
+    overrides: Dict[Tuple[str, ...], np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """(新增) 基于现金流矩阵批量计算各情景的财务指标 (原始浮点数, 不做格式化)"""
+    view = _model_with_overrides(_as_project_model(params), overrides)
+    finance = view.financial_assumptions
+    tech = view.technical_specs
+
+    discount_rate = finance.discount_rate
+    equity_discount_rate = finance.resolved_equity_discount_rate
+
+    initial_outlay = (-equity_amount - loan_amount + itc_credit)[:, None]
+    project_cash_flows = np.hstack([initial_outlay, columns['项目自由现金流']])
+    equity_cash_flows = np.hstack([(-equity_amount + itc_credit)[:, None], columns['股权自由现金流']])
+
+    project_returns = _solve_cashflow_returns(project_cash_flows, discount_rate)
+    equity_returns = _solve_cashflow_returns(equity_cash_flows, equity_discount_rate)
+
+    # DSCR: 仅在存在还本付息的年份计算
+    debt_service = columns['债务本金偿还'] + columns['债务利息支付']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dscr = np.where(debt_service > 0, (columns['息税前利润(EBIT)'] + columns['折旧摊销']) / debt_service, np.nan)
+    min_dscr = np.fmin.reduce(dscr, axis=1)
+    avg_dscr = np.mean(dscr, axis=1)
+
+    periods = np.arange(project_cash_flows.shape[1])
+    discount_factors = (1 + np.asarray(discount_rate, dtype=float).reshape(-1, 1)) ** -periods
+    lifecycle_costs = np.hstack([initial_outlay, columns['固定运维成本'] + columns['电池更换成本']])
+    total_lifecycle_cost_pv = np.abs(np.sum(lifecycle_costs * discount_factors, axis=1))
+    annual_energy_kwh = tech.capacity_mwh * tech.depth_of_discharge_dod * 1000 * 365 * finance.charge_cycles_per_day
+    total_energy_pv = np.ravel(np.sum(annual_energy_kwh * discount_factors[:, 1:], axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lcoe = np.where(total_energy_pv > 0, total_lifecycle_cost_pv / total_energy_pv, 0.0)
+
+    return {
+        "project_npv_usd": project_returns['npv'],
+        "project_irr": project_returns['irr'],
+        "project_irr_status": project_returns['irr_status'],
+        "project_discounted_payback_years": project_returns['discounted_payback_years'],
+        "equity_npv_usd": equity_returns['npv'],
+        "equity_irr": equity_returns['irr'],
+        "equity_irr_status": equity_returns['irr_status'],
+        "equity_discounted_payback_years": equity_returns['discounted_payback_years'],
+        "min_dscr": min_dscr,
+        "avg_dscr": avg_dscr,
+        "levelized_cost_of_storage_usd_per_kwh": lcoe
+    }
+
+def _invalid_override_rows(overrides: Dict[Tuple[str, ...], np.ndarray] = None) -> np.ndarray:
+    """(新增) 按 _MODEL_VALUE_BOUNDS 逐行校验情景覆盖值, 返回取值非有限或超出范围的情景掩码"""
+    invalid = np.zeros(1, dtype=bool)
+    for path, values in (overrides or {}).items():
+        values = np.asarray(values, dtype=float)
+        minimum, maximum, exclusive_minimum = _MODEL_VALUE_BOUNDS.get(path, (None, None, False))
+        bad = ~np.isfinite(values)
+        if minimum is not None:
+            bad |= values <= minimum if exclusive_minimum else values < minimum
+        if maximum is not None:
+            bad |= values > maximum
+        invalid = invalid | bad
+    return invalid
+
+def _evaluate_scenario_batch(
+    params: Union[ProjectModel, Dict[str, Any]],
+    overrides: Dict[Tuple[str, ...], np.ndarray] = None,
+    statement_decimals: int = None
+) -> Dict[str, np.ndarray]:
+    """
+    (新增) 对一组情景覆盖值运行现金流内核并批量计算财务指标。
+    statement_decimals 不为None时, 先按现金流量表的精度对年度现金流取整, 与单项目报告的口径一致。
+    覆盖值与 ParameterValidationError 使用同一取值范围逐行校验, 不合法的情景在 invalid_scenario 掩码中标记,
+    其数值指标为NaN; 其余情景照常在同一次向量化计算中完成。
+    """
+    model = _as_project_model(params)
+    columns, loan_amount, equity_amount, itc_credit = _generate_cashflow_arrays(model, overrides)
+    if statement_decimals is not None:
+        columns = {name: np.round(values, statement_decimals) for name, values in columns.items()}
+    metrics = _calculate_financial_metrics_batch(model, columns, loan_amount, equity_amount, itc_credit, overrides)
+
+    num_rows = len(loan_amount)
+    invalid = np.broadcast_to(_invalid_override_rows(overrides), (num_rows,))
+    if invalid.any():
+        for key, values in metrics.items():
+            if np.issubdtype(values.dtype, np.floating):
+                metrics[key] = np.where(invalid, np.nan, values)
+    metrics['invalid_scenario'] = invalid
+    return metrics
+
+# --- V3 数值结果对象 ---
+
+@dataclass(slots=True)
+class FinancialMetrics:
+    """(新增) 单一情景的财务指标, 以原始浮点数在各分析阶段间传递, 仅在报告层格式化"""
+    project_npv_usd: float
+    project_irr: float
+    project_irr_status: int
+    project_discounted_payback_years: float
+    equity_npv_usd: float
+    equity_irr: float
+    equity_irr_status: int
+    equity_discounted_payback_years: float
+    min_dscr: float
+    avg_dscr: float
+    levelized_cost_of_storage_usd_per_kwh: float
+    debt_amount: float
+    equity_amount: float
+    debt_ratio: float
+    itc_credit: float
+
+# --- V3 核心：动态现金流量表与财务指标计算 (重构以包含融资和税务细节) ---
+
+def _generate_dynamic_yearly_cashflow_statement(params: Dict[str, Any]) -> 'pd.DataFrame':
+    """
+    (重构) 生成考虑了税收、效率衰减、融资结构和税务政策的动态年度现金流量表。
+    计算全部由向量化内核一次完成, 仅在输出端转换为中文列名的DataFrame。
+    """
+    columns, loan_amount, equity_amount, itc_credit = _generate_cashflow_arrays(params)
+
+    df = pd.DataFrame({name: values[0] for name, values in columns.items()}).round(2)
+    df.index = pd.RangeIndex(1, len(df) + 1, name='年份')
+    return df, float(loan_amount[0]), float(equity_amount[0]), float(itc_credit[0])
+
+def _calculate_financial_metrics_v3(params: Union[ProjectModel, Dict[str, Any]], cashflow_df: 'pd.DataFrame', 
+                                    loan_amount: float, equity_amount: float, itc_credit: float) -> FinancialMetrics:
+    """(重构) 基于动态现金流量表计算最终财务指标, 返回未格式化的数值结果"""
+    model = _as_project_model(params)
+    finance = model.financial_assumptions
+    tech = model.technical_specs
     
-    # 固定年收入与成本
-    capacity_revenue = _calculate_capacity_tariff_revenue(params)
-    ancillary_revenue = _calculate_ancillary_services_revenue(params)
-    demand_response_revenue = _calculate_demand_response_revenue(params)
-    grid_deferral_value = _calculate_grid_deferral_value(params)
-    fixed_opex = _calculate_detailed_annual_costs(params)['total_annual_fixed_opex_usd']
-    
-    # 税务相关累计变量
-    accumulated_depreciation = 0
-    accumulated_losses = 0
-    
-    for year in years:
-        # 1. 计算动态收入 (受效率衰减影响)
-        current_efficiency = tech['round_trip_efficiency'] * ((1 - tech.get('annual_efficiency_degradation', 0)) ** (year - 1))
-        
-        temp_params = copy.deepcopy(params)
-        temp_params['technical_specs']['round_trip_efficiency'] = current_efficiency
-        
-        arbitrage = _calculate_peak_valley_arbitrage_v2(temp_params) # 使用V2版套利计算
-        subsidy = _calculate_subsidy_revenue(temp_params)
-        
-        total_revenue = (arbitrage['annual_gross_revenue_usd'] + capacity_revenue + ancillary_revenue + 
-                         demand_response_revenue + grid_deferral_value + subsidy)
-        
-        # 2. 计算年度成本
-        degradation_cost = arbitrage['annual_battery_degradation_cost_usd']
-        total_opex = fixed_opex + degradation_cost
-        
-        # 3. 计算折旧 (使用选择的折旧方法)
-        depreciation = _calculate_depreciation(
-            params, 
-            initial_investment_net_vat,
-            year,
-            accumulated_depreciation
-        )
-        accumulated_depreciation += depreciation
-        
-        # 4. 计算息税前利润
-        ebit = total_revenue - total_opex - depreciation
-        
-        # 5. 处理亏损弥补 (中国税法允许5年内结转亏损)
-        if ebit < 0:
-            # 发生亏损，累计亏损增加
-            accumulated_losses += abs(ebit)
-            taxable_income = 0
-        else:
-            # 有盈利时，先用累计亏损抵扣
-            if accumulated_losses > 0:
-                deductible_loss = min(ebit, accumulated_losses)
-                taxable_income = ebit - deductible_loss
-                accumulated_losses -= deductible_loss
-            else:
-                taxable_income = ebit
-        
-        # 6. 计算所得税
-        income_tax_rate = finance.get('income_tax_rate', 0.25)
-        income_tax = max(0, taxable_income * income_tax_rate)
-        
-        # 7. 计算税后净利润
-        net_profit = ebit - income_tax
-        
-        # 8. 计算项目自由现金流
-        battery_replacement_cost = cost['battery_replacement_cost_usd'] if year == cost.get('battery_replacement_year') else 0
-        # 项目自由现金流 = 税后净利润 + 折旧摊销 - 资本性支出(电池更换)
-        project_cashflow = net_profit + depreciation - battery_replacement_cost
-        
-        # 9. 计算融资相关现金流 (债务还本付息)
-        if year <= len(debt_schedule):
-            debt_row = debt_schedule[debt_schedule['year'] == year].iloc[0]
-            principal_payment = debt_row['principal_payment']
-            interest_payment = debt_row['interest_payment']
-        else:
-            principal_payment = 0
-            interest_payment = 0
-            
-        # 10. 计算股权自由现金流
-        equity_cashflow = project_cashflow - principal_payment - interest_payment
-        
-        # 填充数据
-        df_data['峰谷套利毛收入'].append(round(arbitrage['annual_gross_revenue_usd'], 2))
-        df_data['容量电价收入'].append(capacity_revenue)
-        df_data['辅助服务收入'].append(ancillary_revenue)
-        df_data['需求响应收入'].append(demand_response_revenue)
-        df_data['电网延缓价值'].append(grid_deferral_value)
-        df_data['补贴收入'].append(subsidy)
-        df_data['年度总收入'].append(round(total_revenue, 2))
-        df_data['固定运维成本'].append(fixed_opex)
-        df_data['电池衰减成本'].append(round(degradation_cost, 2))
-        df_data['年度总运营成本'].append(round(total_opex, 2))
-        df_data['折旧摊销'].append(round(depreciation, 2))
-        df_data['息税前利润(EBIT)'].append(round(ebit, 2))
-        df_data['可抵扣亏损累计'].append(round(accumulated_losses, 2))
-        df_data['税前利润'].append(round(taxable_income, 2))
-        df_data['所得税'].append(round(income_tax, 2))
-        df_data['税后净利润'].append(round(net_profit, 2))
-        df_data['电池更换成本'].append(battery_replacement_cost)
-        df_data['项目自由现金流'].append(round(project_cashflow, 2))
-        df_data['债务本金偿还'].append(round(principal_payment, 2))
-        df_data['债务利息支付'].append(round(interest_payment, 2))
-        df_data['股权自由现金流'].append(round(equity_cashflow, 2))
-
-    df = pd.DataFrame(df_data)
-    df.set_index('年份', inplace=True)
-    return df, loan_amount, equity_amount, itc_credit
-
-def _calculate_financial_metrics_v3(params: Dict[str, Any], cashflow_df: pd.DataFrame, 
-                                    loan_amount: float, equity_amount: float, itc_credit: float) -> Dict[str, Any]:
-    """(重构) 基于动态现金流量表计算最终财务指标"""
-    finance = params['financial_assumptions']
-    tech = params['technical_specs']
-    
-    discount_rate = finance['discount_rate']
-    equity_discount_rate = finance.get('equity_discount_rate', discount_rate + 0.02)
+    discount_rate = finance.discount_rate
+    equity_discount_rate = finance.resolved_equity_discount_rate
 
     # 项目自由现金流 (用于计算项目IRR)
     project_cash_flows = [-equity_amount - loan_amount + itc_credit] + cashflow_df['项目自由现金流'].tolist()
@@ -311,278 +1104,1908 @@ def _calculate_financial_metrics_v3(params: Dict[str, Any], cashflow_df: pd.Data
     # 股权自由现金流 (用于计算股权IRR)
     equity_cash_flows = [-equity_amount + itc_credit] + cashflow_df['股权自由现金流'].tolist()
     
-    # 计算项目NPV和IRR
-    project_npv = npf.npv(discount_rate, project_cash_flows)
-    try:
-        project_irr = npf.irr(project_cash_flows)
-    except:
-        project_irr = float('nan')
-    
-    # 计算股权NPV和IRR
-    equity_npv = npf.npv(equity_discount_rate, equity_cash_flows)
-    try:
-        equity_irr = npf.irr(equity_cash_flows)
-    except:
-        equity_irr = float('nan')
+    # 计算项目与股权的NPV、IRR (求解器显式给出无解/多解状态)
+    project_returns = _solve_cashflow_returns(project_cash_flows, discount_rate)
+    equity_returns = _solve_cashflow_returns(equity_cash_flows, equity_discount_rate)
     
-    # 计算债务偿付覆盖率(DSCR)
-    dscr_yearly = []
-    for idx, row in cashflow_df.iterrows():
-        if row['债务本金偿还'] + row['债务利息支付'] > 0:
-            dscr = (row['息税前利润(EBIT)'] + row['折旧摊销']) / (row['债务本金偿还'] + row['债务利息支付'])
-            dscr_yearly.append(round(dscr, 2))
-        else:
-            dscr_yearly.append(float('nan'))
+    # 计算债务偿付覆盖率(DSCR), 无还本付息的年份记为NaN
+    debt_service = (cashflow_df['债务本金偿还'] + cashflow_df['债务利息支付']).to_numpy()
+    operating_cashflow = (cashflow_df['息税前利润(EBIT)'] + cashflow_df['折旧摊销']).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dscr_yearly = np.where(debt_service > 0, operating_cashflow / debt_service, np.nan)
     
-    min_dscr = min(dscr_yearly) if dscr_yearly else float('nan')
-    avg_dscr = sum(dscr_yearly)/len(dscr_yearly) if dscr_yearly else float('nan')
+    min_dscr = np.fmin.reduce(dscr_yearly) if dscr_yearly.size else float('nan')
+    avg_dscr = np.mean(dscr_yearly) if dscr_yearly.size else float('nan')
     
-    # LCOE (基于折现成本和折现电量)
-    total_lifecycle_cost_pv = abs(npf.npv(discount_rate, [-equity_amount - loan_amount + itc_credit] + 
-                                      (cashflow_df['固定运维成本'] + cashflow_df['电池更换成本']).tolist()))
+    # LCOE (基于折现成本和折现电量), 折现因子一次算出
+    discount_factors = (1 + discount_rate) ** -np.arange(len(cashflow_df) + 1)
+    lifecycle_costs = np.concatenate([[-equity_amount - loan_amount + itc_credit],
+                                      (cashflow_df['固定运维成本'] + cashflow_df['电池更换成本']).to_numpy()])
+    total_lifecycle_cost_pv = abs(np.dot(lifecycle_costs, discount_factors))
     
-    total_energy_pv = 0
-    for i, year in enumerate(cashflow_df.index):
-        daily_energy_mwh = tech['capacity_mwh'] * tech['depth_of_discharge_dod']
-        annual_energy_kwh = daily_energy_mwh * 1000 * 365 * finance['charge_cycles_per_day']
-        total_energy_pv += annual_energy_kwh / ((1 + discount_rate) ** (i + 1))
+    annual_energy_kwh = tech.capacity_mwh * tech.depth_of_discharge_dod * 1000 * 365 * finance.charge_cycles_per_day
+    total_energy_pv = annual_energy_kwh * discount_factors[1:].sum()
     
     lcoe = total_lifecycle_cost_pv / total_energy_pv if total_energy_pv > 0 else 0
 
-    return {
-        "project_npv_usd": f"{project_npv:,.2f}",
-        "project_irr_percent": f"{project_irr:.2%}" if not np.isnan(project_irr) else "N/A",
-        "equity_npv_usd": f"{equity_npv:,.2f}",
-        "equity_irr_percent": f"{equity_irr:.2%}" if not np.isnan(equity_irr) else "N/A",
-        "min_dscr": min_dscr,
-        "avg_dscr": avg_dscr,
-        "levelized_cost_of_storage_usd_per_kwh": round(lcoe, 4),
-        "financing_summary": {
-            "debt_amount": loan_amount,
-            "equity_amount": equity_amount,
-            "debt_ratio": params['financial_assumptions']['financing'].get('debt_ratio', 0),
-            "itc_credit": itc_credit
-        }
-    }
+    return FinancialMetrics(
+        project_npv_usd=float(project_returns['npv'][0]),
+        project_irr=float(project_returns['irr'][0]),
+        project_irr_status=int(project_returns['irr_status'][0]),
+        project_discounted_payback_years=float(project_returns['discounted_payback_years'][0]),
+        equity_npv_usd=float(equity_returns['npv'][0]),
+        equity_irr=float(equity_returns['irr'][0]),
+        equity_irr_status=int(equity_returns['irr_status'][0]),
+        equity_discounted_payback_years=float(equity_returns['discounted_payback_years'][0]),
+        min_dscr=float(min_dscr),
+        avg_dscr=float(avg_dscr),
+        levelized_cost_of_storage_usd_per_kwh=float(lcoe),
+        debt_amount=loan_amount,
+        equity_amount=equity_amount,
+        debt_ratio=finance.financing.debt_ratio,
+        itc_credit=itc_credit
+    )
 
 # --- V3 新增的风险与敏感性分析模块 ---
 
-def _perform_monte_carlo_simulation(params: Dict[str, Any], num_simulations: int = 5000) -> Dict[str, Any]:
-    """(新增) 执行蒙特卡洛模拟进行风险评估"""
-    mc_params = params['financial_assumptions'].get('monte_carlo', {})
-    if not mc_params:
-        return {"status": "未配置蒙特卡洛模拟参数"}
+_MONTE_CARLO_DEFAULT_SIMULATIONS = 5000
+_MONTE_CARLO_CHUNK_SIZE = 10000
+_MONTE_CARLO_RESULT_KEYS = ('project_irr', 'equity_irr', 'min_dscr', 'project_irr_status', 'equity_irr_status')
+# 可在报告中以直方图或原始数组输出的逐次模拟指标
+_MONTE_CARLO_SAMPLE_KEYS = ('project_irr', 'equity_irr', 'min_dscr')
+_process_pool = None
+_process_pool_lock = threading.Lock()
 
-    project_irr_results = []
-    equity_irr_results = []
-    min_dscr_results = []
-    
-    for _ in range(num_simulations):
-        sim_params = copy.deepcopy(params)
-        
-        # 对不确定性变量进行抽样
-        price_dist = mc_params['peak_valley_price_diff']
-        sim_price = np.random.normal(price_dist['mean'], price_dist['std_dev'])
-        sim_params['market_and_policy']['peak_valley_price_diff_usd_per_kwh'] = sim_price
-
-        invest_dist = mc_params['initial_investment']
-        sim_investment = np.random.normal(invest_dist['mean'], invest_dist['std_dev'])
-        sim_params['cost_structure']['total_investment_usd'] = sim_investment
-        
-        # 对融资变量抽样
-        if 'debt_ratio' in mc_params:
-            debt_dist = mc_params['debt_ratio']
-            sim_debt_ratio = np.random.normal(debt_dist['mean'], debt_dist['std_dev'])
-            sim_params['financial_assumptions']['financing']['debt_ratio'] = max(0, min(sim_debt_ratio, 0.8))
+def _get_process_pool() -> ProcessPoolExecutor:
+    """
+    (新增) 获取共享的进程池。进程池按CPU核心数一次性创建, 并发请求共用, 不随单个请求的 workers 重建或关闭,
+    各请求由 _map_in_process_pool 自行限制在途任务数; 只在进程池损坏 (工作进程异常退出) 后重建。
+    调度器线程运行时 fork 会把其他线程持有的锁复制进子进程, 因此以 forkserver (不支持时 spawn) 启动工作进程。
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None or getattr(_process_pool, '_broken', False):
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context(method))
+        return _process_pool
 
-        try:
-            # 重新计算动态现金流
-            cf_df, loan_amount, equity_amount, itc_credit = _generate_dynamic_yearly_cashflow_statement(sim_params)
-            metrics = _calculate_financial_metrics_v3(sim_params, cf_df, loan_amount, equity_amount, itc_credit)
-            
-            # 收集结果
-            try:
-                project_irr = float(metrics['project_irr_percent'].strip('%'))/100
-                project_irr_results.append(project_irr)
-            except:
-                pass
-                
-            try:
-                equity_irr = float(metrics['equity_irr_percent'].strip('%'))/100
-                equity_irr_results.append(equity_irr)
-            except:
-                pass
-                
-            if not np.isnan(metrics['min_dscr']):
-                min_dscr_results.append(metrics['min_dscr'])
-        except:
-            continue
+def _map_in_process_pool(func, argument_lists: list, max_in_flight: int, cancel_event: threading.Event = None) -> list:
+    """
+    (新增) 在共享进程池中计算 func(*arguments), 按输入顺序返回结果; 本请求同时在途的任务不超过 max_in_flight。
+    等待期间定期检查取消标志, 请求取消或超时后撤回尚未开始的任务, 不再占用共享进程池。
+    """
+    pool = _get_process_pool()
+    results = [None] * len(argument_lists)
+    in_flight = {}
+    next_index = 0
+    try:
+        while next_index < len(argument_lists) or in_flight:
+            while next_index < len(argument_lists) and len(in_flight) < max_in_flight:
+                in_flight[pool.submit(func, *argument_lists[next_index])] = next_index
+                next_index += 1
+            done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+            _raise_if_cancelled(cancel_event)
+            for future in done:
+                results[in_flight.pop(future)] = future.result()
+    except BaseException:
+        for future in in_flight:
+            future.cancel()
+        raise
+    return results
+
+# --- 抽样器与分布变换 ---
+
+# 不确定性变量: monte_carlo参数块中的名称 -> 项目参数路径 (顺序即抽样维度顺序)
+_MONTE_CARLO_VARIABLES = (
+    ('peak_valley_price_diff', ('market_and_policy', 'peak_valley_price_diff_usd_per_kwh')),
+    ('initial_investment', ('cost_structure', 'total_investment_usd')),
+    ('debt_ratio', ('financial_assumptions', 'financing', 'debt_ratio'))
+)
+_MONTE_CARLO_SAMPLERS = ('random', 'lhs', 'sobol', 'halton')
+
+# Sobol方向数 (Joe & Kuo, new-joe-kuo-6.21201): 第1维为van der Corput序列, 其余维为 (s, a, m_1..m_s)
+_SOBOL_PRIMITIVES = (
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3))
+)
+_SOBOL_BITS = 32
+_HALTON_BASES = (2, 3, 5, 7, 11, 13)
+
+# Acklam逆正态分布函数的有理逼近系数 (相对误差约1.15e-9)
+_ACKLAM_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+             1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_ACKLAM_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+             6.680131188771972e+01, -1.328068155288572e+01)
+_ACKLAM_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+             -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_ACKLAM_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+             3.754408661907416e+00)
+_ACKLAM_P_LOW = 0.02425
+
+def _norm_ppf(p: np.ndarray) -> np.ndarray:
+    """(新增) 向量化的标准正态分布逆函数 (Acklam有理逼近)"""
+    p = np.asarray(p, dtype=float)
+    x = np.empty_like(p)
+    tail = np.minimum(p, 1 - p)
+    central = tail >= _ACKLAM_P_LOW
+
+    q = p[central] - 0.5
+    r = q * q
+    numerator = np.polyval(_ACKLAM_A, r) * q
+    denominator = np.polyval(_ACKLAM_B + (1.0,), r)
+    x[central] = numerator / denominator
 
-    results = {"status": "分析完成", "num_simulations": num_simulations}
+    # 尾部: 按较小的尾部概率计算, 下尾取负号
+    q = np.sqrt(-2 * np.log(tail[~central]))
+    tail_values = np.polyval(_ACKLAM_C, q) / np.polyval(_ACKLAM_D + (1.0,), q)
+    x[~central] = np.where(p[~central] < 0.5, tail_values, -tail_values)
+    return x
+
+def _norm_cdf(z: np.ndarray) -> np.ndarray:
+    """(新增) 向量化的标准正态分布函数, erfc采用切比雪夫逼近 (相对误差小于1.2e-7)"""
+    x = np.abs(np.asarray(z, dtype=float)) / math.sqrt(2)
+    t = 1 / (1 + 0.5 * x)
+    poly = np.polyval((0.17087277, -0.82215223, 1.48851587, -1.13520398, 0.27886807,
+                       -0.18628806, 0.09678418, 0.37409196, 1.00002368, -1.26551223), t)
+    erfc = t * np.exp(-x * x + poly)
+    return np.where(np.asarray(z) >= 0, 1 - 0.5 * erfc, 0.5 * erfc)
+
+def _sobol_direction_numbers(dimension: int) -> np.ndarray:
+    """(新增) 生成Sobol序列各维度的方向数 (dimension × 位数)"""
+    directions = np.zeros((dimension, _SOBOL_BITS), dtype=np.uint64)
+    directions[0] = [1 << (_SOBOL_BITS - 1 - bit) for bit in range(_SOBOL_BITS)]
+    for dim, (degree, coefficients, initial) in enumerate(_SOBOL_PRIMITIVES[:dimension - 1], start=1):
+        v = [m << (_SOBOL_BITS - 1 - bit) for bit, m in enumerate(initial)]
+        for bit in range(degree, _SOBOL_BITS):
+            value = v[bit - degree] ^ (v[bit - degree] >> degree)
+            for k in range(1, degree):
+                if (coefficients >> (degree - 1 - k)) & 1:
+                    value ^= v[bit - k]
+            v.append(value)
+        directions[dim] = v
+    return directions
+
+def _sobol_points(indices: np.ndarray, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    """(新增) 按序号直接生成带随机数字移位的Sobol点 (dimension × n), 各分块可独立计算"""
+    if dimension > len(_SOBOL_PRIMITIVES) + 1:
+        raise ValueError(f"Sobol抽样最多支持 {len(_SOBOL_PRIMITIVES) + 1} 个不确定性变量")
+    directions = _sobol_direction_numbers(dimension)
+    indices = indices.astype(np.uint64)
+    points = np.zeros((dimension, len(indices)), dtype=np.uint64)
+    for bit in range(_SOBOL_BITS):
+        selected = ((indices >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        points[:, selected] ^= directions[:, bit:bit + 1]
+    shift = rng.integers(0, 1 << _SOBOL_BITS, size=(dimension, 1), dtype=np.uint64)
+    return ((points ^ shift) + 0.5) / float(1 << _SOBOL_BITS)
+
+def _halton_points(indices: np.ndarray, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    """(新增) 按序号直接生成带随机平移(Cranley-Patterson)的Halton点 (dimension × n)"""
+    if dimension > len(_HALTON_BASES):
+        raise ValueError(f"Halton抽样最多支持 {len(_HALTON_BASES)} 个不确定性变量")
+    points = np.zeros((dimension, len(indices)))
+    for dim, base in enumerate(_HALTON_BASES[:dimension]):
+        remaining = indices + 1
+        factor = 1.0
+        while np.any(remaining > 0):
+            factor /= base
+            points[dim] += factor * (remaining % base)
+            remaining = remaining // base
+    return (points + rng.random((dimension, 1))) % 1.0
+
+def _latin_hypercube_points(num_draws: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    """(新增) 拉丁超立方抽样: 每个维度在 num_draws 个等概率分层中各取一点 (dimension × n)"""
+    strata = rng.permuted(np.tile(np.arange(num_draws), (dimension, 1)), axis=1)
+    return (strata + rng.random((dimension, num_draws))) / num_draws
+
+def _correlation_cholesky(mc_params: Dict[str, Any], names: list) -> Union[np.ndarray, None]:
+    """(新增) 解析相关系数矩阵并返回其Cholesky因子, 未列出的变量视为相互独立"""
+    correlation = mc_params.get('correlation')
+    if not correlation:
+        return None
+    listed = correlation['variables']
+    matrix = np.asarray(correlation['matrix'], dtype=float)
+    if matrix.shape != (len(listed), len(listed)) or not np.allclose(matrix, matrix.T):
+        raise ValueError("correlation.matrix 必须是与 correlation.variables 对应的对称方阵")
+
+    full = np.eye(len(names))
+    positions = [names.index(name) for name in listed]
+    full[np.ix_(positions, positions)] = matrix
+    try:
+        return np.linalg.cholesky(full)
+    except np.linalg.LinAlgError:
+        raise ValueError("correlation.matrix 不是正定矩阵")
+
+def _apply_marginal(dist: Dict[str, Any], z: np.ndarray) -> np.ndarray:
+    """(新增) 将标准正态变量变换为指定的边缘分布: 正态、截断正态或对数正态"""
+    mean, std_dev = dist['mean'], dist['std_dev']
+    kind = dist.get('distribution', 'normal')
+    if kind == 'normal':
+        return mean + std_dev * z
+    if kind == 'lognormal':
+        # mean/std_dev 为变量本身的均值与标准差, 换算为对数空间参数
+        sigma = math.sqrt(math.log(1 + (std_dev / mean) ** 2))
+        return np.exp(math.log(mean) - sigma ** 2 / 2 + sigma * z)
+    if kind == 'truncated_normal':
+        lower_cdf = _norm_cdf((dist.get('lower', -np.inf) - mean) / std_dev)
+        upper_cdf = _norm_cdf((dist.get('upper', np.inf) - mean) / std_dev)
+        u = lower_cdf + _norm_cdf(z) * (upper_cdf - lower_cdf)
+        return mean + std_dev * _norm_ppf(np.clip(u, 1e-15, 1 - 1e-15))
+    raise ValueError(f"不支持的分布类型: {kind}")
+
+def _sample_monte_carlo_inputs(
+    mc_params: Dict[str, Any],
+    num_simulations: int,
+    rng: np.random.Generator,
+    start_index: int = 0,
+    sequence_seed: np.random.SeedSequence = None
+) -> Dict[Tuple[str, ...], np.ndarray]:
+    """
+    (重构) 一次性抽取全部模拟的不确定性变量, 返回按参数路径组织的情景数组。
+    先由抽样器生成标准正态变量(低差异序列与拉丁超立方经逆正态变换), 再经高斯copula引入相关性,
+    最后变换为各变量的边缘分布。Sobol/Halton按全局序号 start_index 起连续取点,
+    随机移位由整次模拟共享的 sequence_seed 决定, 因此分块计算与一次性计算得到同一序列。
+    """
+    names = [name for name, _ in _MONTE_CARLO_VARIABLES if name in mc_params]
+    sampler = mc_params.get('sampler', 'random')
+    if sampler == 'random':
+        z = rng.standard_normal((len(names), num_simulations))
+    elif sampler == 'lhs':
+        z = _norm_ppf(_latin_hypercube_points(num_simulations, len(names), rng))
+    elif sampler in ('sobol', 'halton'):
+        indices = np.arange(start_index, start_index + num_simulations)
+        shift_rng = np.random.default_rng(sequence_seed)
+        points = (_sobol_points if sampler == 'sobol' else _halton_points)(indices, len(names), shift_rng)
+        z = _norm_ppf(points)
+    else:
+        raise ValueError(f"不支持的抽样方法: {sampler}, 可选 {', '.join(_MONTE_CARLO_SAMPLERS)}")
+
+    cholesky = _correlation_cholesky(mc_params, names)
+    if cholesky is not None:
+        z = cholesky @ z
+
+    paths = dict(_MONTE_CARLO_VARIABLES)
+    overrides = {paths[name]: _apply_marginal(mc_params[name], z[row]) for row, name in enumerate(names)}
+
+    # 债务比例限制在可融资范围内
+    debt_path = paths['debt_ratio']
+    if debt_path in overrides:
+        overrides[debt_path] = np.clip(overrides[debt_path], 0, 0.8)
+    return overrides
+
+def _run_monte_carlo_chunk(
+    params: Dict[str, Any],
+    num_draws: int,
+    seed_sequence: np.random.SeedSequence,
+    start_index: int = 0,
+    sequence_seed: np.random.SeedSequence = None
+) -> Dict[str, np.ndarray]:
+    """(新增) 用分块专属的随机数生成器完成抽样与现金流计算, 可在子进程中执行"""
+    mc_params = params['financial_assumptions']['monte_carlo']
+    samples = _sample_monte_carlo_inputs(mc_params, num_draws, np.random.default_rng(seed_sequence),
+                                         start_index, sequence_seed)
+    metrics = _evaluate_scenario_batch(params, samples)
+    return {key: metrics[key] for key in _MONTE_CARLO_RESULT_KEYS}
+
+def _resolve_monte_carlo_settings(mc_params: Dict[str, Any], num_simulations: int = None) -> Dict[str, Any]:
+    """(新增) 解析monte_carlo参数块中的模拟次数、分块、并行与自适应停止设置"""
+    if num_simulations is None:
+        num_simulations = int(mc_params.get('num_simulations', _MONTE_CARLO_DEFAULT_SIMULATIONS))
+    chunk_size = int(mc_params.get('chunk_size', _MONTE_CARLO_CHUNK_SIZE))
+    workers = mc_params.get('workers', 1)
+    workers = (os.cpu_count() or 1) if workers == 'auto' else int(workers)
+    if num_simulations <= 0 or chunk_size <= 0 or workers <= 0:
+        raise ValueError("monte_carlo 中的 num_simulations、chunk_size 和 workers 必须为正数")
+
+    adaptive = mc_params.get('adaptive', {})
+    settings = {
+        "num_simulations": num_simulations,
+        "chunk_size": chunk_size,
+        "workers": workers,
+        "adaptive": bool(adaptive) and adaptive.get('enabled', True)
+    }
+    if settings['adaptive']:
+        # 自适应模式: num_simulations 作为上限, 按批次运行直至置信区间达到目标精度
+        settings.update({
+            "batch_size": int(adaptive.get('batch_size', 2000)),
+            "min_simulations": int(adaptive.get('min_simulations', 2000)),
+            "max_simulations": int(adaptive.get('max_simulations', mc_params.get('num_simulations', 100000))),
+            "confidence_level": float(adaptive.get('confidence_level', 0.95)),
+            "target_irr_half_width": float(adaptive.get('target_irr_half_width', 0.005)),
+            "target_probability_half_width": float(adaptive.get('target_probability_half_width', 0.01))
+        })
+        if settings['batch_size'] <= 0 or settings['max_simulations'] <= 0:
+            raise ValueError("adaptive 中的 batch_size 和 max_simulations 必须为正数")
+    return settings
+
+def _evaluate_monte_carlo_draws(
+    params: Dict[str, Any],
+    chunk_draws: list,
+    chunk_seeds: list,
+    chunk_starts: list,
+    sequence_seed: np.random.SeedSequence,
+    workers: int,
+    cancel_event: threading.Event = None
+) -> Dict[str, np.ndarray]:
+    """(新增) 计算一组分块(串行或分发到进程池), 按分块顺序合并逐次模拟结果; 分块之间检查取消标志"""
+    if workers > 1 and len(chunk_draws) > 1:
+        chunk_results = _map_in_process_pool(_run_monte_carlo_chunk,
+                                             list(zip(repeat(params), chunk_draws, chunk_seeds, chunk_starts,
+                                                      repeat(sequence_seed))), workers, cancel_event)
+    else:
+        chunk_results = []
+        for draws, seed, start in zip(chunk_draws, chunk_seeds, chunk_starts):
+            _raise_if_cancelled(cancel_event)
+            chunk_results.append(_run_monte_carlo_chunk(params, draws, seed, start, sequence_seed))
+    return {key: np.concatenate([result[key] for result in chunk_results]) for key in _MONTE_CARLO_RESULT_KEYS}
+
+def _summarize_monte_carlo(params: Dict[str, Any], draws: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """(新增) 由逐次模拟结果计算均值、分位数和概率等统计量 (原始浮点数)"""
+    project_irr_status = draws['project_irr_status']
+    equity_irr_status = draws['equity_irr_status']
+
+    # 无解的IRR与无债务情景的DSCR不计入统计
+    project_irr_results = draws['project_irr'][np.isfinite(draws['project_irr'])]
+    equity_irr_results = draws['equity_irr'][np.isfinite(draws['equity_irr'])]
+    min_dscr_results = draws['min_dscr'][np.isfinite(draws['min_dscr'])]
+
+    results = {
+        "irr_solver_diagnostics": {
+            "project_irr_no_solution_count": int(np.sum(project_irr_status == IRR_STATUS_NO_SOLUTION)),
+            "project_irr_multiple_count": int(np.sum(project_irr_status == IRR_STATUS_MULTIPLE)),
+            "equity_irr_no_solution_count": int(np.sum(equity_irr_status == IRR_STATUS_NO_SOLUTION)),
+            "equity_irr_multiple_count": int(np.sum(equity_irr_status == IRR_STATUS_MULTIPLE))
+        }
+    }
     
-    if project_irr_results:
+    if project_irr_results.size:
         results.update({
-            "mean_project_irr": f"{np.mean(project_irr_results):.2%}",
-            "std_dev_project_irr": f"{np.std(project_irr_results):.2%}",
-            "percentile_5th_project_irr": f"{np.percentile(project_irr_results, 5):.2%}",
-            "percentile_95th_project_irr": f"{np.percentile(project_irr_results, 95):.2%}",
+            "mean_project_irr": float(np.mean(project_irr_results)),
+            "std_dev_project_irr": float(np.std(project_irr_results)),
+            "percentile_5th_project_irr": float(np.percentile(project_irr_results, 5)),
+            "percentile_95th_project_irr": float(np.percentile(project_irr_results, 95)),
             "probability_project_irr_above_discount_rate": 
-                f"{np.sum(np.array(project_irr_results) > params['financial_assumptions']['discount_rate']) / len(project_irr_results):.2%}"
+                float(np.mean(project_irr_results > params['financial_assumptions']['discount_rate']))
         })
     
-    if equity_irr_results:
+    if equity_irr_results.size:
         equity_discount_rate = params['financial_assumptions'].get('equity_discount_rate', 
                                                                   params['financial_assumptions']['discount_rate'] + 0.02)
         results.update({
-            "mean_equity_irr": f"{np.mean(equity_irr_results):.2%}",
-            "std_dev_equity_irr": f"{np.std(equity_irr_results):.2%}",
-            "percentile_5th_equity_irr": f"{np.percentile(equity_irr_results, 5):.2%}",
-            "percentile_95th_equity_irr": f"{np.percentile(equity_irr_results, 95):.2%}",
+            "mean_equity_irr": float(np.mean(equity_irr_results)),
+            "std_dev_equity_irr": float(np.std(equity_irr_results)),
+            "percentile_5th_equity_irr": float(np.percentile(equity_irr_results, 5)),
+            "percentile_95th_equity_irr": float(np.percentile(equity_irr_results, 95)),
             "probability_equity_irr_above_discount_rate": 
-                f"{np.sum(np.array(equity_irr_results) > equity_discount_rate) / len(equity_irr_results):.2%}"
+                float(np.mean(equity_irr_results > equity_discount_rate))
         })
     
-    if min_dscr_results:
+    if min_dscr_results.size:
         results.update({
-            "mean_min_dscr": round(np.mean(min_dscr_results), 2),
-            "probability_dscr_below_1.2": f"{np.sum(np.array(min_dscr_results) < 1.2) / len(min_dscr_results):.2%}",
-            "probability_dscr_below_1.0": f"{np.sum(np.array(min_dscr_results) < 1.0) / len(min_dscr_results):.2%}"
+            "mean_min_dscr": float(np.mean(min_dscr_results)),
+            "probability_dscr_below_1.2": float(np.mean(min_dscr_results < 1.2)),
+            "probability_dscr_below_1.0": float(np.mean(min_dscr_results < 1.0))
         })
     
     return results
 
+def _quantile_ci_half_width(values: np.ndarray, quantile: float, z: float) -> float:
+    """(新增) 基于次序统计量的分位数置信区间半宽 (无分布假设)"""
+    n = len(values)
+    if n == 0:
+        return float('nan')
+    spread = z * math.sqrt(n * quantile * (1 - quantile))
+    lower_rank = max(int(math.floor(n * quantile - spread)), 0)
+    upper_rank = min(int(math.ceil(n * quantile + spread)), n - 1)
+    bounds = np.partition(values, [lower_rank, upper_rank])[[lower_rank, upper_rank]]
+    return float(bounds[1] - bounds[0]) / 2
+
+def _proportion_ci_half_width(successes: int, n: int, z: float) -> float:
+    """(新增) 概率估计的Wilson置信区间半宽"""
+    if n == 0:
+        return float('nan')
+    p = successes / n
+    return z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+
+def _monte_carlo_precision(params: Dict[str, Any], draws: Dict[str, np.ndarray], confidence_level: float) -> Dict[str, float]:
+    """(新增) 计算所报告的P5/P95 IRR与各项概率的置信区间半宽"""
+    finance = params['financial_assumptions']
+    equity_discount_rate = finance.get('equity_discount_rate', finance['discount_rate'] + 0.02)
+    z = NormalDist().inv_cdf((1 + confidence_level) / 2)
+
+    project_irr = draws['project_irr'][np.isfinite(draws['project_irr'])]
+    equity_irr = draws['equity_irr'][np.isfinite(draws['equity_irr'])]
+    min_dscr = draws['min_dscr'][np.isfinite(draws['min_dscr'])]
+
+    precision = {
+        "percentile_5th_project_irr": _quantile_ci_half_width(project_irr, 0.05, z),
+        "percentile_95th_project_irr": _quantile_ci_half_width(project_irr, 0.95, z),
+        "percentile_5th_equity_irr": _quantile_ci_half_width(equity_irr, 0.05, z),
+        "percentile_95th_equity_irr": _quantile_ci_half_width(equity_irr, 0.95, z),
+        "probability_project_irr_above_discount_rate":
+            _proportion_ci_half_width(int(np.sum(project_irr > finance['discount_rate'])), len(project_irr), z),
+        "probability_equity_irr_above_discount_rate":
+            _proportion_ci_half_width(int(np.sum(equity_irr > equity_discount_rate)), len(equity_irr), z)
+    }
+    # 无债务项目没有DSCR样本, 不参与收敛判断
+    if min_dscr.size:
+        precision["probability_dscr_below_1.2"] = _proportion_ci_half_width(int(np.sum(min_dscr < 1.2)), len(min_dscr), z)
+        precision["probability_dscr_below_1.0"] = _proportion_ci_half_width(int(np.sum(min_dscr < 1.0)), len(min_dscr), z)
+    return precision
+
+def _iter_monte_carlo_simulation(
+    params: Dict[str, Any],
+    num_simulations: int = None,
+    keep_samples: bool = False,
+    cancel_event: threading.Event = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    (新增) 逐批执行蒙特卡洛模拟, 每完成一批产出一次阶段性结果, 最后一次产出即最终结果。
+    固定模式运行至指定次数; 自适应模式按批次运行, 在所有置信区间半宽达到目标精度或达到上限时停止。
+    keep_samples 为True时最终结果附带 samples 字段 (各指标的逐次模拟数组, 含无解的NaN)。
+    cancel_event 被设置后在下一个分块边界抛出 _ComputeCancelled, 已提交到进程池但未开始的分块随之撤回。
+    分块边界只取决于分块大小, 每个分块的生成器按顺序由同一SeedSequence派生,
+    因此给定seed时结果与工作进程数无关。
+    """
+    mc_params = params['financial_assumptions'].get('monte_carlo', {})
+    if not mc_params:
+        yield {"status": "未配置蒙特卡洛模拟参数"}
+        return
+
+    settings = _resolve_monte_carlo_settings(mc_params, num_simulations)
+    root_seed = np.random.SeedSequence(mc_params.get('seed'))
+    total = settings['max_simulations'] if settings['adaptive'] else settings['num_simulations']
+    # 固定模式按"分块大小 × 工作进程数"成批推进, 以便在批次之间发送进度并响应取消; 分批方式不影响结果
+    batch_size = settings['batch_size'] if settings['adaptive'] else settings['chunk_size'] * settings['workers']
+
+    draws = None
+    completed = 0
+    while completed < total:
+        batch = min(batch_size, total - completed)
+        chunk_starts = list(range(completed, completed + batch, settings['chunk_size']))
+        chunk_draws = [min(settings['chunk_size'], completed + batch - start) for start in chunk_starts]
+        batch_draws = _evaluate_monte_carlo_draws(params, chunk_draws, root_seed.spawn(len(chunk_draws)),
+                                                  chunk_starts, root_seed, settings['workers'], cancel_event)
+        draws = batch_draws if draws is None else {key: np.concatenate([draws[key], batch_draws[key]]) for key in draws}
+        completed += batch
+
+        results = {
+            "status": "分析完成" if completed >= total else "进行中",
+            "num_simulations": completed,
+            "planned_simulations": total,
+            "sampler": mc_params.get('sampler', 'random'),
+            "seed": root_seed.entropy,
+            "workers": settings['workers']
+        }
+        if settings['adaptive']:
+            precision = _monte_carlo_precision(params, draws, settings['confidence_level'])
+            converged = completed >= settings['min_simulations'] and all(
+                half_width <= (settings['target_probability_half_width'] if key.startswith('probability_')
+                               else settings['target_irr_half_width'])
+                for key, half_width in precision.items()
+            )
+            results["convergence"] = {
+                "converged": converged,
+                "confidence_level": settings['confidence_level'],
+                "ci_half_widths": precision
+            }
+            if converged:
+                results["status"] = "分析完成"
+        results.update(_summarize_monte_carlo(params, draws))
+        if keep_samples and results["status"] == "分析完成":
+            results["samples"] = {key: draws[key] for key in _MONTE_CARLO_SAMPLE_KEYS}
+        yield results
+        if results["status"] == "分析完成":
+            return
+
+def _perform_monte_carlo_simulation(params: Dict[str, Any], num_simulations: int = None) -> Dict[str, Any]:
+    """
+    (重构) 执行向量化蒙特卡洛模拟进行风险评估, 返回最终的统计结果。
+    返回的统计量均为原始浮点数, 由报告层统一格式化。
+    """
+    results = None
+    for results in _iter_monte_carlo_simulation(params, num_simulations):
+        pass
+    return results
+
+# 敏感性分析变量: 报告名称 -> 项目参数路径
+_SENSITIVITY_VARIABLES = {
+    "峰谷价差": ('market_and_policy', 'peak_valley_price_diff_usd_per_kwh'),
+    "初始投资": ('cost_structure', 'total_investment_usd'),
+    "债务比例": ('financial_assumptions', 'financing', 'debt_ratio'),
+    "贷款利率": ('financial_assumptions', 'financing', 'loan_interest_rate'),
+    "辅助服务价格": ('market_and_policy', 'ancillary_service_revenue_usd_per_mw_year'),
+    "运维成本率": ('cost_structure', 'annual_opex_rate_of_investment')
+}
+_SENSITIVITY_DEFAULT_DELTAS = (-0.2, -0.1, 0.1, 0.2)
+
+def _get_param_value(params: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    """(新增) 按参数路径读取项目参数, 路径不存在时抛出KeyError"""
+    current_level = params
+    for key in path:
+        current_level = current_level[key]
+    return current_level
+
+def _has_param_path(params: Dict[str, Any], path: Tuple[str, ...]) -> bool:
+    """(新增) 判断项目参数中是否存在指定路径"""
+    try:
+        _get_param_value(params, path)
+        return True
+    except (KeyError, TypeError):
+        return False
+
+def _delta_label(change: float) -> str:
+    """(新增) 变化幅度的展示标签, 如 "变化 +10%" """
+    if math.isclose(change * 100, round(change * 100)):
+        return f"变化 {change:+.0%}"
+    return f"变化 {change:+.1%}"
+
+def _resolve_two_way_grid(params: Dict[str, Any], grid: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 解析双因素网格配置: 显式的 x_deltas/y_deltas, 或按 range 与 steps 生成等间距网格"""
+    x_variable, y_variable = grid['variables']
+    for name in (x_variable, y_variable):
+        if name not in _SENSITIVITY_VARIABLES or not _has_param_path(params, _SENSITIVITY_VARIABLES[name]):
+            raise ValueError(f"双因素网格变量 '{name}' 不存在或未在项目参数中配置")
+
+    value_range = float(grid.get('range', 0.2))
+    steps = int(grid.get('steps', 11))
+    default_deltas = np.linspace(-value_range, value_range, steps).round(10).tolist()
+    return {
+        "x_variable": x_variable,
+        "y_variable": y_variable,
+        "x_deltas": [float(change) for change in grid.get('x_deltas', default_deltas)],
+        "y_deltas": [float(change) for change in grid.get('y_deltas', default_deltas)]
+    }
+
+def _evaluate_multiplier_scenarios(params: Dict[str, Any], scenarios: list) -> Dict[str, np.ndarray]:
+    """
+    (新增) 将一组按比例扰动的情景 ({参数路径: 乘数}) 组装为一个参数矩阵, 由向量化内核一次计算。
+    未在某情景中出现的路径取基准值。
+    """
+    paths = list(dict.fromkeys(path for scenario in scenarios for path in scenario))
+    overrides = {}
+    for path in paths:
+        multipliers = np.array([scenario.get(path, 1.0) for scenario in scenarios])
+        overrides[path] = float(_get_param_value(params, path)) * multipliers
+    return _evaluate_scenario_batch(params, overrides)
+
 def _perform_expanded_sensitivity_analysis(params: Dict[str, Any]) -> Dict[str, Any]:
-    """(重构) 执行扩展的敏感性分析"""
+    """
+    (重构) 执行扩展的敏感性分析, 返回各情景的原始数值指标 (超出参数取值范围的情景为None, 龙卷风图与网格中为NaN)。
+    单因素情景、龙卷风图所需的上下限情景和双因素网格全部组装为一个参数矩阵,
+    由向量化内核一次计算完成。变化幅度网格与双因素网格在 financial_assumptions.sensitivity 中配置。
+    """
+    config = params['financial_assumptions'].get('sensitivity', {})
+    deltas = [float(change) for change in config.get('deltas', _SENSITIVITY_DEFAULT_DELTAS)]
+    names = config.get('variables', list(_SENSITIVITY_VARIABLES))
+    unknown = [name for name in names if name not in _SENSITIVITY_VARIABLES]
+    if unknown:
+        raise ValueError(f"不支持的敏感性分析变量: {', '.join(unknown)}, 可选 {', '.join(_SENSITIVITY_VARIABLES)}")
+
+    # 项目参数中不存在的变量无法扰动, 其情景记为计算失败
+    available = [name for name in names if _has_param_path(params, _SENSITIVITY_VARIABLES[name])]
+    grids = [_resolve_two_way_grid(params, grid) for grid in config.get('two_way', [])]
+
+    # 第0行为基准情景, 其后依次为单因素情景与各双因素网格 (y为行、x为列)
+    scenarios = [{}]
+    scenarios += [{_SENSITIVITY_VARIABLES[name]: 1 + change} for name in available for change in deltas]
+    for grid in grids:
+        x_path, y_path = _SENSITIVITY_VARIABLES[grid['x_variable']], _SENSITIVITY_VARIABLES[grid['y_variable']]
+        scenarios += [{x_path: 1 + dx, y_path: 1 + dy} for dy in grid['y_deltas'] for dx in grid['x_deltas']]
+
+    # 扰动后超出参数取值范围的情景 (如债务比例超过1) 由内核标记为不合法, 其余情景不受影响
+    metrics = _evaluate_multiplier_scenarios(params, scenarios)
+    invalid = metrics['invalid_scenario']
+
+    def scenario_metrics(row: int) -> Union[Dict[str, float], None]:
+        if invalid[row]:
+            return None
+        return {key: float(metrics[key][row]) for key in ('project_irr', 'equity_irr', 'min_dscr')}
+
     results = {}
-    variables_to_test = {
-        "峰谷价差": ('market_and_policy', 'peak_valley_price_diff_usd_per_kwh'),
-        "初始投资": ('cost_structure', 'total_investment_usd'),
-        "债务比例": ('financial_assumptions', 'financing', 'debt_ratio'),
-        "贷款利率": ('financial_assumptions', 'financing', 'loan_interest_rate'),
-        "辅助服务价格": ('market_and_policy', 'ancillary_service_revenue_usd_per_mw_year'),
-        "运维成本率": ('cost_structure', 'annual_opex_rate_of_investment')
+    row = 1
+    for name in names:
+        if name in available:
+            results[f"{name}_sensitivity"] = {_delta_label(change): scenario_metrics(row + i) for i, change in enumerate(deltas)}
+            row += len(deltas)
+        else:
+            results[f"{name}_sensitivity"] = {_delta_label(change): None for change in deltas}
+
+    # 龙卷风图 (不合法情景的指标为NaN, 排在最后): 以最小/最大变化幅度下的项目IRR差值排序
+    low, high = deltas.index(min(deltas)), deltas.index(max(deltas))
+    ranking = []
+    for i, name in enumerate(available):
+        low_row, high_row = 1 + i * len(deltas) + low, 1 + i * len(deltas) + high
+        ranking.append({
+            "variable": name,
+            "low_delta": deltas[low],
+            "high_delta": deltas[high],
+            "project_irr_low": float(metrics['project_irr'][low_row]),
+            "project_irr_high": float(metrics['project_irr'][high_row]),
+            "equity_irr_low": float(metrics['equity_irr'][low_row]),
+            "equity_irr_high": float(metrics['equity_irr'][high_row]),
+            "project_irr_swing": float(abs(metrics['project_irr'][high_row] - metrics['project_irr'][low_row])),
+            "equity_irr_swing": float(abs(metrics['equity_irr'][high_row] - metrics['equity_irr'][low_row]))
+        })
+    # 项目IRR摆幅相同(如融资类变量)时按股权IRR摆幅排序, 无法求解的变量排在最后
+    swing_key = lambda swing: -swing if not math.isnan(swing) else math.inf
+    ranking.sort(key=lambda item: (swing_key(item['project_irr_swing']), swing_key(item['equity_irr_swing'])))
+    results["tornado_ranking"] = {"base_project_irr": float(metrics['project_irr'][0]), "ranking": ranking}
+
+    if grids:
+        results["two_way_grids"] = []
+        for grid in grids:
+            shape = (len(grid['y_deltas']), len(grid['x_deltas']))
+            cells = slice(row, row + shape[0] * shape[1])
+            results["two_way_grids"].append({
+                **grid,
+                **{key: metrics[key][cells].reshape(shape).tolist() for key in ('project_irr', 'equity_irr', 'min_dscr')}
+            })
+            row += shape[0] * shape[1]
+    return results
+
+# --- 项目组合批量评估 ---
+
+_PORTFOLIO_SORT_KEYS = {
+    "project_npv_usd": True,
+    "project_irr": True,
+    "equity_npv_usd": True,
+    "equity_irr": True,
+    "min_dscr": True,
+    "levelized_cost_of_storage_usd_per_kwh": False
+}
+_PORTFOLIO_METRIC_KEYS = ('project_npv_usd', 'project_irr', 'project_irr_status', 'equity_npv_usd', 'equity_irr',
+                          'min_dscr', 'levelized_cost_of_storage_usd_per_kwh')
+
+def _model_structure(node: Any) -> Dict[str, Any]:
+    """(新增) 模型中参数向量以外的字段: 寿命、贷款期限、换电年份、开关、方法选择与电价曲线"""
+    structure = {}
+    for item in fields(node):
+        value = getattr(node, item.name)
+        if is_dataclass(item.type):
+            structure[item.name] = _model_structure(value)
+        elif not _is_vector_field(item.type):
+            structure[item.name] = value
+        elif value is None:
+            # 未配置的可选数值(如股权折现率)按默认规则计算, 不能与已配置的项目共用情景数组
+            structure[item.name] = None
+    return structure
+
+def _portfolio_batch_key(model: ProjectModel) -> str:
+    """(新增) 批次分组键: 参数向量以外的字段都相同的项目决定相同的现金流结构, 可一起计算"""
+    return json.dumps(_model_structure(model), sort_keys=True, default=str)
+
+def _evaluate_portfolio_batch(models: List[ProjectModel]) -> Dict[str, np.ndarray]:
+    """(新增) 以第一个项目为模板, 将各项目的参数向量堆叠为参数矩阵, 一次计算整批项目"""
+    template = models[0]
+    overrides = _overrides_from_matrix(template, np.stack([_model_vector(model) for model in models]))
+    # 配置电价曲线时峰谷价差只作为相对自身基准的缩放比例, 单个项目的取值不影响结果
+    if template.market_and_policy.price_curve is not None:
+        overrides.pop(('market_and_policy', 'peak_valley_price_diff_usd_per_kwh'), None)
+    metrics = _evaluate_scenario_batch(template, overrides, statement_decimals=2)
+    return {key: np.broadcast_to(metrics[key], (len(models),)) for key in _PORTFOLIO_METRIC_KEYS}
+
+def _evaluate_portfolio(
+    projects: list,
+    cancel_event: threading.Event = None
+) -> Tuple[Dict[int, Dict[str, float]], Dict[int, str], int]:
+    """
+    (新增) 逐个编译校验项目参数后按批次分组, 向量化计算各项目的基准指标。
+    返回 (按项目序号的原始指标, 按项目序号的错误信息, 批次数); 某批次计算失败时逐个项目重算以定位错误。
+    """
+    models, errors = {}, {}
+    for index, project in enumerate(projects):
+        try:
+            models[index] = _compile_project_parameters(project)
+        except ParameterValidationError as e:
+            errors[index] = f"输入参数校验失败: {e}"
+
+    batches = {}
+    for index, model in models.items():
+        batches.setdefault(_portfolio_batch_key(model), []).append(index)
+
+    results = {}
+    for indices in batches.values():
+        _raise_if_cancelled(cancel_event)
+        try:
+            metrics = _evaluate_portfolio_batch([models[i] for i in indices])
+        except Exception:
+            # 批次计算失败时逐个项目重算, 只将错误归到出错的项目
+            for i in indices:
+                try:
+                    single = _evaluate_portfolio_batch([models[i]])
+                except KeyError as e:
+                    errors[i] = f"输入参数缺失: 缺少关键字段 '{e}'"
+                except Exception as e:
+                    errors[i] = f"计算过程中发生错误: {e}"
+                else:
+                    results[i] = {key: float(single[key][0]) for key in _PORTFOLIO_METRIC_KEYS}
+            continue
+        for row, i in enumerate(indices):
+            results[i] = {key: float(metrics[key][row]) for key in _PORTFOLIO_METRIC_KEYS}
+    return results, errors, len(batches)
+
+def _run_portfolio_risk(params: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 单个项目的蒙特卡洛风险评估, 在共享进程池中按项目并行时项目内部不再并行"""
+    finance = params['financial_assumptions']
+    if not finance.get('monte_carlo'):
+        return {"status": "未配置蒙特卡洛模拟参数"}
+    serial_params = dict(params, financial_assumptions=dict(finance, monte_carlo=dict(finance['monte_carlo'], workers=1)))
+    try:
+        return _perform_monte_carlo_simulation(serial_params)
+    except Exception as e:
+        return {"status": f"风险评估失败: {e}"}
+
+# --- 目标求解: 批量求盈亏平衡点 ---
+
+_BREAKEVEN_METRICS = ('project_irr', 'equity_irr', 'project_npv_usd', 'equity_npv_usd',
+                      'min_dscr', 'avg_dscr', 'levelized_cost_of_storage_usd_per_kwh')
+_BREAKEVEN_MAX_ITERATIONS = 60
+_BREAKEVEN_SCAN_POINTS = 16
+
+def _resolve_breakeven_target(model: ProjectModel, target: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 校验单个求解目标并补全参数路径、基准值与搜索区间"""
+    if 'parameter' in target:
+        if target['parameter'] not in _SENSITIVITY_VARIABLES:
+            raise ValueError(f"未知的参数名称: {target['parameter']}, 可选 {', '.join(_SENSITIVITY_VARIABLES)}, 或以 path 指定参数路径")
+        path = _SENSITIVITY_VARIABLES[target['parameter']]
+    else:
+        path = tuple(target['path'])
+    if path not in _MODEL_VECTOR_INDEX:
+        raise ValueError(f"参数 {'.'.join(path)} 不存在或决定现金流结构, 不能作为连续变量求解")
+
+    metric = target['metric']
+    if metric not in _BREAKEVEN_METRICS:
+        raise ValueError(f"不支持的目标指标: {metric}, 可选 {', '.join(_BREAKEVEN_METRICS)}")
+
+    base_value = _model_value(model, path)
+    if base_value is None:
+        raise ValueError(f"参数 {'.'.join(path)} 未在项目参数中配置")
+
+    # 默认搜索区间: 基准值的0 ~ 3倍 (基准值为0时取0 ~ 1)
+    span = abs(base_value) * 3 if base_value else 1.0
+    return {
+        "parameter": target.get('parameter', '.'.join(path)),
+        "path": path,
+        "metric": metric,
+        "target_value": float(target['target_value']),
+        "base_value": float(base_value),
+        "lower": float(target.get('lower', min(0.0, base_value * 3))),
+        "upper": float(target.get('upper', span if base_value >= 0 else 0.0)),
+        "tolerance": float(target.get('tolerance', 1e-8))
     }
 
-    for name, path in variables_to_test.items():
-        sensitivities = {}
-        for change in [-0.2, -0.1, 0.1, 0.2]:
-            temp_params = copy.deepcopy(params)
-            
-            # 动态修改参数值
-            current_level = temp_params
-            for key in path[:-1]:
-                current_level = current_level[key]
-                
-            original_value = current_level[path[-1]]
-            current_level[path[-1]] = original_value * (1 + change)
-            
+def _breakeven_objective(model: ProjectModel, targets: list, rows: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (新增) 一次内核调用计算多个目标在给定取值下的 (目标函数值, 指标值)。
+    第k行将 targets[rows[k]] 的参数路径设为 values[k], 其余参数取基准值。
+    IRR目标改用"按目标收益率折现的NPV"作为目标函数: 与IRR同号且处处有定义, 不受IRR无解的影响。
+    """
+    paths = list(dict.fromkeys(targets[i]['path'] for i in rows))
+    overrides = {}
+    for path in paths:
+        column = np.full(len(rows), float(_model_value(model, path)))
+        selected = np.array([targets[i]['path'] == path for i in rows])
+        column[selected] = values[selected]
+        overrides[path] = column
+
+    columns, loan_amount, equity_amount, itc_credit = _generate_cashflow_arrays(model, overrides)
+    columns = {name: np.round(values_, 2) for name, values_ in columns.items()}
+    metrics = _calculate_financial_metrics_batch(model, columns, loan_amount, equity_amount, itc_credit, overrides)
+
+    objective = np.empty(len(rows))
+    achieved = np.empty(len(rows))
+    for k, i in enumerate(rows):
+        metric, target_value = targets[i]['metric'], targets[i]['target_value']
+        achieved[k] = metrics[metric][k]
+        if metric in ('project_irr', 'equity_irr'):
+            if metric == 'project_irr':
+                flows = np.concatenate([[-equity_amount[k] - loan_amount[k] + itc_credit[k]], columns['项目自由现金流'][k]])
+            else:
+                flows = np.concatenate([[-equity_amount[k] + itc_credit[k]], columns['股权自由现金流'][k]])
+            objective[k] = np.sum(flows * (1 + target_value) ** -np.arange(len(flows)))
+        else:
+            objective[k] = achieved[k] - target_value
+    return objective, achieved
+
+def _solve_breakeven_batch(
+    model: ProjectModel,
+    targets: list,
+    cancel_event: threading.Event = None
+) -> Tuple[list, int]:
+    """
+    (新增) 对全部目标同时做区间求根: 每轮迭代只调用一次向量化内核。
+    先计算区间端点, 端点不异号的目标在区间内等距扫描寻找变号子区间,
+    再用Illinois法(改进的试位法)收缩区间, 落在区间外的试探点退化为二分。
+    返回 (各目标的求解结果, 内核调用次数)。
+    """
+    n = len(targets)
+    lower = np.array([t['lower'] for t in targets])
+    upper = np.array([t['upper'] for t in targets])
+    all_rows = np.arange(n)
+    evaluations = 1
+    f_both, metric_both = _breakeven_objective(model, targets, np.concatenate([all_rows, all_rows]),
+                                               np.concatenate([lower, upper]))
+    f_lower, f_upper = f_both[:n], f_both[n:]
+
+    # 端点不异号: 在区间内等距扫描, 取第一个变号子区间
+    unbracketed = np.flatnonzero(~(np.sign(f_lower) * np.sign(f_upper) <= 0))
+    if unbracketed.size:
+        fractions = np.linspace(0, 1, _BREAKEVEN_SCAN_POINTS + 2)[1:-1]
+        scan_rows = np.repeat(unbracketed, len(fractions))
+        scan_values = (lower[scan_rows] + (upper[scan_rows] - lower[scan_rows]) * np.tile(fractions, len(unbracketed)))
+        f_scan, _ = _breakeven_objective(model, targets, scan_rows, scan_values)
+        evaluations += 1
+        for j, i in enumerate(unbracketed):
+            xs = np.concatenate([[lower[i]], scan_values[j * len(fractions):(j + 1) * len(fractions)], [upper[i]]])
+            fs = np.concatenate([[f_lower[i]], f_scan[j * len(fractions):(j + 1) * len(fractions)], [f_upper[i]]])
+            changes = np.flatnonzero(np.sign(fs[:-1]) * np.sign(fs[1:]) <= 0)
+            if changes.size:
+                lower[i], upper[i] = xs[changes[0]], xs[changes[0] + 1]
+                f_lower[i], f_upper[i] = fs[changes[0]], fs[changes[0] + 1]
+
+    bracketed = np.sign(f_lower) * np.sign(f_upper) <= 0
+    status = np.where(bracketed, "未收敛", "区间内无解").astype(object)
+    iterations = np.zeros(n, dtype=int)
+    a, b, fa, fb = lower.copy(), upper.copy(), f_lower.copy(), f_upper.copy()
+    solution = np.full(n, np.nan)
+    achieved = np.full(n, np.nan)
+
+    # 端点恰为根
+    exact = bracketed & ((fa == 0) | (fb == 0))
+    solution[exact] = np.where(fa[exact] == 0, a[exact], b[exact])
+    status[exact] = "已求解"
+
+    active = bracketed & np.isnan(solution)
+    for iteration in range(1, _BREAKEVEN_MAX_ITERATIONS + 1):
+        rows = np.flatnonzero(active)
+        if rows.size == 0:
+            break
+        _raise_if_cancelled(cancel_event)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = b[rows] - fb[rows] * (b[rows] - a[rows]) / (fb[rows] - fa[rows])
+        low, high = np.minimum(a[rows], b[rows]), np.maximum(a[rows], b[rows])
+        outside = ~((c > low) & (c < high))
+        c[outside] = (a[rows][outside] + b[rows][outside]) / 2
+
+        fc, metric_c = _breakeven_objective(model, targets, rows, c)
+        evaluations += 1
+        iterations[rows] = iteration
+        achieved[rows] = metric_c
+
+        same_side = np.sign(fc) == np.sign(fb[rows])
+        # Illinois: 新点与b同侧时保留a并将其函数值减半, 否则原b成为新的a
+        fa[rows] = np.where(same_side, fa[rows] / 2, fb[rows])
+        a[rows] = np.where(same_side, a[rows], b[rows])
+        b[rows], fb[rows] = c, fc
+
+        tolerance = np.array([targets[i]['tolerance'] for i in rows])
+        width = np.abs(b[rows] - a[rows])
+        converged = (fc == 0) | (width <= tolerance * np.maximum(np.abs(c), 1.0))
+        solution[rows[converged]] = c[converged]
+        status[rows[converged]] = "已求解"
+        # 指标无定义(如无债务时的DSCR)导致目标函数为NaN时停止该目标
+        undefined = np.isnan(fc) & ~converged
+        status[rows[undefined]] = "指标无定义"
+        active[rows[converged | undefined]] = False
+
+    results = []
+    for i, target in enumerate(targets):
+        results.append({
+            "parameter": target['parameter'],
+            "path": list(target['path']),
+            "metric": target['metric'],
+            "target_value": target['target_value'],
+            "status": status[i],
+            "value": float(solution[i]),
+            "base_value": target['base_value'],
+            "change_from_base": float(solution[i] / target['base_value'] - 1) if target['base_value'] else float('nan'),
+            "achieved_metric": float(achieved[i]),
+            "search_range": [target['lower'], target['upper']],
+            "metric_at_search_bounds": [float(metric_both[i]), float(metric_both[n + i])],
+            "iterations": int(iterations[i])
+        })
+    return results, evaluations
+
+# --- 结果缓存: 按计算相关参数的规范化哈希缓存各阶段结果 ---
+
+# 计算逻辑变化导致旧结果失效时递增, 使磁盘缓存中的旧条目不再命中
+_CACHE_SCHEMA_VERSION = 1
+_CACHE_STAGES = ('statement', 'metrics', 'sensitivity', 'monte_carlo')
+
+class _StageResultCache:
+    """
+    (新增) 带容量上限与TTL的进程内LRU缓存, 可选磁盘层在服务重启后继续命中。
+    磁盘层同样受TTL与总大小上限约束: 文件修改时间为写入时间 (判断过期), 访问时间在每次命中时刷新 (LRU淘汰依据)。
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, disk_dir: str = None, max_disk_bytes: int = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {stage: {"hits": 0, "disk_hits": 0, "misses": 0} for stage in _CACHE_STAGES}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, stage: str, key: str) -> Any:
+        """返回缓存结果, 未命中或已过期时返回None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats[stage]["hits"] += 1
+                return entry[1]
+            self._entries.pop(key, None)
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._stats[stage]["misses"] += 1
+                return None
+            self._stats[stage]["disk_hits"] += 1
+            self._store(key, value, now)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store(key, value, time.monotonic())
+        self._write_disk(key, value)
+
+    def _store(self, key: str, value: Any, timestamp: float) -> None:
+        self._entries[key] = (timestamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _read_disk(self, key: str) -> Any:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            now = time.time()
+            modified = os.path.getmtime(path)
+            if now - modified > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            # 只刷新访问时间, 修改时间仍为写入时间, 命中不会延长TTL
+            os.utime(path, (now, modified))
+            return value
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key: str, value: Any) -> None:
+        if not self.disk_dir:
+            return
+        # 先写临时文件再原子替换, 避免并发读取到写了一半的文件
+        temp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._disk_path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._evict_disk(keep=key)
+
+    def _evict_disk(self, keep: str) -> None:
+        """删除过期的缓存文件与遗留的临时文件, 再按最近访问时间淘汰, 直至总大小不超过 max_disk_bytes"""
+        entries = []
+        total = 0
+        now = time.time()
+        with os.scandir(self.disk_dir) as it:
+            for item in it:
+                try:
+                    info = item.stat()
+                    if item.name.endswith('.tmp'):
+                        if now - info.st_mtime > self.ttl_seconds:
+                            os.remove(item.path)
+                        continue
+                    if not item.name.endswith('.pkl'):
+                        continue
+                    if now - info.st_mtime > self.ttl_seconds:
+                        os.remove(item.path)
+                        continue
+                except OSError:
+                    continue
+                total += info.st_size
+                if item.name != f"{keep}.pkl":
+                    entries.append((info.st_atime, info.st_size, item.path))
+
+        if self.max_disk_bytes is None:
+            return
+        # 刚写入的条目保留, 其余按最近访问时间从旧到新淘汰
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
             try:
-                # 重新计算现金流和财务指标
-                cf_df, loan_amount, equity_amount, itc_credit = _generate_dynamic_yearly_cashflow_statement(temp_params)
-                metrics = _calculate_financial_metrics_v3(temp_params, cf_df, loan_amount, equity_amount, itc_credit)
-                
-                # 同时记录项目IRR和股权IRR
-                sensitivities[f"变化 {change:+.0%}"] = {
-                    "项目IRR": metrics['project_irr_percent'],
-                    "股权IRR": metrics['equity_irr_percent'],
-                    "最小DSCR": metrics.get('min_dscr', 'N/A')
-                }
-            except:
-                sensitivities[f"变化 {change:+.0%}"] = "计算错误"
-        results[f"{name}_sensitivity"] = sensitivities
-        
-    return results
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_dir": self.disk_dir,
+                "max_disk_bytes": self.max_disk_bytes,
+                "stages": {stage: dict(counts) for stage, counts in self._stats.items()}
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for counts in self._stats.values():
+                counts.update(hits=0, disk_hits=0, misses=0)
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.disk_dir, name))
+
+_result_cache = _StageResultCache(
+    max_entries=int(os.environ.get('ECONOMY_CACHE_MAX_ENTRIES', 256)),
+    ttl_seconds=float(os.environ.get('ECONOMY_CACHE_TTL_SECONDS', 3600)),
+    disk_dir=os.environ.get('ECONOMY_CACHE_DIR') or None,
+    max_disk_bytes=int(float(os.environ.get('ECONOMY_CACHE_MAX_DISK_MB', 512)) * 2**20)
+)
+
+def _stage_cache_key(params: Dict[str, Any], stage: str, variant: str = None) -> str:
+    """
+    (新增) 计算阶段缓存键: 仅包含影响该阶段计算的参数的规范化JSON哈希。
+    project_info 不参与计算; 蒙特卡洛与敏感性配置只进入各自阶段的键。
+    variant 区分同一阶段的不同结果形态 (如附带逐次模拟数组的蒙特卡洛结果)。
+    """
+    inputs = {key: value for key, value in params.items() if key != 'project_info'}
+    finance = dict(inputs.get('financial_assumptions', {}))
+    monte_carlo = finance.pop('monte_carlo', None)
+    sensitivity = finance.pop('sensitivity', None)
+    inputs['financial_assumptions'] = finance
+    if stage == 'sensitivity':
+        inputs['sensitivity'] = sensitivity
+    elif stage == 'monte_carlo':
+        inputs['monte_carlo'] = monte_carlo
+    # 以文件提供的电价曲线按文件大小与修改时间区分版本
+    curve = inputs.get('market_and_policy', {}).get('price_curve')
+    if isinstance(curve, dict) and 'file_path' in curve and 'prices_usd_per_kwh' not in curve:
+        inputs['price_curve_source'] = _price_curve_source_key(curve)
+
+    key_parts = [_CACHE_SCHEMA_VERSION, stage, inputs] + ([variant] if variant else [])
+    canonical = json.dumps(key_parts, sort_keys=True,
+                           separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _cached_stage(params: Dict[str, Any], stage: str, compute, use_cache: bool = True) -> Any:
+    """(新增) 读取阶段缓存, 未命中时计算并写入; 计算异常时不缓存"""
+    if not use_cache:
+        return compute()
+    key = _stage_cache_key(params, stage)
+    value = _result_cache.get(stage, key)
+    if value is None:
+        value = compute()
+        _result_cache.put(key, value)
+    return value
+
+def _monte_carlo_is_cacheable(params: Dict[str, Any]) -> bool:
+    """(新增) 只有给定seed的蒙特卡洛模拟结果可复现, 才允许缓存"""
+    return (params['financial_assumptions'].get('monte_carlo') or {}).get('seed') is not None
+
+# --- 报告层: 数值结果的统一格式化 ---
+
+def _format_percent(value: float) -> str:
+    """(新增) 将比例格式化为百分数字符串, NaN显示为N/A"""
+    return f"{value:.2%}" if not math.isnan(value) else "N/A"
+
+def _format_financial_summary(metrics: FinancialMetrics) -> Dict[str, Any]:
+    """(新增) 将基准情景的财务指标格式化为报告中的展示字段"""
+    return {
+        "project_npv_usd": f"{metrics.project_npv_usd:,.2f}",
+        "project_irr_percent": _format_percent(metrics.project_irr),
+        "equity_npv_usd": f"{metrics.equity_npv_usd:,.2f}",
+        "equity_irr_percent": _format_percent(metrics.equity_irr),
+        "project_irr_status": IRR_STATUS_LABELS[metrics.project_irr_status],
+        "equity_irr_status": IRR_STATUS_LABELS[metrics.equity_irr_status],
+        "project_discounted_payback_years": round(metrics.project_discounted_payback_years, 2)
+            if not math.isnan(metrics.project_discounted_payback_years) else "N/A",
+        "equity_discounted_payback_years": round(metrics.equity_discounted_payback_years, 2)
+            if not math.isnan(metrics.equity_discounted_payback_years) else "N/A",
+        "min_dscr": round(metrics.min_dscr, 2),
+        "avg_dscr": round(metrics.avg_dscr, 2),
+        "levelized_cost_of_storage_usd_per_kwh": round(metrics.levelized_cost_of_storage_usd_per_kwh, 4),
+        "financing_summary": {
+            "debt_amount": metrics.debt_amount,
+            "equity_amount": metrics.equity_amount,
+            "debt_ratio": metrics.debt_ratio,
+            "itc_credit": metrics.itc_credit
+        }
+    }
+
+def _format_monte_carlo_report(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 格式化蒙特卡洛统计量: IRR与概率显示为百分数, DSCR保留两位小数"""
+    report = {}
+    for key, value in summary.items():
+        if key == 'mean_min_dscr':
+            report[key] = round(value, 2)
+        elif key == 'convergence':
+            report[key] = {**value, "ci_half_widths": {name: _format_percent(half_width)
+                                                       for name, half_width in value['ci_half_widths'].items()}}
+        elif key.startswith(('mean_', 'std_dev_', 'percentile_', 'probability_')):
+            report[key] = _format_percent(value)
+        else:
+            report[key] = value
+    return report
+
+def _format_sensitivity_report(sensitivity: Dict[str, Any]) -> Dict[str, Any]:
+    """(重构) 格式化敏感性分析结果: 单因素情景、龙卷风排序与双因素网格"""
+    report = {}
+    for variable, scenarios in sensitivity.items():
+        if variable == 'tornado_ranking':
+            report[variable] = {
+                "基准项目IRR": _format_percent(scenarios['base_project_irr']),
+                "排序": [{
+                    "变量": item['variable'],
+                    "变化范围": f"{item['low_delta']:+.0%} ~ {item['high_delta']:+.0%}",
+                    "项目IRR区间": f"{_format_percent(item['project_irr_low'])} ~ {_format_percent(item['project_irr_high'])}",
+                    "股权IRR区间": f"{_format_percent(item['equity_irr_low'])} ~ {_format_percent(item['equity_irr_high'])}",
+                    "项目IRR摆幅": _format_percent(item['project_irr_swing']),
+                    "股权IRR摆幅": _format_percent(item['equity_irr_swing'])
+                } for item in scenarios['ranking']]
+            }
+        elif variable == 'two_way_grids':
+            report[variable] = [{
+                "x变量": grid['x_variable'],
+                "y变量": grid['y_variable'],
+                "x变化": [_delta_label(change) for change in grid['x_deltas']],
+                "y变化": [_delta_label(change) for change in grid['y_deltas']],
+                "项目IRR": [[_format_percent(value) for value in row] for row in grid['project_irr']],
+                "股权IRR": [[_format_percent(value) for value in row] for row in grid['equity_irr']],
+                "最小DSCR": [[round(value, 2) for value in row] for row in grid['min_dscr']]
+            } for grid in scenarios]
+        else:
+            report[variable] = {
+                label: {
+                    "项目IRR": _format_percent(metrics['project_irr']),
+                    "股权IRR": _format_percent(metrics['equity_irr']),
+                    "最小DSCR": round(metrics['min_dscr'], 2)
+                } if metrics is not None else "计算错误"
+                for label, metrics in scenarios.items()
+            }
+    return report
+
+def _format_monte_carlo_progress(results: Dict[str, Any]) -> str:
+    """(新增) 将阶段性蒙特卡洛结果压缩为一行进度消息"""
+    message = f"已完成 {results['num_simulations']} 次模拟"
+    if 'mean_project_irr' in results:
+        message += (f", 项目IRR均值 {_format_percent(results['mean_project_irr'])}"
+                    f", P5 {_format_percent(results['percentile_5th_project_irr'])}")
+    if 'convergence' in results:
+        message += ", 已收敛" if results['convergence']['converged'] else ", 未收敛"
+    return message
+
+def _format_portfolio_metrics(metrics: Dict[str, float]) -> Dict[str, Any]:
+    """(新增) 格式化项目组合排名表中单个项目的基准指标"""
+    return {
+        "project_npv_usd": f"{metrics['project_npv_usd']:,.2f}",
+        "project_irr_percent": _format_percent(metrics['project_irr']),
+        "project_irr_status": IRR_STATUS_LABELS[int(metrics['project_irr_status'])],
+        "equity_npv_usd": f"{metrics['equity_npv_usd']:,.2f}",
+        "equity_irr_percent": _format_percent(metrics['equity_irr']),
+        "min_dscr": round(metrics['min_dscr'], 2),
+        "levelized_cost_of_storage_usd_per_kwh": round(metrics['levelized_cost_of_storage_usd_per_kwh'], 4)
+    }
+
+def _format_portfolio_risk(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 排名表中的精简风险指标: 项目IRR的P5、超过折现率的概率与DSCR低于1.2的概率"""
+    keys = ('status', 'percentile_5th_project_irr', 'probability_project_irr_above_discount_rate',
+            'probability_dscr_below_1.2')
+    return _format_monte_carlo_report({key: summary[key] for key in keys if key in summary})
+
+def _to_json_safe(value: Any) -> Any:
+    """(新增) 递归地将NaN/inf替换为None, 便于客户端直接解析原始数值"""
+    if isinstance(value, dict):
+        return {key: _to_json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+# 报告的输出形态: 逐年记录 (默认) 或列式数组; 可选的报告章节; 蒙特卡洛分布的输出方式
+_OUTPUT_FORMATS = ('records', 'columnar')
+_REPORT_SECTIONS = ('project', 'assessment_summary', 'risk_assessment_monte_carlo',
+                    'sensitivity_analysis', 'detailed_financials_statement')
+_MONTE_CARLO_DETAILS = ('histogram', 'samples')
+
+def _resolve_report_options(
+    output_format: str,
+    sections: List[str],
+    monte_carlo_detail: str,
+    histogram_bins: int
+) -> Dict[str, Any]:
+    """(新增) 校验报告输出选项, 未指定章节时输出全部章节"""
+    if output_format not in _OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}, 可选 {', '.join(_OUTPUT_FORMATS)}")
+    sections = list(_REPORT_SECTIONS) if sections is None else list(sections)
+    unknown = [name for name in sections if name not in _REPORT_SECTIONS]
+    if unknown:
+        raise ValueError(f"不支持的报告章节: {', '.join(unknown)}, 可选 {', '.join(_REPORT_SECTIONS)}")
+    if monte_carlo_detail is not None and monte_carlo_detail not in _MONTE_CARLO_DETAILS:
+        raise ValueError(f"不支持的蒙特卡洛分布输出方式: {monte_carlo_detail}, 可选 {', '.join(_MONTE_CARLO_DETAILS)}")
+    if int(histogram_bins) < 1:
+        raise ValueError("histogram_bins 必须为正整数")
+    return {
+        "output_format": output_format,
+        "sections": sections,
+        "monte_carlo_detail": monte_carlo_detail,
+        "histogram_bins": int(histogram_bins)
+    }
+
+def _records_to_columns(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """(新增) 将字段相同的记录列表转换为列式结构: 列名只出现一次, 每列一个向量"""
+    columns = list(records[0]) if records else []
+    return {"columns": columns, "data": [[record[column] for record in records] for column in columns]}
+
+def _format_statement_columnar(cashflow_statement_df: 'pd.DataFrame') -> Dict[str, Any]:
+    """(新增) 列式现金流量表, 数值与逐年记录格式相同 (保留两位小数)"""
+    table = cashflow_statement_df.reset_index().round(2)
+    return _to_json_safe({"columns": list(table.columns), "data": [table[column].tolist() for column in table.columns]})
+
+def _format_sensitivity_columnar(sensitivity: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 列式敏感性结果: 每个变量给出变化幅度与各指标的数值向量, 计算失败的情景为null"""
+    report = {}
+    for variable, scenarios in sensitivity.items():
+        if variable == 'tornado_ranking':
+            report[variable] = {"base_project_irr": scenarios['base_project_irr'],
+                                "ranking": _records_to_columns(scenarios['ranking'])}
+        elif variable == 'two_way_grids':
+            report[variable] = scenarios
+        else:
+            labels = list(scenarios)
+            report[variable] = {
+                "changes": labels,
+                **{key: [scenarios[label][key] if scenarios[label] is not None else None for label in labels]
+                   for key in ('project_irr', 'equity_irr', 'min_dscr')}
+            }
+    return _to_json_safe(report)
+
+def _format_monte_carlo_distribution(samples: Dict[str, np.ndarray], detail: str, bins: int) -> Dict[str, Any]:
+    """
+    (新增) 蒙特卡洛逐次结果的分布: histogram 输出分箱边界与计数 (不含无解的情景, 单列计数),
+    samples 输出原始数组 (保留6位小数, 无解为null)
+    """
+    distribution = {}
+    for key, values in samples.items():
+        finite = values[np.isfinite(values)]
+        if detail == 'histogram':
+            counts, edges = np.histogram(finite, bins=bins) if finite.size else (np.array([], dtype=int), np.array([]))
+            distribution[key] = {
+                "bin_edges": np.round(edges, 6).tolist(),
+                "counts": counts.tolist(),
+                "excluded_count": int(values.size - finite.size)
+            }
+        else:
+            distribution[key] = _to_json_safe(np.round(values, 6).tolist())
+    return distribution
+
+# --- 执行调度: 将CPU密集计算移出MCP事件循环 ---
+
+class _ComputeCancelled(Exception):
+    """(新增) 请求被客户端取消或超时后, 计算在检查点处主动终止"""
+
+class _ComputeRejected(Exception):
+    """(新增) 并发与排队名额均已占满, 拒绝新的计算请求"""
+
+def _raise_if_cancelled(cancel_event: threading.Event) -> None:
+    """(新增) 协作式取消的检查点: 在阶段之间或批次之间调用"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise _ComputeCancelled()
+
+class _ComputeScheduler:
+    """
+    (新增) 有界并发的计算调度器: 计算在专用线程池中执行, 事件循环保持响应。
+    超过并发上限的请求在线程池队列中排队, 排队数超过上限时直接拒绝;
+    超时或客户端取消时设置取消标志, 计算在下一个检查点终止, 尚未开始的请求直接出队。
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, timeout_seconds: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='economy-compute')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    async def run(self, func, *args, timeout_seconds: float = None) -> Any:
+        """在线程池中执行 func(*args, cancel_event), 等待结果期间不阻塞事件循环"""
+        with self._lock:
+            if self._in_flight >= self.max_concurrent + self.max_queued:
+                raise _ComputeRejected(f"服务繁忙: 已有 {self._in_flight} 个计算任务在执行或排队, 请稍后重试")
+            self._in_flight += 1
+
+        cancel_event = threading.Event()
+        future = self._executor.submit(func, *args, cancel_event)
+        # 名额在计算真正结束(或出队)后才释放, 保证并发上限对已取消但仍在收尾的任务同样有效
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout_seconds or self.timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            cancel_event.set()
+            future.cancel()
+            raise
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+_compute_scheduler = _ComputeScheduler(
+    max_concurrent=int(os.environ.get('ECONOMY_MAX_CONCURRENT_RUNS', 2)),
+    max_queued=int(os.environ.get('ECONOMY_MAX_QUEUED_RUNS', 8)),
+    timeout_seconds=float(os.environ.get('ECONOMY_RUN_TIMEOUT_SECONDS', 600))
+)
+
+def _make_progress_reporter(ctx: Context, loop: asyncio.AbstractEventLoop):
+    """(新增) 供计算线程使用的进度回调: 将进度通知投递回事件循环, 不等待发送完成"""
+    if ctx is None:
+        return None
+
+    def report(progress: float, total: float, message: str) -> None:
+        asyncio.run_coroutine_threadsafe(ctx.report_progress(progress, total, message=message), loop)
+    return report
+
+async def _run_scheduled(func, *args, timeout_seconds: float = None) -> Dict[str, Any]:
+    """(新增) 通过调度器执行计算, 并将排队拒绝和超时转换为错误信息; 客户端取消时继续向上抛出"""
+    try:
+        return await _compute_scheduler.run(func, *args, timeout_seconds=timeout_seconds)
+    except _ComputeRejected as e:
+        return {"error": str(e)}
+    except asyncio.TimeoutError:
+        return {"error": f"计算超时: 超过 {timeout_seconds or _compute_scheduler.timeout_seconds} 秒仍未完成, 已取消计算"}
+
+# --- 诊断: 可选的分阶段计时、内存高水位与性能剖析 ---
+
+_diagnostics_logger = logging.getLogger('economy.diagnostics')
+# 设置后每个请求的诊断记录都以一行JSON写入日志 (MCP stdio 模式下输出到标准错误)
+_DIAGNOSTICS_LOG_ENABLED = os.environ.get('ECONOMY_DIAGNOSTICS_LOG', '').lower() in ('1', 'true', 'yes')
+# cProfile 在 Python 3.12+ 基于 sys.monitoring, 同一时刻只能有一个剖析器, 并发请求中只剖析其一
+_profile_lock = threading.Lock()
+
+def _count_miss(record: Dict[str, Any], compute):
+    """(新增) 包装阶段计算函数: 实际执行计算 (缓存未命中或未启用缓存) 时在诊断记录中标记"""
+    def run():
+        record['cache_hit'] = False
+        return compute()
+    return run
+
+def _max_rss_bytes() -> Optional[int]:
+    """(新增) 进程常驻内存的高水位 (字节); 平台不支持时返回None"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KiB 为单位, macOS 以字节为单位
+    return int(max_rss if sys.platform == 'darwin' else max_rss * 1024)
+
+class _StageDiagnostics:
+    """
+    (新增) 一次请求的分阶段诊断记录: 各阶段的墙钟时间、计算线程CPU时间、处理量(行数/模拟次数等)
+    与进程内存高水位; 若进程已启用 tracemalloc (如 PYTHONTRACEMALLOC=1), 另记录各阶段的Python分配峰值。
+    未启用时 stage() 不做任何测量, 计算流程无需区分两种情况。
+    """
+
+    def __init__(self, include_in_report: bool, profile: bool):
+        self.include_in_report = include_in_report
+        self.log = _DIAGNOSTICS_LOG_ENABLED
+        self.profile = profile
+        self.enabled = include_in_report or profile or self.log
+        self.stages = []
+        self.created_at = time.perf_counter()
+        self.queue_wait_s = None
+        self.profile_result = None
+        self._profiler = None
+
+    @contextmanager
+    def stage(self, name: str, **counts):
+        """记录一个阶段; 可在阶段内向产出的字典写入处理量或缓存命中等附加信息"""
+        record = dict(counts)
+        if not self.enabled:
+            yield record
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            entry = {
+                "stage": name,
+                "wall_time_s": round(time.perf_counter() - wall_start, 6),
+                "cpu_time_s": round(time.thread_time() - cpu_start, 6),
+                **record,
+                "max_rss_bytes": _max_rss_bytes()
+            }
+            if tracing:
+                entry["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(entry)
+
+    def wrap(self, func):
+        """包装调度器执行的计算函数: 记录排队时长, 按需剖析, 并在结果中附加诊断信息"""
+        def run(*args):
+            if not self.enabled:
+                return func(*args)
+            self.queue_wait_s = round(time.perf_counter() - self.created_at, 6)
+            self._start_profile()
+            try:
+                try:
+                    result = func(*args)
+                finally:
+                    self._stop_profile()
+            except _ComputeCancelled:
+                self._emit("cancelled")
+                raise
+            if isinstance(result, dict):
+                # 估算响应体积与序列化耗时 (MCP框架随后会再序列化一次)
+                with self.stage('serialization') as info:
+                    info['payload_bytes'] = len(json.dumps(result, ensure_ascii=False, default=str).encode('utf-8'))
+            report = self._emit("error" if isinstance(result, dict) and 'error' in result else "ok")
+            if self.include_in_report and isinstance(result, dict):
+                result["_diagnostics"] = report
+            return result
+        return run
+
+    def _start_profile(self) -> None:
+        if not self.profile:
+            return
+        if not _profile_lock.acquire(blocking=False):
+            self.profile_result = {"error": "已有其他请求正在进行性能剖析, 本次未采集"}
+            return
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError as e:
+            # 其他剖析工具 (如调试器) 已占用 sys.monitoring
+            self._profiler = None
+            _profile_lock.release()
+            self.profile_result = {"error": f"无法启动性能剖析: {e}"}
+
+    def _stop_profile(self) -> None:
+        if self._profiler is None:
+            return
+        try:
+            self._profiler.disable()
+        finally:
+            _profile_lock.release()
+        profile_dir = os.environ.get('ECONOMY_PROFILE_DIR') or tempfile.gettempdir()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"economy-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{id(self):x}.prof")
+        self._profiler.dump_stats(path)
+        stats = pstats.Stats(self._profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:20]
+        self.profile_result = {
+            "path": path,
+            "top_cumulative": [
+                {"function": f"{os.path.basename(filename)}:{line}({name})", "calls": calls,
+                 "total_time_s": round(total_time, 6), "cumulative_time_s": round(cumulative_time, 6)}
+                for (filename, line, name), (_, calls, total_time, cumulative_time, _) in top
+            ]
+        }
+        self._profiler = None
+
+    def _emit(self, status: str) -> Dict[str, Any]:
+        report = {
+            "status": status,
+            "queue_wait_s": self.queue_wait_s,
+            "total_wall_time_s": round(time.perf_counter() - self.created_at, 6),
+            "stages": self.stages
+        }
+        if self.profile_result is not None:
+            report["profile"] = self.profile_result
+        if self.log:
+            _diagnostics_logger.info(json.dumps(report, ensure_ascii=False, default=str))
+        return report
 
 # --- 主MCP工具函数 (V3 - 专家版) ---
-@mcp.tool()
-async def analyze_storage_station_economics_expert(project_parameters: Dict[str, Any]) -> Dict[str, Any]:
+def _run_economics_analysis(
+    project_parameters: Dict[str, Any],
+    include_raw_metrics: bool,
+    use_cache: bool,
+    report_options: Dict[str, Any],
+    diagnostics: _StageDiagnostics,
+    progress_callback,
+    cancel_event: threading.Event
+) -> Dict[str, Any]:
     """
-    一个专家级的储能电站经济效益与风险评估工具。
-    它整合了多种盈利模式、详细的成本与税务模型、动态效率衰减、
-    全面的敏感性分析以及蒙特卡洛风险模拟。
+    (新增) 专家分析的完整计算流程, 在调度器线程中执行, 各阶段之间检查取消标志。
+    未选择的报告章节对应的敏感性分析或蒙特卡洛模拟不会执行; 启用诊断时逐阶段记录耗时与处理量。
     """
+    sections = report_options['sections']
+    columnar = report_options['output_format'] == 'columnar'
+    monte_carlo_detail = report_options['monte_carlo_detail']
     try:
+        # 请求入口处一次性校验参数, 问题在进入各阶段计算之前全部报告
+        with diagnostics.stage('validate'):
+            _compile_project_parameters(project_parameters)
+
         # --- 1. 生成核心的动态现金流量表 ---
-        cashflow_statement_df, loan_amount, equity_amount, itc_credit = _generate_dynamic_yearly_cashflow_statement(project_parameters)
+        with diagnostics.stage('statement', cache_hit=True) as info:
+            cashflow_statement_df, loan_amount, equity_amount, itc_credit = _cached_stage(
+                project_parameters, 'statement',
+                _count_miss(info, lambda: _generate_dynamic_yearly_cashflow_statement(project_parameters)),
+                use_cache
+            )
+            info['rows'] = len(cashflow_statement_df)
         
         # --- 2. 计算基准情景下的财务指标 ---
-        financial_summary = _calculate_financial_metrics_v3(
-            project_parameters, 
-            cashflow_statement_df,
-            loan_amount,
-            equity_amount,
-            itc_credit
-        )
+        with diagnostics.stage('metrics', cache_hit=True) as info:
+            base_metrics = _cached_stage(
+                project_parameters, 'metrics',
+                _count_miss(info, lambda: _calculate_financial_metrics_v3(
+                    project_parameters, 
+                    cashflow_statement_df,
+                    loan_amount,
+                    equity_amount,
+                    itc_credit
+                )),
+                use_cache
+            )
+        _raise_if_cancelled(cancel_event)
 
         # --- 3. 执行扩展的敏感性分析 ---
-        sensitivity_report = _perform_expanded_sensitivity_analysis(project_parameters)
-
-        # --- 4. 执行蒙特卡洛风险模拟 ---
-        monte_carlo_report = _perform_monte_carlo_simulation(project_parameters)
-
-        # --- 5. 组装最终的专家报告 ---
-        analysis_report = {
-            "project": project_parameters.get("project_info", {}),
-            "assessment_summary": {
-                "verdict": "项目在基准情景下具备投资价值，且风险评估结果较为乐观。" 
-                           if financial_summary.get('project_irr_percent', '0%') != 'N/A' and 
-                              float(financial_summary['project_irr_percent'].strip('%')) > project_parameters['financial_assumptions']['discount_rate']*100 and
-                              financial_summary.get('min_dscr', 0) > 1.2
-                           else "项目在基准情景下盈利能力较弱或风险过高，建议谨慎投资。",
-                **financial_summary
-            },
-            "risk_assessment_monte_carlo": monte_carlo_report,
-            "sensitivity_analysis": sensitivity_report,
-            "detailed_financials_statement": cashflow_statement_df.reset_index().round(2).to_dict(orient='records')
-        }
+        sensitivity_results = None
+        if 'sensitivity_analysis' in sections:
+            with diagnostics.stage('sensitivity', cache_hit=True) as info:
+                sensitivity_results = _cached_stage(
+                    project_parameters, 'sensitivity',
+                    _count_miss(info, lambda: _perform_expanded_sensitivity_analysis(project_parameters)),
+                    use_cache
+                )
+                info['variables'] = sum(key.endswith('_sensitivity') for key in sensitivity_results)
+            _raise_if_cancelled(cancel_event)
+
+        # --- 4. 执行蒙特卡洛风险模拟 (仅给定seed时可复现, 才读写缓存) ---
+        monte_carlo_results = None
+        if 'risk_assessment_monte_carlo' in sections:
+            keep_samples = monte_carlo_detail is not None
+            cache_monte_carlo = use_cache and _monte_carlo_is_cacheable(project_parameters)
+            monte_carlo_key = _stage_cache_key(project_parameters, 'monte_carlo',
+                                               'samples' if keep_samples else None) if cache_monte_carlo else None
+            with diagnostics.stage('monte_carlo') as info:
+                monte_carlo_results = _result_cache.get('monte_carlo', monte_carlo_key) if cache_monte_carlo else None
+                info['cache_hit'] = monte_carlo_results is not None
+                if monte_carlo_results is None:
+                    for monte_carlo_results in _iter_monte_carlo_simulation(project_parameters, keep_samples=keep_samples,
+                                                                            cancel_event=cancel_event):
+                        _raise_if_cancelled(cancel_event)
+                        if progress_callback is not None and 'num_simulations' in monte_carlo_results:
+                            progress_callback(
+                                monte_carlo_results['num_simulations'],
+                                monte_carlo_results['planned_simulations'],
+                                _format_monte_carlo_progress(monte_carlo_results)
+                            )
+                    if cache_monte_carlo:
+                        _result_cache.put(monte_carlo_key, monte_carlo_results)
+                info['draws'] = monte_carlo_results.get('num_simulations')
+
+        # --- 5. 组装最终的专家报告 (唯一的格式化环节) ---
+        is_investable = (base_metrics.project_irr > project_parameters['financial_assumptions']['discount_rate'] and
+                         base_metrics.min_dscr > 1.2)
+        # 逐次模拟数组只用于分布输出, 不进入统计量报告 (缓存中的结果对象保持不变)
+        samples = None
+        if monte_carlo_results is not None:
+            samples = monte_carlo_results.get('samples')
+            monte_carlo_results = {key: value for key, value in monte_carlo_results.items() if key != 'samples'}
+
+        with diagnostics.stage('report', output_format=report_options['output_format']):
+            analysis_report = {}
+            if 'project' in sections:
+                analysis_report["project"] = project_parameters.get("project_info", {})
+            if 'assessment_summary' in sections:
+                analysis_report["assessment_summary"] = {
+                    "verdict": "项目在基准情景下具备投资价值，且风险评估结果较为乐观。" 
+                               if is_investable
+                               else "项目在基准情景下盈利能力较弱或风险过高，建议谨慎投资。",
+                    **_format_financial_summary(base_metrics)
+                }
+            if monte_carlo_results is not None:
+                risk_report = (_to_json_safe(monte_carlo_results) if columnar
+                               else _format_monte_carlo_report(monte_carlo_results))
+                if samples is not None:
+                    risk_report["distribution"] = _format_monte_carlo_distribution(
+                        samples, monte_carlo_detail, report_options['histogram_bins'])
+                analysis_report["risk_assessment_monte_carlo"] = risk_report
+            if sensitivity_results is not None:
+                analysis_report["sensitivity_analysis"] = (_format_sensitivity_columnar(sensitivity_results) if columnar
+                                                           else _format_sensitivity_report(sensitivity_results))
+            if 'detailed_financials_statement' in sections:
+                analysis_report["detailed_financials_statement"] = (
+                    _format_statement_columnar(cashflow_statement_df) if columnar
+                    else cashflow_statement_df.reset_index().round(2).to_dict(orient='records')
+                )
+            if include_raw_metrics:
+                raw_metrics = {"base_case": asdict(base_metrics)}
+                if sensitivity_results is not None:
+                    raw_metrics["sensitivity"] = sensitivity_results
+                if monte_carlo_results is not None:
+                    raw_metrics["monte_carlo"] = monte_carlo_results
+                analysis_report["raw_metrics"] = _to_json_safe(raw_metrics)
         return analysis_report
 
+    except _ComputeCancelled:
+        raise
+    except ParameterValidationError as e:
+        return {"error": f"输入参数校验失败: {e}", "validation_errors": e.problems}
+    except KeyError as e:
+        return {"error": f"输入参数缺失: 缺少关键字段 '{e}'。请检查 'project_parameters' 字典的完整性。"}
+    except Exception as e:
+        import traceback
+        return {"error": f"计算过程中发生未知错误: {e}", "trace": traceback.format_exc()}
+
+@mcp.tool()
+async def analyze_storage_station_economics_expert(
+    project_parameters: Dict[str, Any],
+    include_raw_metrics: bool = False,
+    use_cache: bool = True,
+    timeout_seconds: float = None,
+    output_format: str = "records",
+    sections: List[str] = None,
+    monte_carlo_detail: str = None,
+    histogram_bins: int = 20,
+    diagnostics: bool = False,
+    profile: bool = False,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    一个专家级的储能电站经济效益与风险评估工具。
+    它整合了多种盈利模式、详细的成本与税务模型、动态效率衰减、
+    全面的敏感性分析以及蒙特卡洛风险模拟。
+
+    Args:
+        project_parameters: 完整的项目参数字典。
+        include_raw_metrics: 为True时在报告中附加 raw_metrics 字段, 以原始浮点数(比例而非百分数)
+            提供基准指标、敏感性分析和蒙特卡洛统计量, 客户端无需再解析格式化字符串。
+        use_cache: 为True时按计算相关参数的哈希复用已缓存的各阶段结果 (仅修改 project_info 也会命中);
+            蒙特卡洛结果仅在给定seed时缓存。
+        timeout_seconds: 本次请求的超时时间(秒, 含排队时间), 默认使用服务端配置。
+        output_format: "records"(默认, 现金流量表为逐年记录, 统计量为格式化字符串) 或 "columnar"
+            (现金流量表、敏感性结果以列名 + 数值向量给出, 蒙特卡洛统计量为原始浮点数), 后者显著减小响应体积。
+        sections: 需要输出的报告章节, 默认全部; 可选 project, assessment_summary,
+            risk_assessment_monte_carlo, sensitivity_analysis, detailed_financials_statement。
+            未选择的敏感性分析与蒙特卡洛模拟不会执行。
+        monte_carlo_detail: 在蒙特卡洛章节附加逐次模拟结果的分布: "histogram"(分箱边界与计数)
+            或 "samples"(原始数组); 默认不附加。
+        histogram_bins: 直方图分箱数, 默认20。
+        diagnostics: 为True时在报告中附加 _diagnostics 字段: 排队时长, 以及参数校验、现金流量表、财务指标、
+            敏感性分析、蒙特卡洛模拟、报告组装、序列化各阶段的墙钟/CPU时间、行数/模拟次数、缓存命中与内存高水位。
+        profile: 为True时对本次计算进行cProfile剖析, 剖析文件写入 ECONOMY_PROFILE_DIR (默认系统临时目录),
+            路径与累计耗时最高的函数在 _diagnostics.profile 中给出 (隐含 diagnostics=True)。
+        ctx: 由MCP框架注入的请求上下文。蒙特卡洛模拟每完成一批即发送一次进度通知,
+            附带当前的IRR均值、P5与收敛状态。
+    """
+    try:
+        report_options = _resolve_report_options(output_format, sections, monte_carlo_detail, histogram_bins)
+    except ValueError as e:
+        return {"error": str(e)}
+    progress_callback = _make_progress_reporter(ctx, asyncio.get_running_loop())
+    stage_diagnostics = _StageDiagnostics(include_in_report=diagnostics or profile, profile=profile)
+    return await _run_scheduled(stage_diagnostics.wrap(_run_economics_analysis), project_parameters,
+                                include_raw_metrics, use_cache, report_options, stage_diagnostics, progress_callback,
+                                timeout_seconds=timeout_seconds)
+
+def _run_portfolio_analysis(
+    projects: List[Dict[str, Any]],
+    sort_by: str,
+    include_risk: bool,
+    risk_workers: Union[int, str],
+    include_raw_metrics: bool,
+    cancel_event: threading.Event
+) -> Dict[str, Any]:
+    """(新增) 项目组合评估的完整计算流程, 在调度器线程中执行, 批次与项目之间检查取消标志"""
+    try:
+        if sort_by not in _PORTFOLIO_SORT_KEYS:
+            return {"error": f"不支持的排序指标: {sort_by}, 可选 {', '.join(_PORTFOLIO_SORT_KEYS)}"}
+
+        # --- 1. 分批向量化计算基准情景指标 ---
+        metrics, errors, num_batches = _evaluate_portfolio(projects, cancel_event)
+
+        # --- 2. 可选: 逐项目风险评估 (共享进程池) ---
+        risk_results = {}
+        if include_risk:
+            evaluated = sorted(metrics)
+            workers = (os.cpu_count() or 1) if risk_workers == 'auto' else int(risk_workers)
+            if workers > 1 and len(evaluated) > 1:
+                results = _map_in_process_pool(_run_portfolio_risk, [(projects[i],) for i in evaluated], workers,
+                                               cancel_event)
+                risk_results = dict(zip(evaluated, results))
+            else:
+                for i in evaluated:
+                    _raise_if_cancelled(cancel_event)
+                    risk_results[i] = _run_portfolio_risk(projects[i])
+
+        # --- 3. 排序并组装精简排名表 ---
+        descending = _PORTFOLIO_SORT_KEYS[sort_by]
+        def sort_key(i: int) -> Tuple[bool, float]:
+            value = metrics[i][sort_by]
+            return (math.isnan(value), -value if descending else value)
+
+        ranking = []
+        for rank, i in enumerate(sorted(metrics, key=sort_key), start=1):
+            row = {
+                "rank": rank,
+                "index": i,
+                "name": projects[i].get('project_info', {}).get('name', f"项目{i + 1}"),
+                **_format_portfolio_metrics(metrics[i])
+            }
+            if include_risk:
+                row["risk"] = _format_portfolio_risk(risk_results[i])
+            if include_raw_metrics:
+                row["raw_metrics"] = _to_json_safe({**metrics[i], **({"risk": risk_results[i]} if include_risk else {})})
+            ranking.append(row)
+
+        return {
+            "num_projects": len(projects),
+            "num_batches": num_batches,
+            "sort_by": sort_by,
+            "ranking": ranking,
+            "errors": [
+                {"index": i, "name": projects[i].get('project_info', {}).get('name', f"项目{i + 1}"), "error": errors[i]}
+                for i in sorted(errors)
+            ]
+        }
+
+    except _ComputeCancelled:
+        raise
+    except Exception as e:
+        import traceback
+        return {"error": f"计算过程中发生未知错误: {e}", "trace": traceback.format_exc()}
+
+@mcp.tool()
+async def analyze_storage_portfolio(
+    projects: List[Dict[str, Any]],
+    sort_by: str = "project_npv_usd",
+    include_risk: bool = False,
+    risk_workers: Union[int, str] = 1,
+    include_raw_metrics: bool = False,
+    timeout_seconds: float = None
+) -> Dict[str, Any]:
+    """
+    批量评估多个储能项目(如候选站址筛选)的基准情景经济性, 返回按指定指标排序的精简排名表。
+    参数结构相同(寿命期、贷款期限、电池更换年份、各类开关及参数字段一致)的项目在同一批次中
+    向量化计算, 数值与单项目工具 analyze_storage_station_economics_expert 一致。
+
+    Args:
+        projects: 项目参数字典列表, 每个元素的结构与单项目工具的 project_parameters 相同。
+        sort_by: 排序指标, 可选 project_npv_usd、project_irr、equity_npv_usd、equity_irr、min_dscr
+            (均为降序) 或 levelized_cost_of_storage_usd_per_kwh (升序)。
+        include_risk: 为True时对配置了 monte_carlo 参数的项目逐个执行蒙特卡洛风险评估。
+        risk_workers: 风险评估的并行进程数, 大于1时各项目分发到共享进程池, "auto" 表示使用全部CPU核心。
+        include_raw_metrics: 为True时在每行附加 raw_metrics 字段(原始浮点数)。
+        timeout_seconds: 本次请求的超时时间(秒, 含排队时间), 默认使用服务端配置。
+    """
+    return await _run_scheduled(_run_portfolio_analysis, projects, sort_by, include_risk, risk_workers,
+                                include_raw_metrics, timeout_seconds=timeout_seconds)
+
+def _run_breakeven_analysis(
+    project_parameters: Dict[str, Any],
+    targets: List[Dict[str, Any]],
+    cancel_event: threading.Event
+) -> Dict[str, Any]:
+    """(新增) 目标求解的完整计算流程, 在调度器线程中执行, 每轮迭代之间检查取消标志"""
+    try:
+        model = _compile_project_parameters(project_parameters)
+        resolved, errors = [], []
+        for index, target in enumerate(targets):
+            try:
+                resolved.append((index, _resolve_breakeven_target(model, target)))
+            except (KeyError, ValueError) as e:
+                errors.append({"index": index, "error": f"目标配置无效: {e}"})
+
+        results, evaluations = ([], 0)
+        if resolved:
+            results, evaluations = _solve_breakeven_batch(model, [t for _, t in resolved], cancel_event)
+        return {
+            "results": _to_json_safe([{"index": index, **result} for (index, _), result in zip(resolved, results)]),
+            "errors": errors,
+            "kernel_evaluations": evaluations
+        }
+
+    except _ComputeCancelled:
+        raise
+    except ParameterValidationError as e:
+        return {"error": f"输入参数校验失败: {e}", "validation_errors": e.problems}
     except KeyError as e:
         return {"error": f"输入参数缺失: 缺少关键字段 '{e}'。请检查 'project_parameters' 字典的完整性。"}
     except Exception as e:
         import traceback
         return {"error": f"计算过程中发生未知错误: {e}", "trace": traceback.format_exc()}
 
+@mcp.tool()
+async def solve_storage_breakeven(
+    project_parameters: Dict[str, Any],
+    targets: List[Dict[str, Any]],
+    timeout_seconds: float = None
+) -> Dict[str, Any]:
+    """
+    目标求解(盈亏平衡)工具: 求使某个财务指标恰好达到目标值的参数取值,
+    例如"股权IRR达到8%所需的峰谷价差"或"最小DSCR不低于1.2时的最大初始投资"。
+    多个目标在同一批次中求解, 每轮迭代只调用一次向量化现金流内核, 通常十余次调用即可收敛。
+
+    Args:
+        project_parameters: 完整的项目参数字典, 作为求解的基准情景。
+        targets: 求解目标列表, 每个目标包含:
+            - parameter: 敏感性分析中的变量名称(如 "峰谷价差"、"初始投资"), 或以 path 给出参数路径
+              (如 ["market_and_policy", "peak_valley_price_diff_usd_per_kwh"]);
+            - metric: 目标指标, 可选 project_irr、equity_irr、project_npv_usd、equity_npv_usd、
+              min_dscr、avg_dscr、levelized_cost_of_storage_usd_per_kwh;
+            - target_value: 目标值 (IRR为比例, 如0.08);
+            - lower / upper (可选): 搜索区间, 默认为基准值的0 ~ 3倍;
+            - tolerance (可选): 参数取值的相对精度, 默认1e-8。
+        timeout_seconds: 本次请求的超时时间(秒, 含排队时间), 默认使用服务端配置。
+    """
+    return await _run_scheduled(_run_breakeven_analysis, project_parameters, targets, timeout_seconds=timeout_seconds)
+
+@mcp.tool()
+async def get_economics_cache_stats(clear: bool = False) -> Dict[str, Any]:
+    """
+    查询经济性分析结果缓存的状态: 各阶段(现金流量表、财务指标、敏感性分析、蒙特卡洛)的
+    内存命中、磁盘命中与未命中次数, 以及缓存容量、TTL、磁盘目录和磁盘层大小上限。
+
+    Args:
+        clear: 为True时在返回统计后清空缓存(含磁盘层)并重置计数器。
+    """
+    stats = _result_cache.stats()
+    if clear:
+        _result_cache.clear()
+    return stats
+
 # ===== 辅助函数 (需要实现) =====
-def _calculate_capacity_tariff_revenue(params: Dict[str, Any]) -> float:
+def _calculate_capacity_tariff_revenue(model: ProjectModel) -> float:
     """计算容量电价收入 (示例实现)"""
-    market = params['market_and_policy']
-    capacity = params['technical_specs']['max_power_mw']
-    capacity_price = market.get('capacity_price_usd_per_mw_year', 0)
+    capacity = model.technical_specs.max_power_mw
+    capacity_price = model.market_and_policy.capacity_price_usd_per_mw_year
     return capacity * capacity_price
 
-def _calculate_ancillary_services_revenue(params: Dict[str, Any]) -> float:
+def _calculate_ancillary_services_revenue(model: ProjectModel) -> float:
     """计算辅助服务收入 (示例实现)"""
-    market = params['market_and_policy']
-    capacity = params['technical_specs']['max_power_mw']
-    ancillary_price = market.get('ancillary_service_revenue_usd_per_mw_year', 0)
+    capacity = model.technical_specs.max_power_mw
+    ancillary_price = model.market_and_policy.ancillary_service_revenue_usd_per_mw_year
     return capacity * ancillary_price
 
-def _calculate_subsidy_revenue(params: Dict[str, Any]) -> float:
+def _calculate_subsidy_revenue(model: ProjectModel) -> float:
     """计算补贴收入 (示例实现)"""
-    market = params['market_and_policy']
-    tech = params['technical_specs']
-    daily_energy = tech['capacity_mwh'] * tech['depth_of_discharge_dod']
-    annual_energy = daily_energy * 365 * params['financial_assumptions']['charge_cycles_per_day']
-    subsidy_rate = market.get('subsidy_per_kwh_discharged_usd', 0)
+    tech = model.technical_specs
+    daily_energy = tech.capacity_mwh * tech.depth_of_discharge_dod
+    annual_energy = daily_energy * 365 * model.financial_assumptions.charge_cycles_per_day
+    subsidy_rate = model.market_and_policy.subsidy_per_kwh_discharged_usd
     return annual_energy * 1000 * subsidy_rate
 
-def _calculate_peak_valley_arbitrage_v2(params: Dict[str, Any]) -> Dict[str, float]:
+def _calculate_peak_valley_arbitrage_v2(model: ProjectModel) -> Dict[str, float]:
     """峰谷套利计算 (示例实现)"""
-    market = params['market_and_policy']
-    tech = params['technical_specs']
-    finance = params['financial_assumptions']
+    tech = model.technical_specs
+    finance = model.financial_assumptions
     
     # 简化计算
-    daily_energy_kwh = tech['capacity_mwh'] * tech['depth_of_discharge_dod'] * 1000
-    price_diff = market['peak_valley_price_diff_usd_per_kwh']
-    efficiency = tech['round_trip_efficiency']
+    daily_energy_kwh = tech.capacity_mwh * tech.depth_of_discharge_dod * 1000
+    price_diff = model.market_and_policy.peak_valley_price_diff_usd_per_kwh
+    efficiency = tech.round_trip_efficiency
     
     daily_gross_revenue = daily_energy_kwh * price_diff * efficiency
-    annual_gross_revenue = daily_gross_revenue * 365 * finance['charge_cycles_per_day']
+    annual_gross_revenue = daily_gross_revenue * 365 * finance.charge_cycles_per_day
     
     # 简化的电池衰减成本
-    degradation_cost = daily_energy_kwh * finance.get('degradation_cost_per_kwh', 0.05) * 365 * finance['charge_cycles_per_day']
+    degradation_cost = daily_energy_kwh * finance.degradation_cost_per_kwh * 365 * finance.charge_cycles_per_day
     
     return {
         'annual_gross_revenue_usd': annual_gross_revenue,
@@ -590,4 +3013,10 @@ def _calculate_peak_valley_arbitrage_v2(params: Dict[str, Any]) -> Dict[str, flo
     }
 
 if __name__ == "__main__":
+    # 导入占用GIL, 预热推迟到 initialize 握手之后开始; 延迟为负数时不预热, 完全按需导入
+    warmup_delay = float(os.environ.get('ECONOMY_WARMUP_DELAY_SECONDS', 1.0))
+    if warmup_delay >= 0:
+        warmup = threading.Timer(warmup_delay, _warm_up_lazy_modules)
+        warmup.daemon = True
+        warmup.start()
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+MCP 服务冷启动耗时测量。
+
+以 stdio 方式多次启动服务进程, 测量从进程启动到收到 initialize 响应、tools/list 响应的耗时,
+结果以JSON输出。可用 --server 指定其他服务脚本 (如电池分析服务), 多个服务依次测量。
+
+用法:
+    uv run startup_benchmark.py
+    uv run startup_benchmark.py --server economy.py ../../电池数据分析/battery/battery.py --repeat 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+_INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2025-06-18", "capabilities": {},
+               "clientInfo": {"name": "startup-benchmark", "version": "1"}}
+}
+_INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+_LIST_TOOLS = {"jsonrpc": "2.0", "id": 2, "method": "tools/list"}
+
+def _send(process: subprocess.Popen, message: Dict[str, Any]) -> None:
+    process.stdin.write(json.dumps(message) + "\n")
+    process.stdin.flush()
+
+def _wait_for_response(process: subprocess.Popen, request_id: int) -> Dict[str, Any]:
+    for line in process.stdout:
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+    raise RuntimeError(f"服务进程在返回请求 {request_id} 的响应前退出")
+
+def measure_once(server: str) -> Dict[str, float]:
+    """启动一次服务进程, 返回 initialize 与 tools/list 响应到达的时刻 (相对进程启动, 秒)"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, server], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, encoding='utf-8',
+                               cwd=os.path.dirname(os.path.abspath(server)))
+    try:
+        _send(process, _INITIALIZE)
+        _wait_for_response(process, 1)
+        initialized = time.perf_counter() - start
+        _send(process, _INITIALIZED)
+        _send(process, _LIST_TOOLS)
+        tools = _wait_for_response(process, 2)
+        listed = time.perf_counter() - start
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"initialize_s": initialized, "tools_list_s": listed, "num_tools": len(tools["result"]["tools"])}
+
+def measure_server(server: str, repeat: int) -> Dict[str, Any]:
+    # 第一次启动包含字节码编译与磁盘缓存预热, 不计入结果
+    measure_once(server)
+    runs = [measure_once(server) for _ in range(repeat)]
+    summary = {"server": server, "repeat": repeat, "num_tools": runs[0]["num_tools"]}
+    for key in ("initialize_s", "tools_list_s"):
+        values = [run[key] for run in runs]
+        summary[key] = {"min": min(values), "median": statistics.median(values), "max": max(values)}
+    return summary
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="MCP 服务冷启动耗时测量")
+    parser.add_argument('--server', nargs='+', default=['economy.py'], help="服务脚本路径, 默认 economy.py")
+    parser.add_argument('--repeat', type=int, default=10, help="每个服务的启动次数, 默认10")
+    parser.add_argument('--output', help="结果JSON的输出路径, 默认打印到标准输出")
+    args = parser.parse_args(argv)
+
+    results = []
+    for server in args.server:
+        summary = measure_server(server, args.repeat)
+        results.append(summary)
+        print(f"{os.path.basename(server):<16} initialize median {summary['initialize_s']['median'] * 1000:>8.1f} ms"
+              f"  tools/list median {summary['tools_list_s']['median'] * 1000:>8.1f} ms", file=sys.stderr)
+
+    payload = json.dumps({"python": platform.python_version(), "platform": platform.platform(),
+                          "results": results}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+# economy.py 是单文件服务, 测试直接从项目目录导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# README中的江苏用户侧储能项目示例 (40MWh/20MW)
+_PROJECT_PARAMETERS = {
+    "project_info": {"name": "江苏虚拟电厂储能项目", "location": "江苏", "project_type": "用户侧储能"},
+    "cost_structure": {
+        "total_investment_usd": 20000000, "battery_replacement_cost_usd": 8000000, "battery_replacement_year": 8,
+        "annual_opex_rate_of_investment": 0.01, "annual_land_lease_usd": 50000,
+        "annual_insurance_rate_of_investment": 0.005, "investment_tax_credit_rate": 0.10
+    },
+    "technical_specs": {
+        "capacity_mwh": 40, "max_power_mw": 20, "round_trip_efficiency": 0.90, "depth_of_discharge_dod": 0.90,
+        "cycle_life": 8000, "lifespan_years": 15, "annual_efficiency_degradation": 0.015
+    },
+    "market_and_policy": {
+        "peak_valley_price_diff_usd_per_kwh": 0.11, "capacity_price_usd_per_mw_year": 20000,
+        "ancillary_service_revenue_usd_per_mw_year": 45000, "subsidy_per_kwh_discharged_usd": 0.005,
+        "demand_response": {"is_participant": True, "demand_charge_usd_per_kw_month": 5, "peak_load_reduction_kw": 1000},
+        "grid_deferral": {"is_applicable": True, "deferred_investment_usd": 5000000, "deferral_period_years": 5}
+    },
+    "financial_assumptions": {
+        "discount_rate": 0.08, "equity_discount_rate": 0.10, "charge_cycles_per_day": 1.5, "vat_rate": 0.13,
+        "income_tax_rate": 0.25, "depreciation_method": "double_declining",
+        "financing": {"debt_ratio": 0.70, "loan_interest_rate": 0.06, "loan_term_years": 10,
+                      "repayment_type": "equal_installment"},
+        "monte_carlo": {
+            "peak_valley_price_diff": {"mean": 0.11, "std_dev": 0.02},
+            "initial_investment": {"mean": 20000000, "std_dev": 1500000},
+            "debt_ratio": {"mean": 0.70, "std_dev": 0.05}
+        }
+    }
+}
+
+
+@pytest.fixture
+def project_parameters():
+    return copy.deepcopy(_PROJECT_PARAMETERS)
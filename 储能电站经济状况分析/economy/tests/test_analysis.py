@@ -0,0 +1,10 @@
+import asyncio
+
+from economy import analyze_storage_station_economics_expert
+
+
+def test_null_monte_carlo_block_is_reported_as_not_configured(project_parameters):
+    project_parameters["financial_assumptions"]["monte_carlo"] = None
+    result = asyncio.run(analyze_storage_station_economics_expert(project_parameters))
+    assert "error" not in result
+    assert result["risk_assessment_monte_carlo"] == {"status": "未配置蒙特卡洛模拟参数"}
@@ -0,0 +1,48 @@
+import os
+import time
+
+from economy import _StageResultCache
+
+PAYLOAD = b'x' * 1000
+
+
+def _cached_keys(disk_dir):
+    return sorted(name[:-len('.pkl')] for name in os.listdir(disk_dir) if name.endswith('.pkl'))
+
+
+def test_disk_tier_evicts_least_recently_used_entries(tmp_path):
+    cache = _StageResultCache(max_entries=1, ttl_seconds=3600, disk_dir=str(tmp_path), max_disk_bytes=3500)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, PAYLOAD)
+    # 'a' 写入最早, 但磁盘命中后成为最近使用的条目
+    past = time.time() - 100
+    for offset, key in enumerate(('a', 'b', 'c')):
+        os.utime(tmp_path / f"{key}.pkl", (past + offset, past + offset))
+    assert cache.get('metrics', 'a') == PAYLOAD
+
+    cache.put('d', PAYLOAD)
+    assert _cached_keys(tmp_path) == ['a', 'c', 'd']
+    assert cache.stats()['stages']['metrics']['disk_hits'] == 1
+
+
+def test_disk_tier_sweeps_expired_entries_on_write(tmp_path):
+    cache = _StageResultCache(max_entries=8, ttl_seconds=60, disk_dir=str(tmp_path), max_disk_bytes=None)
+    cache.put('old', PAYLOAD)
+    cache.put('fresh', PAYLOAD)
+    expired = time.time() - 120
+    os.utime(tmp_path / 'old.pkl', (expired, expired))
+    (tmp_path / 'left.pkl.1.2.tmp').write_bytes(PAYLOAD)
+    os.utime(tmp_path / 'left.pkl.1.2.tmp', (expired, expired))
+
+    cache.put('new', PAYLOAD)
+    assert sorted(os.listdir(tmp_path)) == ['fresh.pkl', 'new.pkl']
+
+
+def test_disk_hit_does_not_extend_ttl(tmp_path):
+    cache = _StageResultCache(max_entries=1, ttl_seconds=60, disk_dir=str(tmp_path))
+    cache.put('a', PAYLOAD)
+    written = time.time() - 30
+    os.utime(tmp_path / 'a.pkl', (written, written))
+    cache.put('b', PAYLOAD)
+    assert cache.get('metrics', 'a') == PAYLOAD
+    assert os.path.getmtime(tmp_path / 'a.pkl') == written
@@ -0,0 +1,208 @@
+import copy
+
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from economy import (_MODEL_VALUE_BOUNDS, FinancialMetrics, _calculate_debt_service_arrays,
+                     _calculate_financial_metrics_v3, _compile_project_parameters, _evaluate_scenario_batch,
+                     _format_financial_summary, _generate_cashflow_arrays, _generate_dynamic_yearly_cashflow_statement)
+
+F = 'financial_assumptions'
+
+
+def _variant(params, name):
+    """覆盖各个分支的参数变体: 等额本金+直线折旧、无债务、长寿命、亏损结转、贷款期长于项目寿命"""
+    params = copy.deepcopy(params)
+    if name == 'equal_principal':
+        params[F]['financing']['repayment_type'] = 'equal_principal'
+        params[F]['depreciation_method'] = 'straight_line'
+    elif name == 'no_debt':
+        params[F]['financing']['debt_ratio'] = 0
+    elif name == 'long_lifespan':
+        params['technical_specs']['lifespan_years'] = 30
+        params['market_and_policy']['peak_valley_price_diff_usd_per_kwh'] = 0.03
+    elif name == 'loss_carryforward':
+        params['market_and_policy']['peak_valley_price_diff_usd_per_kwh'] = 0.03
+    elif name == 'long_loan':
+        params[F]['financing']['loan_term_years'] = 20
+        params['technical_specs']['lifespan_years'] = 10
+    return params
+
+
+VARIANTS = ['base', 'equal_principal', 'no_debt', 'long_lifespan', 'loss_carryforward', 'long_loan']
+
+
+def _reference_statement(params):
+    """逐年循环计算的现金流量表 (重构前的实现方式, 不取整), 作为向量化内核的对照"""
+    tech, cost, finance = params['technical_specs'], params['cost_structure'], params[F]
+    market, financing = params['market_and_policy'], finance['financing']
+    lifespan, rate = tech['lifespan_years'], finance['discount_rate']
+
+    net_investment = cost['total_investment_usd'] / (1 + finance['vat_rate'])
+    loan = net_investment * financing['debt_ratio']
+    schedule, balance = [], loan
+    installment = npf.pmt(financing['loan_interest_rate'], financing['loan_term_years'], -loan)
+    for _ in range(financing['loan_term_years'] if loan > 0 else 0):
+        interest = balance * financing['loan_interest_rate']
+        principal = (installment - interest if financing['repayment_type'] == 'equal_installment'
+                     else loan / financing['loan_term_years'])
+        balance -= principal
+        schedule.append((principal, interest))
+
+    dr, deferral = market['demand_response'], market['grid_deferral']
+    period = deferral['deferral_period_years']
+    fixed_revenue = (tech['max_power_mw'] * (market['capacity_price_usd_per_mw_year'] +
+                                             market['ancillary_service_revenue_usd_per_mw_year']) +
+                     round(dr['demand_charge_usd_per_kw_month'] * dr['peak_load_reduction_kw'] * 12, 2) +
+                     round(deferral['deferred_investment_usd'] * rate * (1 + rate) ** period /
+                           ((1 + rate) ** period - 1), 2))
+    fixed_opex = round(cost['total_investment_usd'] * (cost['annual_opex_rate_of_investment'] +
+                                                       cost['annual_insurance_rate_of_investment']) +
+                       cost['annual_land_lease_usd'], 2)
+    annual_energy_kwh = tech['capacity_mwh'] * tech['depth_of_discharge_dod'] * 1000 * 365 * finance['charge_cycles_per_day']
+    degradation_cost = annual_energy_kwh * 0.05
+
+    rows, accumulated_depreciation, losses = [], 0.0, 0.0
+    for year in range(1, lifespan + 1):
+        efficiency = tech['round_trip_efficiency'] * (1 - tech['annual_efficiency_degradation']) ** (year - 1)
+        revenue = (annual_energy_kwh * market['peak_valley_price_diff_usd_per_kwh'] * efficiency + fixed_revenue +
+                   annual_energy_kwh * market['subsidy_per_kwh_discharged_usd'])
+        if finance['depreciation_method'] == 'double_declining':
+            depreciation = min(net_investment * 2 / lifespan, net_investment - accumulated_depreciation)
+        else:
+            depreciation = net_investment / lifespan
+        accumulated_depreciation += depreciation
+        ebit = revenue - fixed_opex - degradation_cost - depreciation
+        if ebit < 0:
+            losses, taxable = losses - ebit, 0.0
+        else:
+            deductible = min(ebit, losses)
+            losses, taxable = losses - deductible, ebit - deductible
+        net_profit = ebit - taxable * finance['income_tax_rate']
+        replacement = cost['battery_replacement_cost_usd'] if year == cost['battery_replacement_year'] else 0.0
+        project = net_profit + depreciation - replacement
+        principal, interest = schedule[year - 1] if year <= len(schedule) else (0.0, 0.0)
+        rows.append({'年度总收入': revenue, '折旧摊销': depreciation, '息税前利润(EBIT)': ebit,
+                     '可抵扣亏损累计': losses, '税前利润': taxable, '项目自由现金流': project,
+                     '债务本金偿还': principal, '债务利息支付': interest,
+                     '股权自由现金流': project - principal - interest})
+    return {name: np.array([row[name] for row in rows]) for name in rows[0]}, loan
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+def test_kernel_matches_year_by_year_reference(project_parameters, variant):
+    params = _variant(project_parameters, variant)
+    columns, loan_amount, _, _ = _generate_cashflow_arrays(params)
+    expected, expected_loan = _reference_statement(params)
+    assert loan_amount[0] == pytest.approx(expected_loan, rel=1e-12)
+    for name, values in expected.items():
+        np.testing.assert_allclose(columns[name][0], values, rtol=1e-10, atol=1e-6, err_msg=name)
+    if variant == 'loss_carryforward':
+        # 变体确实覆盖了亏损结转与后续抵扣
+        assert expected['可抵扣亏损累计'].max() > 0 and expected['税前利润'].max() > 0
+
+
+# 重构前的实现 (numpy_financial 1.0.0) 对同一组参数给出的报告字段
+BASELINE_SUMMARIES = {
+    'base': ("3,342,429.13", "11.91%", "3,537,650.08", "28.89%", 1.83, 0.051),
+    'equal_principal': ("2,636,372.99", "10.87%", "2,636,043.23", "19.40%", 1.68, 0.051),
+    'no_debt': ("3,342,429.13", "11.91%", "1,491,541.24", "11.91%", np.nan, 0.051),
+    'long_lifespan': ("-2,178,013.30", "6.49%", "-2,303,335.98", "6.77%", 1.09, 0.0346),
+    'long_loan': ("-578,810.75", "6.87%", "4,231,021.57", "56.00%", 2.85, 0.07),
+}
+
+
+@pytest.mark.parametrize("variant", BASELINE_SUMMARIES)
+def test_single_project_report_matches_baseline(project_parameters, variant):
+    params = _variant(project_parameters, variant)
+    statement, loan_amount, equity_amount, itc_credit = _generate_dynamic_yearly_cashflow_statement(params)
+    summary = _format_financial_summary(
+        _calculate_financial_metrics_v3(params, statement, loan_amount, equity_amount, itc_credit))
+    project_npv, project_irr, equity_npv, equity_irr, min_dscr, lcoe = BASELINE_SUMMARIES[variant]
+    assert (summary['project_npv_usd'], summary['project_irr_percent']) == (project_npv, project_irr)
+    assert (summary['equity_npv_usd'], summary['equity_irr_percent']) == (equity_npv, equity_irr)
+    np.testing.assert_equal(summary['min_dscr'], min_dscr)
+    assert summary['levelized_cost_of_storage_usd_per_kwh'] == lcoe
+
+
+OVERRIDES = {
+    ('market_and_policy', 'peak_valley_price_diff_usd_per_kwh'): [0.11, 0.05, 0.16, 0.09, 0.02],
+    ('cost_structure', 'total_investment_usd'): [20e6, 18e6, 26e6, 21e6, 30e6],
+    (F, 'financing', 'debt_ratio'): [0.7, 0.0, 0.5, 0.9, 0.7],
+    (F, 'financing', 'loan_interest_rate'): [0.06, 0.04, 0.0, 0.08, 0.05],
+    ('technical_specs', 'round_trip_efficiency'): [0.9, 0.85, 0.95, 0.88, 0.8],
+    (F, 'discount_rate'): [0.08, 0.05, 0.1, 0.0, 0.12],
+}
+
+
+def _set_path(params, path, value):
+    node = params
+    for key in path[:-1]:
+        node = node[key]
+    node[path[-1]] = value
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+def test_batch_rows_match_single_project_path(project_parameters, variant):
+    params = _variant(project_parameters, variant)
+    overrides = {path: np.array(values) for path, values in OVERRIDES.items()}
+    batch = _evaluate_scenario_batch(params, overrides, statement_decimals=2)
+    assert not batch['invalid_scenario'].any()
+
+    for row in range(5):
+        scenario = copy.deepcopy(params)
+        for path, values in OVERRIDES.items():
+            _set_path(scenario, path, values[row])
+        statement, loan_amount, equity_amount, itc_credit = _generate_dynamic_yearly_cashflow_statement(scenario)
+        single = _calculate_financial_metrics_v3(scenario, statement, loan_amount, equity_amount, itc_credit)
+        for key in batch:
+            if key in FinancialMetrics.__dataclass_fields__:
+                np.testing.assert_allclose(batch[key][row], getattr(single, key), rtol=1e-9, atol=1e-9,
+                                           err_msg=f"{key}[{row}]")
+
+
+def test_batch_rows_are_independent(project_parameters):
+    """同一情景无论与哪些情景同批计算, 结果都相同"""
+    path = ('market_and_policy', 'peak_valley_price_diff_usd_per_kwh')
+    together = _evaluate_scenario_batch(project_parameters, {path: np.array([0.02, 0.11, 0.3])})
+    alone = _evaluate_scenario_batch(project_parameters, {path: np.array([0.11])})
+    for key, values in alone.items():
+        np.testing.assert_array_equal(together[key][1], values[0], err_msg=key)
+
+
+@pytest.mark.parametrize("repayment_type", ['equal_installment', 'equal_principal'])
+@pytest.mark.parametrize("interest_rate", [0.0, 0.06])
+def test_debt_schedule(project_parameters, repayment_type, interest_rate):
+    financing = project_parameters[F]['financing']
+    financing.update(repayment_type=repayment_type, loan_interest_rate=interest_rate)
+    model = _compile_project_parameters(project_parameters)
+    loans = np.array([1e6, 12389380.53])
+    principal, interest = _calculate_debt_service_arrays(model, loans, 15)
+
+    np.testing.assert_allclose(principal.sum(axis=1), loans, rtol=1e-12)
+    assert np.all(principal[:, 10:] == 0) and np.all(interest[:, 10:] == 0)
+    if repayment_type == 'equal_installment':
+        payment = principal[:, :10] + interest[:, :10]
+        np.testing.assert_allclose(payment, np.broadcast_to(npf.pmt(interest_rate, 10, -loans)[:, None], (2, 10)),
+                                   rtol=1e-12)
+    else:
+        np.testing.assert_allclose(principal[:, :10], np.broadcast_to(loans[:, None] / 10, (2, 10)), rtol=1e-12)
+
+
+def test_loan_term_longer_than_lifespan_is_truncated(project_parameters):
+    project_parameters[F]['financing']['loan_term_years'] = 20
+    model = _compile_project_parameters(project_parameters)
+    principal, interest = _calculate_debt_service_arrays(model, np.array([1e6]), 10)
+    full_principal, full_interest = _calculate_debt_service_arrays(model, np.array([1e6]), 20)
+    np.testing.assert_allclose(principal, full_principal[:, :10], rtol=1e-12)
+    np.testing.assert_allclose(interest, full_interest[:, :10], rtol=1e-12)
+    assert principal.sum() < 1e6
+
+
+def test_out_of_bounds_rows_are_masked_not_evaluated_separately(project_parameters):
+    path = (F, 'financing', 'debt_ratio')
+    assert _MODEL_VALUE_BOUNDS[path] == (0, 1, False)
+    metrics = _evaluate_scenario_batch(project_parameters, {path: np.array([0.7, 1.5, np.nan])})
+    np.testing.assert_array_equal(metrics['invalid_scenario'], [False, True, True])
+    assert np.isfinite(metrics['project_irr'][0]) and np.isnan(metrics['project_irr'][1:]).all()
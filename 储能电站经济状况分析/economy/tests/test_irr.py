@@ -0,0 +1,129 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from economy import (IRR_STATUS_MULTIPLE, IRR_STATUS_NO_SOLUTION, IRR_STATUS_UNIQUE, _solve_cashflow_returns,
+                     _solve_irr_batch)
+
+
+def _reference_irr(values):
+    """numpy_financial 1.0.0 (uv.lock 锁定的版本) 的 irr: 在全部实根中取绝对值最小的解"""
+    roots = np.roots(values[::-1])
+    roots = roots[(roots.imag == 0) & (roots.real > 0)].real
+    if roots.size == 0:
+        return np.nan
+    rates = 1 / roots - 1
+    return rates[np.argmin(np.abs(rates))]
+
+
+def _real_roots(values):
+    roots = np.roots(values[::-1])
+    return np.sort(1 / roots[(roots.imag == 0) & (roots.real > 0)].real - 1)
+
+
+def _flows_from_roots(rates, sign=1.0):
+    """由给定的IRR构造现金流: 关于 1/(1+r) 的多项式, 系数按期数升序"""
+    return sign * np.poly(1 / (1 + np.asarray(rates)))[::-1]
+
+
+def _detectable(roots, lower=-0.99, upper=10.0):
+    """网格扫描能区分的根: 全部位于默认区间内, 且相邻根的间距大于网格步长"""
+    if roots.size == 0:
+        return True
+    if roots[0] <= lower or roots[-1] >= upper:
+        return False
+    return bool(np.all(np.diff(roots) > 0.07 * (1 + np.abs(roots[1:]))))
+
+
+def test_reference_matches_installed_numpy_financial():
+    rng = np.random.default_rng(0)
+    flows = np.abs(rng.normal(size=(200, 16)))
+    flows[:, 0] = -flows[:, 1:].sum(axis=1) * rng.uniform(0.3, 1.5, 200)
+    expected = np.array([_reference_irr(row) for row in flows])
+    np.testing.assert_allclose([npf.irr(row) for row in flows], expected, rtol=1e-9)
+
+
+@pytest.mark.skipif(not npf.__version__.startswith('1.0'), reason="多解时的取舍规则只与锁定的numpy_financial 1.0.x一致")
+def test_reference_matches_locked_numpy_financial_on_multiple_roots():
+    for rates in ([-0.05, 0.30], [0.2, -0.25], [-0.4, 0.1, 0.9]):
+        flows = _flows_from_roots(rates, sign=-1.0)
+        assert npf.irr(flows) == pytest.approx(_reference_irr(flows), rel=1e-9)
+
+
+def test_conventional_flows_match_numpy_financial():
+    rng = np.random.default_rng(1)
+    flows = np.abs(rng.normal(size=(500, 21))) * rng.uniform(0.1, 3, (500, 1))
+    flows[:, 0] = -rng.uniform(0.5, 20, 500)
+    irr, status = _solve_irr_batch(flows)
+    expected = np.array([_reference_irr(row) for row in flows])
+    assert np.all(status == IRR_STATUS_UNIQUE)
+    np.testing.assert_allclose(irr, expected, rtol=1e-8, atol=1e-10)
+
+
+def test_random_flows_match_numpy_financial():
+    rng = np.random.default_rng(2)
+    flows = rng.normal(size=(4000, 21))
+    roots = [_real_roots(row) for row in flows]
+    keep = np.array([_detectable(row_roots) for row_roots in roots])
+    flows = flows[keep]
+    counts = np.array([row_roots.size for row_roots, kept in zip(roots, keep) if kept])
+
+    irr, status = _solve_irr_batch(flows)
+    expected = np.array([_reference_irr(row) for row in flows])
+    np.testing.assert_allclose(irr, expected, rtol=1e-8, atol=1e-10)
+    expected_status = np.select([counts == 0, counts == 1], [IRR_STATUS_NO_SOLUTION, IRR_STATUS_UNIQUE],
+                                IRR_STATUS_MULTIPLE)
+    np.testing.assert_array_equal(status, expected_status)
+    # 随机现金流中应同时包含唯一解、多解和无解的行
+    assert set(np.unique(status)) == {IRR_STATUS_UNIQUE, IRR_STATUS_MULTIPLE, IRR_STATUS_NO_SOLUTION}
+
+
+@pytest.mark.parametrize("rates, sign, expected", [
+    ([-0.05, 0.30], -1.0, -0.05),
+    ([0.2, -0.25], -1.0, 0.2),
+    ([-0.4, 0.1, 0.9], 1.0, 0.1),
+    ([-0.3, -0.1, 0.5, 2.0], -1.0, -0.1),
+    ([-0.9992, 3.0], 1.0, -0.9992),
+])
+def test_multiple_roots_pick_smallest_magnitude(rates, sign, expected):
+    flows = _flows_from_roots(rates, sign)
+    irr, status = _solve_irr_batch(flows)
+    assert status[0] == IRR_STATUS_MULTIPLE
+    assert irr[0] == pytest.approx(expected, rel=1e-9)
+    assert irr[0] == pytest.approx(_reference_irr(flows), rel=1e-9)
+
+
+def test_multiple_roots_random():
+    rng = np.random.default_rng(3)
+    rows = []
+    for _ in range(500):
+        rates = np.sort(rng.uniform(-0.6, 1.5, rng.integers(2, 5)))
+        if _detectable(rates):
+            rows.append(np.pad(_flows_from_roots(rates, rng.choice([-1.0, 1.0])), (0, 5 - rates.size)))
+    flows = np.array(rows)
+    irr, status = _solve_irr_batch(flows)
+    expected = np.array([_reference_irr(row) for row in flows])
+    assert np.all(status == IRR_STATUS_MULTIPLE)
+    np.testing.assert_allclose(irr, expected, rtol=1e-8, atol=1e-10)
+
+
+@pytest.mark.parametrize("rate", [20.0, 499.0, -0.9995, -0.5, 0.0])
+def test_single_root_outside_default_bracket(rate):
+    flows = np.array([-1.0, 0.0, 0.0, (1 + rate) ** 3])
+    irr, status = _solve_irr_batch(flows)
+    assert status[0] == IRR_STATUS_UNIQUE
+    assert irr[0] == pytest.approx(rate, rel=1e-9, abs=1e-12)
+
+
+def test_no_sign_change_has_no_solution():
+    irr, status = _solve_irr_batch(np.array([[1.0, 2.0, 3.0], [-1.0, -2.0, 0.0]]))
+    assert np.all(status == IRR_STATUS_NO_SOLUTION)
+    assert np.all(np.isnan(irr))
+
+
+def test_npv_and_discounted_payback():
+    flows = np.array([[-100.0, 60.0, 60.0, 60.0]])
+    result = _solve_cashflow_returns(flows, 0.1)
+    assert result["npv"][0] == pytest.approx(npf.npv(0.1, flows[0]))
+    # 第1年末累计折现现金流 -45.45, 第2年折现值 49.59
+    assert result["discounted_payback_years"][0] == pytest.approx(1 + (100 - 60 / 1.1) / (60 / 1.21))
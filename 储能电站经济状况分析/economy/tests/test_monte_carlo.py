@@ -0,0 +1,29 @@
+import threading
+
+import pytest
+
+from economy import _ComputeCancelled, _iter_monte_carlo_simulation, _perform_monte_carlo_simulation
+
+
+@pytest.fixture
+def monte_carlo_parameters(project_parameters):
+    project_parameters['financial_assumptions']['monte_carlo'].update(seed=7, num_simulations=3000, chunk_size=500)
+    return project_parameters
+
+
+def test_seeded_results_do_not_depend_on_workers(monte_carlo_parameters):
+    serial = _perform_monte_carlo_simulation(monte_carlo_parameters)
+    monte_carlo_parameters['financial_assumptions']['monte_carlo']['workers'] = 2
+    parallel = _perform_monte_carlo_simulation(monte_carlo_parameters)
+    assert parallel.pop('workers') == 2
+    assert serial.pop('workers') == 1
+    assert parallel == serial
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cancelled_request_stops_before_running_chunks(monte_carlo_parameters, workers):
+    monte_carlo_parameters['financial_assumptions']['monte_carlo']['workers'] = workers
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(_ComputeCancelled):
+        next(_iter_monte_carlo_simulation(monte_carlo_parameters, cancel_event=cancel_event))
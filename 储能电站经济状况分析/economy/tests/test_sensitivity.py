@@ -0,0 +1,28 @@
+import math
+
+import numpy as np
+
+from economy import _evaluate_scenario_batch, _perform_expanded_sensitivity_analysis
+
+DEBT_RATIO = ('financial_assumptions', 'financing', 'debt_ratio')
+
+
+def test_out_of_range_overrides_are_masked_in_one_pass(project_parameters):
+    metrics = _evaluate_scenario_batch(project_parameters, {DEBT_RATIO: np.array([0.5, 1.08, 0.7, -0.1])})
+    np.testing.assert_array_equal(metrics['invalid_scenario'], [False, True, False, True])
+    assert np.all(np.isnan(metrics['project_irr'][[1, 3]]))
+    assert np.all(np.isfinite(metrics['project_irr'][[0, 2]]))
+
+
+def test_only_out_of_range_sensitivity_scenarios_are_marked(project_parameters):
+    project_parameters['financial_assumptions']['financing']['debt_ratio'] = 0.9
+    results = _perform_expanded_sensitivity_analysis(project_parameters)
+
+    debt = results['债务比例_sensitivity']
+    assert debt['变化 +20%'] is None
+    assert all(debt[label] is not None for label in ('变化 -20%', '变化 -10%', '变化 +10%'))
+    assert all(value is not None for value in results['峰谷价差_sensitivity'].values())
+
+    ranking = results['tornado_ranking']['ranking']
+    assert ranking[-1]['variable'] == '债务比例'
+    assert math.isnan(ranking[-1]['project_irr_high'])
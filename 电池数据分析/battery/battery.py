@@ -1,8 +1,61 @@
-import pandas as pd
-import numpy as np
-from io import StringIO
-from typing import Any, Dict, Union
+import asyncio
+import cProfile
+import glob
+import hashlib
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Union
 from mcp.server.fastmcp import FastMCP
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块, 不报告内存高水位
+    resource = None
+
+# --- 启动: pandas 与 NumPy 延迟导入, MCP initialize 无需等待重量级依赖 ---
+
+# 延迟导入的依赖: 模块全局名 -> 模块名
+_LAZY_MODULES = {'pd': 'pandas', 'np': 'numpy'}
+
+class _LazyModule:
+    """
+    (新增) 延迟导入的模块代理: 首次访问属性时导入真实模块, 并将模块全局名替换为真实模块,
+    此后的访问不再经过代理。类型注解在定义时求值, 引用这些模块的注解需写成字符串。
+    """
+
+    def __init__(self, alias: str):
+        self._alias = alias
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(_import_lazy_module(self._alias), attr)
+
+def _import_lazy_module(alias: str) -> Any:
+    """(新增) 导入延迟依赖并替换模块全局名; 重复调用只是一次 sys.modules 查找"""
+    module = importlib.import_module(_LAZY_MODULES[alias])
+    globals()[alias] = module
+    return module
+
+def _warm_up_lazy_modules() -> None:
+    """(新增) 服务启动后在后台线程中预先导入延迟依赖, 使首个工具调用通常无需等待导入"""
+    for alias in _LAZY_MODULES:
+        _import_lazy_module(alias)
+
+pd = _LazyModule('pd')
+np = _LazyModule('np')
 
 mcp = FastMCP("weather")
 
@@ -19,22 +72,26 @@ def _convert_to_python_type(value):
         return float(value)
     return value
 
-def _calculate_energy_capacity(df: pd.DataFrame) -> Union[float, str]:
+def _calculate_energy_capacity(df: 'pd.DataFrame') -> Union[float, str]:
     """计算实际能量容量"""
     if '输出总能量(kWh)' in df.columns and not df['输出总能量(kWh)'].empty:
         return round(df['输出总能量(kWh)'].max() - df['输出总能量(kWh)'].min(), 2)
     return "无法计算 (缺少 '输出总能量(kWh)' 列)"
 
-def _calculate_round_trip_efficiency(df: pd.DataFrame) -> Union[float, str]:
+def _calculate_round_trip_efficiency(df: 'pd.DataFrame') -> Union[float, str]:
     """计算往返效率"""
     if '输入总能量(kWh)' in df.columns and '输出总能量(kWh)' in df.columns:
         total_input = df['输入总能量(kWh)'].iloc[-1] - df['输入总能量(kWh)'].iloc[0]
         total_output = df['输出总能量(kWh)'].iloc[-1] - df['输出总能量(kWh)'].iloc[0]
-        if total_input > 0:
-            return round((total_output / total_input) * 100, 2)
-        return 0.0
+        return _round_trip_efficiency_from_totals(total_input, total_output)
     return "无法计算 (缺少 '输入总能量(kWh)' 或 '输出总能量(kWh)' 列)"
 
+def _round_trip_efficiency_from_totals(total_input, total_output) -> float:
+    """(新增) 由累计输入/输出能量的增量计算往返效率"""
+    if total_input > 0:
+        return round((total_output / total_input) * 100, 2)
+    return 0.0
+
 def _calculate_energy_density(energy_capacity: Union[float, str]) -> Dict[str, Union[float, str]]:
     """计算能量密度"""
     if isinstance(energy_capacity, str) or pd.isna(energy_capacity) or SYSTEM_TOTAL_MASS_KG == 0 or SYSTEM_TOTAL_VOLUME_M3 == 0:
@@ -60,33 +117,243 @@ def _calculate_power_density() -> Dict[str, Union[float, str]]:
         "volume_density_kw_per_m3": round(max_power / SYSTEM_TOTAL_VOLUME_M3, 4)
     }
 
-def _calculate_average_response_time(df: pd.DataFrame) -> Union[float, str]:
-    """计算平均响应时间"""
+# 响应检测参数的默认值: 指令变化阈值、响应判定比例、响应搜索窗口、调节带宽与调节评估窗口
+_DEFAULT_RESPONSE_OPTIONS = {
+    "change_threshold_kw": 1.0,
+    "response_threshold": 0.9,
+    "window_points": 5,
+    "window_seconds": None,
+    "settling_tolerance": 0.05,
+    "settling_window_points": 60,
+    "settling_window_seconds": None
+}
+# 向量化检测时每批指令变化的窗口矩阵元素上限, 控制内存占用
+_RESPONSE_BLOCK_ELEMENTS = 2**21
+
+def _resolve_response_options(options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """(新增) 合并并校验响应检测参数, 参数不合法时抛出 ValueError"""
+    options = dict(options or {})
+    unknown = [key for key in options if key not in _DEFAULT_RESPONSE_OPTIONS]
+    if unknown:
+        raise ValueError(f"不支持的响应检测参数: {', '.join(unknown)}, 可选 {', '.join(_DEFAULT_RESPONSE_OPTIONS)}")
+    resolved = {**_DEFAULT_RESPONSE_OPTIONS, **options}
+    for key in ('window_points', 'settling_window_points'):
+        if not isinstance(resolved[key], int) or isinstance(resolved[key], bool) or resolved[key] < 1:
+            raise ValueError(f"响应检测参数 {key} 必须为正整数, 当前为 {resolved[key]}")
+    for key in ('change_threshold_kw', 'response_threshold', 'settling_tolerance', 'window_seconds', 'settling_window_seconds'):
+        value = resolved[key]
+        if value is None and key.endswith('_seconds'):
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not value > 0:
+            raise ValueError(f"响应检测参数 {key} 必须为正数, 当前为 {value}")
+        resolved[key] = float(value)
+    return resolved
+
+def _window_end(events: 'np.ndarray', timestamps: 'np.ndarray', num_rows: int, points: int, seconds: float):
+    """
+    (新增) 各指令变化点之后评估窗口的结束位置(不含), 以及窗口是否已完整落在数据内。
+    按时间定义窗口时在时间戳上二分查找 (要求时间戳递增)。
+    """
+    if seconds is not None:
+        end = np.searchsorted(timestamps, timestamps[events] + np.timedelta64(round(seconds * 1e9), 'ns'), side='right')
+        return end, end < num_rows
+    end = events + 1 + points
+    return np.minimum(end, num_rows), end <= num_rows
+
+def _detect_command_responses(df: 'pd.DataFrame', options: Dict[str, Any], start: int = 0, final: bool = True):
+    """
+    (新增) 向量化的指令响应检测。指令功率变化超过 change_threshold_kw 的点为一次指令变化, 对每次变化:
+    - 响应时间: 在其后的搜索窗口(window_points 个数据点, 或 window_seconds 秒)内, 实际功率首次达到
+      指令功率 response_threshold 倍的时刻
+    - 调节时间: 在调节评估窗口(至下一次指令变化, 且不超过 settling_window_points 个数据点或
+      settling_window_seconds 秒)内, 实际功率最后一次越出 指令 ± settling_tolerance × 阶跃幅度 之后的首个数据点时刻;
+      窗口末尾仍越限的视为未调节到位
+    - 超调量: 评估窗口内实际功率沿阶跃方向越过指令值的最大幅度, 以阶跃幅度的百分比表示
+
+    只统计位置不小于 start 的指令变化。final 为False时(分块读取), 窗口尚未完整落在数据内的指令变化
+    留待下一块统计, 返回值中的 stop 为第一个未统计的位置。
+    """
+    command = df['控制指令功率(kW)'].to_numpy(dtype=float)
+    actual = df['实际输出功率(kW)'].to_numpy(dtype=float)
+    timestamps = df['时间戳'].to_numpy()
+    num_rows = len(df)
+
+    events = np.flatnonzero(np.abs(np.diff(command)) > options['change_threshold_kw']) + 1
+    events = events[events >= start]
+    response_end, response_complete = _window_end(events, timestamps, num_rows,
+                                                  options['window_points'], options['window_seconds'])
+    settling_end, settling_complete = _window_end(events, timestamps, num_rows,
+                                                  options['settling_window_points'], options['settling_window_seconds'])
+    # 调节评估窗口在下一次指令变化处截断
+    has_next = np.arange(len(events)) < len(events) - 1
+    settling_end = np.where(has_next, np.minimum(settling_end, np.append(events[1:], num_rows)), settling_end)
+
+    stop = num_rows
+    if not final:
+        incomplete = np.flatnonzero(~(response_complete & (settling_complete | has_next)))
+        if len(incomplete):
+            stop = int(events[incomplete[0]])
+            events, response_end, settling_end = events[:incomplete[0]], response_end[:incomplete[0]], settling_end[:incomplete[0]]
+
+    summary = {"command_changes": len(events), "response_times": [], "settling_times": [], "overshoots": []}
+    width = int(max((response_end - events).max(initial=1), (settling_end - events).max(initial=1)))
+    block = max(1, _RESPONSE_BLOCK_ELEMENTS // width)
+    offsets = np.arange(1, width + 1)
+    for block_start in range(0, len(events), block):
+        rows = events[block_start:block_start + block]
+        index = rows[:, None] + offsets
+        values = actual[np.minimum(index, num_rows - 1)]
+        target = command[rows][:, None]
+
+        # 响应时间: 搜索窗口内首次达到指令功率的阈值比例 (负功率为充电)
+        threshold = target * options['response_threshold']
+        reached = (index < response_end[block_start:block_start + block, None]) & (
+            ((target > 0) & (values >= threshold)) | ((target < 0) & (values <= threshold)))
+        responded = reached.any(axis=1)
+        first = reached.argmax(axis=1)[responded]
+        summary["response_times"].append(
+            (timestamps[rows[responded] + 1 + first] - timestamps[rows[responded]]) / np.timedelta64(1, 's'))
+
+        # 调节时间与超调量: 以阶跃幅度为基准
+        in_window = index < settling_end[block_start:block_start + block, None]
+        window_rows = in_window.sum(axis=1)
+        step = command[rows] - command[rows - 1]
+        deviation = values - target
+        outside = in_window & ~(np.abs(deviation) <= options['settling_tolerance'] * np.abs(step)[:, None])
+        last_outside = np.where(outside.any(axis=1), width - 1 - outside[:, ::-1].argmax(axis=1), -1)
+        settled = last_outside + 1 < window_rows
+        settle_rows = rows[settled] + 2 + last_outside[settled]
+        summary["settling_times"].append((timestamps[settle_rows] - timestamps[rows[settled]]) / np.timedelta64(1, 's'))
+
+        excursion = np.where(in_window & ~np.isnan(deviation), deviation * np.sign(step)[:, None], -np.inf)
+        evaluated = window_rows > 0
+        peak = excursion.max(axis=1)[evaluated]
+        summary["overshoots"].append(np.maximum(peak, 0) / np.abs(step[evaluated]) * 100)
+
+    for key in ('response_times', 'settling_times', 'overshoots'):
+        summary[key] = np.concatenate(summary[key]) if summary[key] else np.empty(0)
+    return summary, stop
+
+# 分块汇总响应特性时, 每项指标保留原始值的事件数上限; 超过后改为固定分箱的对数直方图, 内存占用不再随事件数增长
+_RESPONSE_SKETCH_EXACT_LIMIT = 65536
+# 对数直方图: 第一个箱为 [0, 1ms), 其后相邻箱边界之比为1.01 (分位数的相对误差不超过1%), 超出范围的值计入最后一箱
+_RESPONSE_SKETCH_LOWEST = 1e-3
+_RESPONSE_SKETCH_RATIO = 1.01
+_RESPONSE_SKETCH_BINS = 2400
+
+class _ResponseSketch:
+    """
+    (新增) 一项响应特性 (响应时间、调节时间或超调量) 的分布汇总: 计数、求和与极值始终精确;
+    事件数不超过 exact_limit 时保留原始值, 均值与分位数与整表计算完全一致, 超过后并入对数直方图, 分位数为近似值。
+    exact_limit 为None时始终保留原始值 (整表计算)。
+    """
+
+    def __init__(self, values: 'np.ndarray' = None, exact_limit: int = None):
+        self.exact_limit = exact_limit
+        self.count = 0
+        self.total = 0.0
+        self.maximum = -np.inf
+        self.minimum = np.inf
+        self._values = []
+        self._histogram = None
+        self._bin_sums = None
+        if values is not None:
+            self.add(values)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def copy(self) -> '_ResponseSketch':
+        sketch = _ResponseSketch(exact_limit=self.exact_limit)
+        sketch.count, sketch.total, sketch.maximum, sketch.minimum = self.count, self.total, self.maximum, self.minimum
+        sketch._values = list(self._values)
+        if self._histogram is not None:
+            sketch._histogram, sketch._bin_sums = self._histogram.copy(), self._bin_sums.copy()
+        return sketch
+
+    def add(self, values: 'np.ndarray') -> None:
+        if not len(values):
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.maximum = max(self.maximum, float(values.max()))
+        self.minimum = min(self.minimum, float(values.min()))
+        if self._histogram is None:
+            self._values.append(values)
+            if self.exact_limit is None or self.count <= self.exact_limit:
+                return
+            values = np.concatenate(self._values)
+            self._values = []
+            self._histogram = np.zeros(_RESPONSE_SKETCH_BINS, dtype=np.int64)
+            self._bin_sums = np.zeros(_RESPONSE_SKETCH_BINS)
+        values = values[~np.isnan(values)]
+        with np.errstate(divide='ignore'):
+            bins = np.floor(np.log(np.maximum(values, 0) / _RESPONSE_SKETCH_LOWEST) / np.log(_RESPONSE_SKETCH_RATIO)) + 1
+        bins = np.clip(bins, 0, _RESPONSE_SKETCH_BINS - 1).astype(np.int64)
+        self._histogram += np.bincount(bins, minlength=_RESPONSE_SKETCH_BINS)
+        self._bin_sums += np.bincount(bins, weights=values, minlength=_RESPONSE_SKETCH_BINS)
+
+    def mean(self) -> float:
+        if self._histogram is None:
+            return float(np.mean(np.concatenate(self._values)))
+        return self.total / self.count
+
+    def percentile(self, q: float) -> float:
+        if self._histogram is None:
+            return float(np.percentile(np.concatenate(self._values), q))
+        # 取排名所在箱内各值的均值: 落在箱的上下界之内, 且箱内的值都相同时 (如整秒的时间戳) 即为精确值
+        if not self._histogram.any():
+            return np.nan
+        rank = q / 100 * (self._histogram.sum() - 1)
+        index = int(np.searchsorted(np.cumsum(self._histogram), rank, side='right'))
+        return float(self._bin_sums[index] / self._histogram[index])
+
+    def max(self) -> float:
+        if self._histogram is None:
+            return float(np.concatenate(self._values).max())
+        return self.maximum
+
+def _distribution(values: _ResponseSketch) -> Dict[str, float]:
+    """(新增) P50/P95/最大值"""
+    return {
+        "p50": round(values.percentile(50), 3),
+        "p95": round(values.percentile(95), 3),
+        "max": round(values.max(), 3)
+    }
+
+def _format_response_metrics(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """(新增) 平均响应时间, 以及响应时间、调节时间与超调量的分布; 各项为原始值数组或分块汇总的 _ResponseSketch"""
+    summary = {key: value if isinstance(value, (_ResponseSketch, int)) else _ResponseSketch(value)
+               for key, value in summary.items()}
+    response_times = summary["response_times"]
+    command_changes = summary["command_changes"]
+    if command_changes == 0:
+        distribution = "无法计算 (无明显指令变化)"
+    else:
+        settling_times = summary["settling_times"]
+        distribution = {
+            "command_changes": command_changes,
+            "responded": len(response_times),
+            "response_rate_percent": round(len(response_times) / command_changes * 100, 2),
+            "response_time_s": _distribution(response_times) if len(response_times) else "无法计算 (无明显指令响应)",
+            "settling_time_s": ({"settled": len(settling_times), **_distribution(settling_times)}
+                                if len(settling_times) else "无法计算 (评估窗口内未调节到位)"),
+            "overshoot_percent": _distribution(summary["overshoots"]) if len(summary["overshoots"]) else "无法计算"
+        }
+    return {
+        "average_response_time_s": round(response_times.mean(), 3) if len(response_times) else "无法计算 (无明显指令响应)",
+        "response_time_distribution": distribution
+    }
+
+def _calculate_response_metrics(df: 'pd.DataFrame', options: Dict[str, Any]) -> Dict[str, Any]:
+    """计算平均响应时间及响应特性分布"""
     if '控制指令功率(kW)' not in df.columns or '实际输出功率(kW)' not in df.columns:
-        return "无法计算 (缺少指令或实际功率列)"
-    
-    response_times = []
-    # 寻找指令功率发生显著变化的点
-    df['指令变化'] = (df['控制指令功率(kW)'].diff().abs() > 1) # 变化阈值设为1kW
-    command_change_indices = df[df['指令变化']].index
-
-    for i in command_change_indices:
-        if i == 0: continue
-        command_time = df.loc[i, '时间戳']
-        command_power = df.loc[i, '控制指令功率(kW)']
-        # 在指令变化后的一个短时间窗口内（例如5个数据点）寻找响应
-        for j in range(i + 1, min(i + 6, len(df))):
-            actual_power = df.loc[j, '实际输出功率(kW)']
-            # 检查实际功率是否达到指令功率的90%
-            if (command_power > 0 and actual_power >= command_power * 0.9) or \
-               (command_power < 0 and actual_power <= command_power * 0.9): # 处理负功率（充电）
-                response_delta = (df.loc[j, '时间戳'] - command_time).total_seconds()
-                response_times.append(response_delta)
-                break # 找到响应后即停止搜索
-    
-    return round(np.mean(response_times), 3) if response_times else "无法计算 (无明显指令响应)"
+        return {"average_response_time_s": "无法计算 (缺少指令或实际功率列)",
+                "response_time_distribution": "无法计算 (缺少指令或实际功率列)"}
+    summary, _ = _detect_command_responses(df, options)
+    return _format_response_metrics(summary)
 
-def _calculate_ramp_rate(df: pd.DataFrame) -> Union[float, str]:
+def _calculate_ramp_rate(df: 'pd.DataFrame') -> Union[float, str]:
     """计算最大爬坡率"""
     if '实际输出功率(kW)' not in df.columns:
         return "无法计算 (缺少 '实际输出功率(kW)' 列)"
@@ -101,7 +368,7 @@ def _calculate_ramp_rate(df: pd.DataFrame) -> Union[float, str]:
     ramp_rates = valid_intervals['功率变化'] / valid_intervals['时间间隔']
     return round(ramp_rates.max(), 2) if not ramp_rates.empty else 0.0
 
-def _calculate_c_rate(df: pd.DataFrame) -> Dict[str, Union[float, str]]:
+def _calculate_c_rate(df: 'pd.DataFrame') -> Dict[str, Union[float, str]]:
     """计算平均充放电倍率C-rate"""
     if '充电功率(kW)' not in df.columns or '放电功率(kW)' not in df.columns:
         return {"charge_c_rate": "无法计算", "discharge_c_rate": "无法计算"}
@@ -109,7 +376,10 @@ def _calculate_c_rate(df: pd.DataFrame) -> Dict[str, Union[float, str]]:
     # 只在实际发生充/放电时计算平均功率
     avg_charge_power = df[df['充电功率(kW)'] > 0]['充电功率(kW)'].mean()
     avg_discharge_power = df[df['放电功率(kW)'] > 0]['放电功率(kW)'].mean()
+    return _c_rate_from_average_power(avg_charge_power, avg_discharge_power)
 
+def _c_rate_from_average_power(avg_charge_power, avg_discharge_power) -> Dict[str, float]:
+    """(新增) 由实际充/放电时段的平均功率计算C-rate"""
     charge_c = avg_charge_power / SYSTEM_DESIGN_CAPACITY_KWH if SYSTEM_DESIGN_CAPACITY_KWH > 0 and not pd.isna(avg_charge_power) else 0
     discharge_c = avg_discharge_power / SYSTEM_DESIGN_CAPACITY_KWH if SYSTEM_DESIGN_CAPACITY_KWH > 0 and not pd.isna(avg_discharge_power) else 0
 
@@ -118,81 +388,1649 @@ def _calculate_c_rate(df: pd.DataFrame) -> Dict[str, Union[float, str]]:
         "discharge_c_rate": round(discharge_c, 2)
     }
 
-@mcp.tool()
-async def analyze_storage_battery_performance(file_path: str) -> Dict[str, Any]:
+def _calculate_assumed_lifetime() -> Dict[str, float]:
+    """(新增) 基于假设衰减率的寿命指标, 与运行数据无关"""
+    assumed_cycle_life = int((1 - 0.8) / 0.00004) # 假设80%寿命终止，每圈衰减0.004%
+    return {
+        "assumed_cycle_life": assumed_cycle_life,
+        "assumed_calendar_life_years": round((1 - 0.8) / 0.025, 1), # 假设年衰减率2.5%
+        "lifetime_power_throughput_gwh": round(SYSTEM_DESIGN_CAPACITY_KWH * assumed_cycle_life / 1e6, 4)
+    }
+
+# 无法由运行数据判断的辅助服务能力说明
+_SERVICE_NOTES = {
+    "voltage_support_capability": "无法评估 (需要无功功率数据)",
+    "ancillary_service_potential": "取决于市场规则和系统的综合性能(功率、能量、响应时间等)"
+}
+
+# --- 流式分析: 分块读取超大日志, 以在线累加器汇总各项指标 ---
+
+# 跨数据块衔接所需的列: 爬坡率需要上一行, 响应检测需要指令变化点的前1行与其评估窗口
+_STREAM_CONTEXT_COLUMNS = ['时间戳', '控制指令功率(kW)', '实际输出功率(kW)']
+# 需要跟踪极值的列
+_STREAM_EXTREME_COLUMNS = ['输出总能量(kWh)', '当前SOC(%)', '系统内部温度(°C)']
+# 往返效率只需累计能量计数器的首末行
+_STREAM_COUNTER_COLUMNS = ['输入总能量(kWh)', '输出总能量(kWh)']
+
+def _merge_extreme(current, value, pick):
+    """(新增) 合并两个极值, 忽略NaN (与 pandas 的 max/min 一致); 两者均无效时返回None"""
+    if pd.isna(value):
+        return current
+    return value if current is None else pick(current, value)
+
+class _BatteryStreamAccumulator:
+    """
+    (新增) 分块读取时的在线累加器: 每个数据块只更新极值、求和、计数与首末行等汇总状态,
+    并保留上一块末尾的少量行作为衔接上下文, 使差分、爬坡率与响应检测窗口跨块连续。
+    内存占用与文件大小无关: 逐次响应特性超过 _RESPONSE_SKETCH_EXACT_LIMIT 次后以定长直方图汇总, 其分位数改为近似值。
+    其余 finalize() 的输出与整表计算一致, 均值类指标按分块求和, 与整表计算的差异在浮点舍入误差以内。
     """
-    一个综合性的储能电池性能分析工具。
-    它接收一个CSV文件的【路径】，执行一系列性能指标计算，并返回一个包含所有分析结果的JSON对象。
 
-    Args:
-        file_path: 指向要分析的CSV文件的本地路径 (例如: "C:/data/battery_log.csv" 或 "/home/user/data.csv")。
+    def __init__(self, columns, response_options: Dict[str, Any], series_options: Dict[str, Any] = None):
+        self.columns = list(columns)
+        self.response_options = response_options
+        # 分时段指标、降采样曲线与SOC循环计数 (可选)
+        self.series = _create_series_accumulators(columns, series_options)
+        self.rows = 0
+        self.chunks = 0
+        self._first = {}
+        self._last = {}
+        self._max = {}
+        self._min = {}
+        self._float_columns = set()
+        self._sum = {}
+        self._count = {}
+        self._ramp_valid = False
+        self._ramp_max = None
+        self._command_changes = 0
+        self._responses = {key: _ResponseSketch(exact_limit=_RESPONSE_SKETCH_EXACT_LIMIT)
+                           for key in ('response_times', 'settling_times', 'overshoots')}
+        self._frequency_responsive = False
+        # 上一块末尾的衔接行, 以及其中尚未统计的指令变化的起始位置
+        self._context = None
+        self._response_start = 0
 
-    Returns:
-        一个包含所有分析指标的字典。如果文件未找到或数据加载失败，则返回一个包含错误信息的字典。
+    def update(self, chunk: 'pd.DataFrame') -> None:
+        """将一个数据块并入汇总状态"""
+        if chunk.empty:
+            return
+        if self.rows == 0:
+            self._first = {column: chunk[column].iloc[0] for column in _STREAM_COUNTER_COLUMNS if column in chunk}
+        self._last = {column: chunk[column].iloc[-1] for column in _STREAM_COUNTER_COLUMNS if column in chunk}
+        self.rows += len(chunk)
+        self.chunks += 1
+
+        for column in _STREAM_EXTREME_COLUMNS:
+            if column in chunk:
+                values = chunk[column]
+                # 各块的列类型可能不同 (某块全为整数), 整表计算时以浮点列为准
+                if values.dtype.kind == 'f':
+                    self._float_columns.add(column)
+                self._max[column] = _merge_extreme(self._max.get(column), values.max(), max)
+                self._min[column] = _merge_extreme(self._min.get(column), values.min(), min)
+
+        if '系统内部温度(°C)' in chunk:
+            self._accumulate('系统内部温度(°C)', chunk['系统内部温度(°C)'])
+        if '充电功率(kW)' in chunk and '放电功率(kW)' in chunk:
+            for column in ('充电功率(kW)', '放电功率(kW)'):
+                # 只在实际发生充/放电时计算平均功率
+                self._accumulate(column, chunk.loc[chunk[column] > 0, column])
+            if '电网频率(Hz)' in chunk and not self._frequency_responsive:
+                self._frequency_responsive = bool((
+                    ((chunk['电网频率(Hz)'] < 49.95) & (chunk['放电功率(kW)'] > 10)) |
+                    ((chunk['电网频率(Hz)'] > 50.05) & (chunk['充电功率(kW)'] > 10))
+                ).any())
+
+        self._update_with_context(chunk)
+        for series in self.series:
+            series.update(chunk)
+
+    def _accumulate(self, column: str, values: 'pd.Series') -> None:
+        self._sum[column] = self._sum.get(column, 0.0) + values.sum()
+        self._count[column] = self._count.get(column, 0) + values.count()
+
+    def _mean(self, column: str) -> float:
+        return self._sum[column] / self._count[column] if self._count.get(column) else np.nan
+
+    def _extreme(self, table: Dict[str, Any], column: str) -> Any:
+        value = table.get(column)
+        if value is None:
+            return np.nan
+        return np.float64(value) if column in self._float_columns else value
+
+    def _update_with_context(self, chunk: 'pd.DataFrame') -> None:
+        """在 上一块末尾的衔接行 + 本块 上计算依赖相邻行的指标"""
+        columns = [column for column in _STREAM_CONTEXT_COLUMNS if column in chunk]
+        if self._context is None:
+            combined = chunk[columns].reset_index(drop=True)
+        else:
+            combined = pd.concat([self._context, chunk[columns]], ignore_index=True)
+        new_rows_start = len(combined) - len(chunk)
+
+        if '实际输出功率(kW)' in combined:
+            power_change = combined['实际输出功率(kW)'].diff().abs().iloc[new_rows_start:]
+            interval = combined['时间戳'].diff().dt.total_seconds().iloc[new_rows_start:]
+            # 过滤掉时间间隔为0或过大的异常点
+            valid = (interval > 0) & (interval < 300)
+            if valid.any():
+                self._ramp_valid = True
+                self._ramp_max = _merge_extreme(self._ramp_max, (power_change[valid] / interval[valid]).max(), max)
+
+        # 评估窗口越过本块末尾的指令变化留到下一块统计, 衔接行从其前1行开始保留
+        stop = len(combined)
+        if '控制指令功率(kW)' in combined and '实际输出功率(kW)' in combined:
+            summary, stop = _detect_command_responses(combined, self.response_options, self._response_start, final=False)
+            self._command_changes += summary["command_changes"]
+            for key, sketch in self._responses.items():
+                sketch.add(summary[key])
+        self._context = combined.iloc[stop - 1:].reset_index(drop=True)
+        self._response_start = 1
+
+    def finalize(self, file_path: str) -> Dict[str, Any]:
+        """统计剩余的指令变化, 并按与整表计算相同的结构输出分析结果"""
+        columns = set(self.columns)
+        analysis_results = {"source_file": file_path}
+
+        if '输出总能量(kWh)' in columns:
+            energy_capacity = round(self._extreme(self._max, '输出总能量(kWh)') - self._extreme(self._min, '输出总能量(kWh)'), 2)
+        else:
+            energy_capacity = "无法计算 (缺少 '输出总能量(kWh)' 列)"
+        analysis_results["energy_capacity_kwh"] = energy_capacity
+        analysis_results["system_power_rating_kw"] = SYSTEM_MAX_POWER_KW
+        if '输入总能量(kWh)' in columns and '输出总能量(kWh)' in columns:
+            analysis_results["round_trip_efficiency_percent"] = _round_trip_efficiency_from_totals(
+                self._last['输入总能量(kWh)'] - self._first['输入总能量(kWh)'],
+                self._last['输出总能量(kWh)'] - self._first['输出总能量(kWh)']
+            )
+        else:
+            analysis_results["round_trip_efficiency_percent"] = "无法计算 (缺少 '输入总能量(kWh)' 或 '输出总能量(kWh)' 列)"
+        analysis_results["energy_density"] = _calculate_energy_density(energy_capacity)
+        analysis_results["power_density"] = _calculate_power_density()
+
+        if '控制指令功率(kW)' in columns and '实际输出功率(kW)' in columns:
+            summary, _ = _detect_command_responses(self._context, self.response_options, self._response_start)
+            # 在副本上并入剩余的指令变化, 不修改累加器状态 (增量模式会反复调用 finalize)
+            merged = {"command_changes": self._command_changes + summary["command_changes"]}
+            for key, sketch in self._responses.items():
+                merged[key] = sketch.copy()
+                merged[key].add(summary[key])
+            analysis_results.update(_format_response_metrics(merged))
+        else:
+            analysis_results.update(_calculate_response_metrics(self._context, self.response_options))
+
+        if '实际输出功率(kW)' not in columns:
+            analysis_results["max_ramp_rate_kw_per_s"] = "无法计算 (缺少 '实际输出功率(kW)' 列)"
+        elif not self._ramp_valid:
+            analysis_results["max_ramp_rate_kw_per_s"] = 0.0
+        else:
+            analysis_results["max_ramp_rate_kw_per_s"] = round(np.nan if self._ramp_max is None else self._ramp_max, 2)
+
+        if '充电功率(kW)' in columns and '放电功率(kW)' in columns:
+            analysis_results["c_rate"] = _c_rate_from_average_power(self._mean('充电功率(kW)'), self._mean('放电功率(kW)'))
+        else:
+            analysis_results["c_rate"] = {"charge_c_rate": "无法计算", "discharge_c_rate": "无法计算"}
+
+        if '当前SOC(%)' in columns:
+            analysis_results["soc_operating_range_percent"] = round(self._extreme(self._max, '当前SOC(%)') - self._extreme(self._min, '当前SOC(%)'), 2)
+        else:
+            analysis_results["soc_operating_range_percent"] = "无法计算 (缺少 '当前SOC(%)' 列)"
+
+        analysis_results.update(_calculate_assumed_lifetime())
+
+        if '系统内部温度(°C)' in columns:
+            analysis_results["temperature_characteristics_celsius"] = {
+                'average': round(self._mean('系统内部温度(°C)'), 2),
+                'min': round(self._extreme(self._min, '系统内部温度(°C)'), 2),
+                'max': round(self._extreme(self._max, '系统内部温度(°C)'), 2)
+            }
+        else:
+            analysis_results["temperature_characteristics_celsius"] = "无法分析 (缺少'系统内部温度(°C)'列)"
+
+        if '电网频率(Hz)' in columns and '充电功率(kW)' in columns and '放电功率(kW)' in columns:
+            analysis_results["frequency_support_capability"] = "检测到潜在的频率响应行为" if self._frequency_responsive else "未检测到明显频率响应"
+        else:
+            analysis_results["frequency_support_capability"] = "无法评估 (缺少频率或功率数据)"
+
+        analysis_results.update(_SERVICE_NOTES)
+        for series in self.series:
+            analysis_results.update(series.finalize())
+        return analysis_results
+
+# --- 分时段指标与降采样: 按小时/天/周/月分桶, 以一次排序与分段归约算出各时段的全部指标 ---
+
+_WINDOWS = ('hour', 'day', 'week', 'month')
+# 降采样输出的曲线
+_DOWNSAMPLE_COLUMNS = ['实际输出功率(kW)', '当前SOC(%)', '系统内部温度(°C)']
+# 各时段部分汇总量的合并方式; 分块读取时先按块汇总, 再与此前的汇总按同样方式合并
+_WINDOW_REDUCERS = {
+    'rows': 'sum',
+    'output_first': 'first', 'output_last': 'last', 'output_max': 'max', 'output_min': 'min',
+    'input_first': 'first', 'input_last': 'last',
+    'soc_max': 'max', 'soc_min': 'min',
+    'temperature_sum': 'sum', 'temperature_count': 'sum', 'temperature_max': 'max', 'temperature_min': 'min',
+    'charge_sum': 'sum', 'charge_count': 'sum', 'discharge_sum': 'sum', 'discharge_count': 'sum',
+    'frequency_responsive': 'any',
+    'ramp_max': 'max', 'ramp_valid': 'any',
+    # 各时段最后一行的功率与时间, 供下一块计算该时段的第一个功率差分
+    'power_last': 'last', 'timestamp_last': 'last'
+}
+
+def _resolve_series_options(window: str = None, downsample_points: int = None, cycle_counting: bool = False,
+                            degradation_model: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+    """
+    (新增) 校验分时段、降采样与循环计数参数, 参数不合法时抛出 ValueError; 均未指定时返回None。
+    给出 degradation_model 即视为启用循环计数。
+    """
+    if window is not None and window not in _WINDOWS:
+        raise ValueError(f"不支持的时段: {window}, 可选 {', '.join(_WINDOWS)}")
+    if downsample_points is not None and (not isinstance(downsample_points, int) or isinstance(downsample_points, bool)
+                                          or downsample_points < 3):
+        raise ValueError(f"downsample_points 必须为不小于3的整数, 当前为 {downsample_points}")
+    cycle_counting = cycle_counting or degradation_model is not None
+    if window is None and downsample_points is None and not cycle_counting:
+        return None
+    return {"window": window, "downsample_points": downsample_points,
+            "degradation_model": _resolve_degradation_model(degradation_model) if cycle_counting else None}
+
+def _create_series_accumulators(columns, series_options: Optional[Dict[str, Any]]) -> list:
+    """(新增) 按参数创建分时段/降采样与循环计数累加器, 二者都提供 update(chunk) 与 finalize()"""
+    accumulators = []
+    if series_options and (series_options['window'] is not None or series_options['downsample_points'] is not None):
+        accumulators.append(_BatteryWindowAccumulator(columns, series_options['window'], series_options['downsample_points']))
+    if series_options and series_options['degradation_model'] is not None:
+        accumulators.append(_SocCycleAccumulator(columns, series_options['degradation_model']))
+    return accumulators
+
+def _window_start(timestamps: 'pd.Series', window: str) -> 'pd.Series':
+    """(新增) 各时间戳所在时段的起点; 周以周一为起点"""
+    if window == 'hour':
+        return timestamps.dt.floor(pd.Timedelta(hours=1))
+    days = timestamps.dt.floor(pd.Timedelta(days=1))
+    if window == 'day':
+        return days
+    if window == 'week':
+        return days - pd.to_timedelta(days.dt.dayofweek, unit='D')
+    return timestamps.dt.to_period('M').dt.start_time
+
+def _reduce_segments(codes: 'np.ndarray', parts: Dict[str, 'np.ndarray']) -> tuple:
+    """
+    (新增) 按时段编号稳定排序后, 以 ufunc.reduceat 对每个时段的连续片段一次性归约;
+    first/last 取各时段按原顺序的首/末个值 (含NaN, 与 iloc[0]/iloc[-1] 一致), max/min 忽略NaN。
+    """
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    reduced = {}
+    for name, values in parts.items():
+        values = values[order]
+        kind = _WINDOW_REDUCERS[name]
+        if kind == 'sum':
+            reduced[name] = np.add.reduceat(values, starts)
+        elif kind == 'max':
+            reduced[name] = np.fmax.reduceat(values, starts)
+        elif kind == 'min':
+            reduced[name] = np.fmin.reduceat(values, starts)
+        elif kind == 'any':
+            reduced[name] = np.logical_or.reduceat(values, starts)
+        elif kind == 'first':
+            reduced[name] = values[starts]
+        else:
+            reduced[name] = values[ends]
+    return codes[starts], reduced
+
+def _lttb_indices(x: 'np.ndarray', y: 'np.ndarray', threshold: int) -> 'np.ndarray':
+    """
+    (新增) Largest-Triangle-Three-Buckets 降采样: 保留首末点, 其余数据等分为 threshold-2 个桶,
+    每桶选取与上一个选中点、下一桶均值点所成三角形面积最大的点, 在大幅减少点数的同时保留曲线的峰谷形状。
+    """
+    n = len(x)
+    if n <= threshold:
+        return np.arange(n)
+    bounds = np.arange(threshold - 1) * (n - 2) // (threshold - 2) + 1
+    bounds = np.r_[bounds, n]
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_end = bounds[i + 2]
+        average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+class _BatteryWindowAccumulator:
+    """
+    (新增) 分时段指标与降采样曲线的累加器。每个数据块按时段编号排序后分段归约为各时段的部分汇总量,
+    再与此前的汇总合并, 内存占用只随时段数增长; 各时段的指标与对该时段的数据行单独调用 _calculate_* 辅助函数一致
+    (均值按分块求和, 差异在浮点舍入误差以内)。整表计算时只调用一次 update()。
+    降采样在每块内先以LTTB缩减, finalize() 时再对候选点做一次LTTB; 整表计算时即为精确的LTTB。
+    """
+
+    def __init__(self, columns, window: str = None, downsample_points: int = None):
+        self.columns = set(columns)
+        self.window = window
+        self.downsample_points = downsample_points
+        self._codes = None
+        self._partials = None
+        self._candidates = {column: [] for column in _DOWNSAMPLE_COLUMNS if column in self.columns}
+
+    def update(self, chunk: 'pd.DataFrame') -> None:
+        # 时间戳无效的行不属于任何时段
+        observed = chunk['时间戳'].notna()
+        if not observed.all():
+            chunk = chunk[observed]
+        if chunk.empty:
+            return
+        if self.window is not None:
+            self._update_windows(chunk)
+        if self.downsample_points is not None:
+            self._update_candidates(chunk)
+
+    def _update_windows(self, chunk: 'pd.DataFrame') -> None:
+        timestamps = chunk['时间戳'].to_numpy().astype('datetime64[ns]')
+        codes = _window_start(chunk['时间戳'], self.window).to_numpy().astype('datetime64[s]').astype(np.int64)
+        parts = {'rows': np.ones(len(chunk), dtype=np.int64)}
+        values = lambda column: chunk[column].to_numpy(dtype=float)
+
+        if '输出总能量(kWh)' in self.columns:
+            output = values('输出总能量(kWh)')
+            parts.update(output_first=output, output_last=output, output_max=output, output_min=output)
+            if '输入总能量(kWh)' in self.columns:
+                energy_input = values('输入总能量(kWh)')
+                parts.update(input_first=energy_input, input_last=energy_input)
+        if '当前SOC(%)' in self.columns:
+            soc = values('当前SOC(%)')
+            parts.update(soc_max=soc, soc_min=soc)
+        if '系统内部温度(°C)' in self.columns:
+            temperature = values('系统内部温度(°C)')
+            observed = ~np.isnan(temperature)
+            parts.update(temperature_sum=np.where(observed, temperature, 0.0), temperature_count=observed.astype(np.int64),
+                         temperature_max=temperature, temperature_min=temperature)
+        if '充电功率(kW)' in self.columns and '放电功率(kW)' in self.columns:
+            charge, discharge = values('充电功率(kW)'), values('放电功率(kW)')
+            # 只在实际发生充/放电时计算平均功率
+            parts.update(charge_sum=np.where(charge > 0, charge, 0.0), charge_count=(charge > 0).astype(np.int64),
+                         discharge_sum=np.where(discharge > 0, discharge, 0.0), discharge_count=(discharge > 0).astype(np.int64))
+            if '电网频率(Hz)' in self.columns:
+                frequency = values('电网频率(Hz)')
+                parts['frequency_responsive'] = ((frequency < 49.95) & (discharge > 10)) | ((frequency > 50.05) & (charge > 10))
+        if '实际输出功率(kW)' in self.columns:
+            power = values('实际输出功率(kW)')
+            parts.update(self._ramp_parts(codes, power, timestamps), power_last=power, timestamp_last=timestamps)
+
+        codes, partials = _reduce_segments(codes, parts)
+        if self._partials is not None:
+            codes, partials = _reduce_segments(np.concatenate([self._codes, codes]),
+                                               {name: np.concatenate([self._partials[name], partials[name]]) for name in partials})
+        self._codes, self._partials = codes, partials
+
+    def _ramp_parts(self, codes: 'np.ndarray', power: 'np.ndarray', timestamps: 'np.ndarray') -> Dict[str, 'np.ndarray']:
+        """逐行爬坡率: 与同一时段内的上一行做差分 (时段内第一行的上一行可能在此前的数据块中)"""
+        order = np.argsort(codes, kind='stable')
+        sorted_codes, sorted_power, sorted_timestamps = codes[order], power[order], timestamps[order]
+        previous_power = np.r_[np.nan, sorted_power[:-1]]
+        previous_timestamp = np.concatenate([np.array(['NaT'], dtype='datetime64[ns]'), sorted_timestamps[:-1]])
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        previous_power[starts] = np.nan
+        previous_timestamp[starts] = np.datetime64('NaT', 'ns')
+        if self._codes is not None and 'power_last' in self._partials:
+            index = np.minimum(np.searchsorted(self._codes, sorted_codes[starts]), len(self._codes) - 1)
+            found = self._codes[index] == sorted_codes[starts]
+            previous_power[starts[found]] = self._partials['power_last'][index[found]]
+            previous_timestamp[starts[found]] = self._partials['timestamp_last'][index[found]]
+
+        interval = (sorted_timestamps - previous_timestamp) / np.timedelta64(1, 's')
+        # 过滤掉时间间隔为0或过大的异常点, 与 _calculate_ramp_rate 一致
+        valid = (interval > 0) & (interval < 300)
+        rate = np.full(len(codes), np.nan)
+        rate[order] = np.where(valid, np.abs(sorted_power - previous_power) / np.where(valid, interval, 1.0), np.nan)
+        ramp_valid = np.empty(len(codes), dtype=bool)
+        ramp_valid[order] = valid
+        return {'ramp_max': rate, 'ramp_valid': ramp_valid}
+
+    def _update_candidates(self, chunk: 'pd.DataFrame') -> None:
+        nanoseconds = chunk['时间戳'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+        for column, candidates in self._candidates.items():
+            y = chunk[column].to_numpy(dtype=float)
+            observed = ~np.isnan(y)
+            x, y = nanoseconds[observed], y[observed]
+            keep = _lttb_indices(x / 1e9, y, self.downsample_points)
+            candidates.append((x[keep], y[keep]))
+            # 多次增量更新后候选点过多时先行合并缩减
+            if sum(len(part[0]) for part in candidates) > 4 * self.downsample_points:
+                x, y = self._merged_candidates(column)
+                keep = _lttb_indices(x / 1e9, y, 2 * self.downsample_points)
+                candidates[:] = [(x[keep], y[keep])]
+
+    def _merged_candidates(self, column: str) -> tuple:
+        candidates = self._candidates[column]
+        if not candidates:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate([part[0] for part in candidates]), np.concatenate([part[1] for part in candidates])
+
+    def finalize(self) -> Dict[str, Any]:
+        results = {}
+        if self.window is not None:
+            windows = self._format_windows() if self._codes is not None else []
+            results["windowed_metrics"] = {"window": self.window, "num_windows": len(windows), "windows": windows}
+        if self.downsample_points is not None:
+            series = {}
+            for column in self._candidates:
+                x, y = self._merged_candidates(column)
+                keep = _lttb_indices(x / 1e9, y, self.downsample_points)
+                series[column] = {
+                    "timestamps": np.datetime_as_string(x[keep].astype('datetime64[ns]'), unit='s').tolist(),
+                    "values": np.round(y[keep], 3).tolist()
+                }
+            results["downsampled_series"] = {"method": "LTTB", "max_points": self.downsample_points, "series": series}
+        return results
+
+    def _format_windows(self) -> list:
+        """将各时段的汇总量换算为与整段分析相同含义的指标"""
+        p = self._partials
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics = {}
+            if 'output_max' in p:
+                metrics["energy_capacity_kwh"] = np.round(p['output_max'] - p['output_min'], 2)
+            if 'input_first' in p:
+                total_input = p['input_last'] - p['input_first']
+                total_output = p['output_last'] - p['output_first']
+                metrics["round_trip_efficiency_percent"] = np.where(total_input > 0, np.round(total_output / total_input * 100, 2), 0.0)
+            if 'ramp_max' in p:
+                metrics["max_ramp_rate_kw_per_s"] = np.where(p['ramp_valid'], np.round(p['ramp_max'], 2), 0.0)
+            if 'charge_sum' in p:
+                capacity = SYSTEM_DESIGN_CAPACITY_KWH
+                charge_c = np.nan_to_num(p['charge_sum'] / p['charge_count'] / capacity) if capacity > 0 else np.zeros(len(self._codes))
+                discharge_c = np.nan_to_num(p['discharge_sum'] / p['discharge_count'] / capacity) if capacity > 0 else np.zeros(len(self._codes))
+                charge_c, discharge_c = np.round(charge_c, 2), np.round(discharge_c, 2)
+            if 'soc_max' in p:
+                metrics["soc_operating_range_percent"] = np.round(p['soc_max'] - p['soc_min'], 2)
+            if 'temperature_sum' in p:
+                temperature_mean = np.round(p['temperature_sum'] / p['temperature_count'], 2)
+                temperature_min, temperature_max = np.round(p['temperature_min'], 2), np.round(p['temperature_max'], 2)
+
+        starts = np.datetime_as_string(self._codes.astype('datetime64[s]'), unit='s')
+        windows = []
+        for i, start in enumerate(starts):
+            window = {"window_start": str(start), "rows": int(p['rows'][i])}
+            window.update({name: float(values[i]) for name, values in metrics.items()})
+            if 'charge_sum' in p:
+                window["c_rate"] = {"charge_c_rate": float(charge_c[i]), "discharge_c_rate": float(discharge_c[i])}
+            if 'temperature_sum' in p:
+                window["temperature_characteristics_celsius"] = {
+                    'average': float(temperature_mean[i]), 'min': float(temperature_min[i]), 'max': float(temperature_max[i])
+                }
+            if 'frequency_responsive' in p:
+                window["frequency_support_capability"] = "检测到潜在的频率响应行为" if p['frequency_responsive'][i] else "未检测到明显频率响应"
+            windows.append(window)
+        return windows
+
+# --- 循环计数: 对SOC曲线做雨流计数, 按放电深度加权估计容量衰减 ---
+
+# 衰减模型参数的默认值: 参考放电深度下每个完整循环的容量衰减 (与 _calculate_assumed_lifetime 的假设一致)、
+# 参考放电深度、深度指数 k (单个循环的衰减 ∝ (深度 / 参考深度)^k)、年日历衰减率与寿命终止时的容量比例
+_DEFAULT_DEGRADATION_MODEL = {
+    "fade_per_full_cycle": 0.00004,
+    "reference_dod_percent": 100.0,
+    "dod_exponent": 1.0,
+    "calendar_fade_per_year": 0.025,
+    "end_of_life_capacity": 0.8
+}
+# 循环深度直方图的分组边界 (SOC百分点), 超过100的深度 (SOC读数越界) 计入最后一组
+_CYCLE_DEPTH_BINS = (0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100)
+
+def _resolve_degradation_model(model: Dict[str, Any] = None) -> Dict[str, Any]:
+    """(新增) 合并并校验衰减模型参数, 参数不合法时抛出 ValueError"""
+    model = dict(model or {})
+    unknown = [key for key in model if key not in _DEFAULT_DEGRADATION_MODEL]
+    if unknown:
+        raise ValueError(f"不支持的衰减模型参数: {', '.join(unknown)}, 可选 {', '.join(_DEFAULT_DEGRADATION_MODEL)}")
+    resolved = {**_DEFAULT_DEGRADATION_MODEL, **model}
+    for key, value in resolved.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not value >= 0:
+            raise ValueError(f"衰减模型参数 {key} 必须为非负数, 当前为 {value}")
+        resolved[key] = float(value)
+    if not 0 < resolved['reference_dod_percent'] <= 100:
+        raise ValueError(f"衰减模型参数 reference_dod_percent 必须在 (0, 100] 内, 当前为 {resolved['reference_dod_percent']}")
+    if not 0 < resolved['end_of_life_capacity'] < 1:
+        raise ValueError(f"衰减模型参数 end_of_life_capacity 必须在 (0, 1) 内, 当前为 {resolved['end_of_life_capacity']}")
+    return resolved
+
+def _soc_reversals(values: 'np.ndarray', head: list) -> tuple:
+    """
+    (新增) 向量化提取反转点 (峰谷): 去掉相邻的重复值后, 斜率符号改变处即为反转点。
+    head 为此前已确认的最后一个反转点与序列末尾的候选点 (末点是否为反转点要看其后的数据), 首次调用时为空,
+    此时序列起点也作为反转点。返回 (新确认的反转点, 新的末尾候选点或None)。
+    """
+    sequence = np.concatenate([np.asarray(head, dtype=float), values])
+    if len(sequence) == 0:
+        return sequence, None
+    sequence = sequence[np.r_[True, sequence[1:] != sequence[:-1]]]
+    slopes = np.sign(np.diff(sequence))
+    turning = np.flatnonzero(slopes[1:] != slopes[:-1]) + 1
+    if not head:
+        turning = np.r_[0, turning]
+    last = turning[-1] if len(turning) else 0
+    return sequence[turning], (float(sequence[-1]) if len(sequence) - 1 > last else None)
+
+def _rainflow_count(stack: list, reversals: list, ranges: list, counts: list) -> None:
+    """
+    (新增) ASTM E1049 雨流计数 (三点法) 的栈式实现: 逐个压入反转点, 最近一段的幅度不小于前一段时前一段构成循环,
+    前一段含序列起点时记半个循环并移除起点, 否则记一个完整循环并移除该段的两个端点。
+    每个反转点至多入栈、出栈各一次, 总耗时 O(n); stack 中为尚未闭合的反转点 (雨流残余), 可跨数据块延续。
+    """
+    for point in reversals:
+        stack.append(point)
+        while len(stack) >= 3:
+            previous = abs(stack[-2] - stack[-3])
+            if abs(stack[-1] - stack[-2]) < previous:
+                break
+            ranges.append(previous)
+            if len(stack) == 3:
+                counts.append(0.5)
+                del stack[0]
+            else:
+                counts.append(1.0)
+                del stack[-3:-1]
+
+def _sequential_sum(total: float, values: 'np.ndarray') -> float:
+    """(新增) 按顺序逐项累加 (np.cumsum 不做成对求和), 分块累加与整体累加的结果逐位相同"""
+    return float(np.cumsum(np.r_[total, values])[-1])
+
+class _SocCycleAccumulator:
+    """
+    (新增) SOC循环计数的累加器。每个数据块先向量化提取反转点再压入雨流栈, 闭合的循环当即并入深度直方图、
+    等效完整循环数与衰减累计; 跨块只保留末尾的反转点与雨流残余 (通常只有几十个点), 内存占用与数据量无关,
+    分块读取与整表计算的循环计数完全一致; 等效循环数与衰减按循环闭合的顺序逐项累加, 与分块方式无关。整表计算时只调用一次 update()。
+    """
+
+    def __init__(self, columns, degradation_model: Dict[str, Any]):
+        self.columns = set(columns)
+        self.model = degradation_model
+        self.points = 0
+        self.reversals = 0
+        self._head = []
+        self._stack = []
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._totals = {"full_cycles": 0, "half_cycles": 0, "equivalent_full_cycles": 0.0, "fade": 0.0,
+                        "max_depth": 0.0, "histogram": np.zeros(len(_CYCLE_DEPTH_BINS) - 1)}
+
+    def update(self, chunk: 'pd.DataFrame') -> None:
+        if '当前SOC(%)' not in self.columns or chunk.empty:
+            return
+        self._first_timestamp = _merge_extreme(self._first_timestamp, chunk['时间戳'].min(), min)
+        self._last_timestamp = _merge_extreme(self._last_timestamp, chunk['时间戳'].max(), max)
+        soc = chunk['当前SOC(%)'].to_numpy(dtype=float)
+        soc = soc[~np.isnan(soc)]
+        self.points += len(soc)
+
+        reversals, pending = _soc_reversals(soc, self._head)
+        self.reversals += len(reversals)
+        ranges, counts = [], []
+        _rainflow_count(self._stack, reversals.tolist(), ranges, counts)
+        self._tally(self._totals, ranges, counts)
+        last_reversal = float(reversals[-1]) if len(reversals) else (self._head[0] if self._head else None)
+        self._head = [point for point in (last_reversal, pending) if point is not None]
+
+    def _tally(self, totals: Dict[str, Any], ranges: list, counts: list) -> None:
+        """将一批循环 (深度, 计数) 并入汇总量"""
+        if not ranges:
+            return
+        ranges, counts = np.asarray(ranges), np.asarray(counts)
+        full = counts == 1.0
+        totals["full_cycles"] += int(full.sum())
+        totals["half_cycles"] += int((~full).sum())
+        totals["equivalent_full_cycles"] = _sequential_sum(totals["equivalent_full_cycles"], counts * ranges / 100)
+        weights = (ranges / self.model['reference_dod_percent']) ** self.model['dod_exponent']
+        totals["fade"] = _sequential_sum(totals["fade"], counts * weights * self.model['fade_per_full_cycle'])
+        totals["max_depth"] = max(totals["max_depth"], float(ranges.max()))
+        bins = np.minimum(np.searchsorted(_CYCLE_DEPTH_BINS, ranges, side='right') - 1, len(_CYCLE_DEPTH_BINS) - 2)
+        totals["histogram"] += np.bincount(bins, weights=counts, minlength=len(_CYCLE_DEPTH_BINS) - 1)
+
+    def finalize(self) -> Dict[str, Any]:
+        """末尾候选点作为最后一个反转点, 雨流残余的各段记为半个循环; 不修改累加器状态, 增量模式可反复调用"""
+        if '当前SOC(%)' not in self.columns:
+            return {"soc_cycle_analysis": "无法计算 (缺少 '当前SOC(%)' 列)"}
+        totals = {**self._totals, "histogram": self._totals["histogram"].copy()}
+        stack, ranges, counts = list(self._stack), [], []
+        pending = self._head[1:]
+        _rainflow_count(stack, pending, ranges, counts)
+        residue = np.abs(np.diff(stack)).tolist()
+        self._tally(totals, ranges + residue, counts + [0.5] * len(residue))
+
+        observed_days = 0.0
+        if self._first_timestamp is not None:
+            observed_days = (self._last_timestamp - self._first_timestamp) / pd.Timedelta(days=1)
+        return {"soc_cycle_analysis": {
+            "method": "雨流计数 (ASTM E1049)",
+            "soc_points": self.points,
+            "reversals": self.reversals + len(pending),
+            "full_cycles": totals["full_cycles"],
+            "half_cycles": totals["half_cycles"],
+            "equivalent_full_cycles": round(totals["equivalent_full_cycles"], 3),
+            "max_cycle_depth_percent": round(totals["max_depth"], 2),
+            "depth_histogram": [
+                {"depth_percent": f"{low}-{high}", "cycles": round(float(cycles), 1)}
+                for low, high, cycles in zip(_CYCLE_DEPTH_BINS[:-1], _CYCLE_DEPTH_BINS[1:], totals["histogram"])
+            ],
+            "observed_days": round(observed_days, 3),
+            "degradation_estimate": self._estimate_degradation(totals, observed_days)
+        }}
+
+    def _estimate_degradation(self, totals: Dict[str, Any], observed_days: float) -> Dict[str, Any]:
+        """按实测循环的深度分布估计容量衰减, 并按观测期内的运行强度外推寿命"""
+        model = self.model
+        capacity_budget = 1 - model['end_of_life_capacity']
+        years = observed_days / 365.25
+        cycle_fade, calendar_fade = totals["fade"], model['calendar_fade_per_year'] * years
+        estimate = {
+            "model": model,
+            "cycle_fade_percent": round(cycle_fade * 100, 4),
+            "calendar_fade_percent": round(calendar_fade * 100, 4),
+            "total_fade_percent": round((cycle_fade + calendar_fade) * 100, 4)
+        }
+        if cycle_fade > 0 and totals["equivalent_full_cycles"] > 0:
+            # 按观测到的深度分布, 仅计循环衰减时达到寿命终止所需的等效完整循环数
+            cycle_life = capacity_budget * totals["equivalent_full_cycles"] / cycle_fade
+            estimate["estimated_cycle_life_efc"] = int(round(cycle_life))
+            estimate["estimated_lifetime_throughput_gwh"] = round(SYSTEM_DESIGN_CAPACITY_KWH * cycle_life / 1e6, 4)
+        else:
+            estimate["estimated_cycle_life_efc"] = "无法计算 (未检测到SOC循环)"
+            estimate["estimated_lifetime_throughput_gwh"] = "无法计算 (未检测到SOC循环)"
+        annual_fade = cycle_fade / years + model['calendar_fade_per_year'] if years > 0 else 0.0
+        if annual_fade > 0:
+            estimate["projected_years_to_end_of_life"] = round(capacity_budget / annual_fade, 2)
+        else:
+            estimate["projected_years_to_end_of_life"] = "无法计算 (观测时长为0或衰减率为0)"
+        return estimate
+
+# --- 执行调度: 将CPU密集计算移出MCP事件循环 ---
+
+class _ComputeCancelled(Exception):
+    """(新增) 请求被客户端取消或超时后, 计算在检查点处主动终止"""
+
+class _ComputeRejected(Exception):
+    """(新增) 并发与排队名额均已占满, 拒绝新的计算请求"""
+
+def _raise_if_cancelled(cancel_event: threading.Event) -> None:
+    """(新增) 协作式取消的检查点: 在分析阶段之间调用"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise _ComputeCancelled()
+
+class _ComputeScheduler:
+    """
+    (新增) 有界并发的计算调度器: 计算在专用线程池中执行, 事件循环保持响应。
+    超过并发上限的请求在线程池队列中排队, 排队数超过上限时直接拒绝;
+    超时或客户端取消时设置取消标志, 计算在下一个检查点终止, 尚未开始的请求直接出队。
     """
+
+    def __init__(self, max_concurrent: int, max_queued: int, timeout_seconds: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='battery-compute')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    async def run(self, func, *args, timeout_seconds: float = None) -> Any:
+        """在线程池中执行 func(*args, cancel_event), 等待结果期间不阻塞事件循环"""
+        with self._lock:
+            if self._in_flight >= self.max_concurrent + self.max_queued:
+                raise _ComputeRejected(f"服务繁忙: 已有 {self._in_flight} 个分析任务在执行或排队, 请稍后重试")
+            self._in_flight += 1
+
+        cancel_event = threading.Event()
+        future = self._executor.submit(func, *args, cancel_event)
+        # 名额在计算真正结束(或出队)后才释放
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout_seconds or self.timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            cancel_event.set()
+            future.cancel()
+            raise
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+_compute_scheduler = _ComputeScheduler(
+    max_concurrent=int(os.environ.get('BATTERY_MAX_CONCURRENT_RUNS', 2)),
+    max_queued=int(os.environ.get('BATTERY_MAX_QUEUED_RUNS', 8)),
+    timeout_seconds=float(os.environ.get('BATTERY_RUN_TIMEOUT_SECONDS', 300))
+)
+
+async def _run_scheduled(func, *args, timeout_seconds: float = None) -> Dict[str, Any]:
+    """(新增) 通过调度器执行分析, 并将排队拒绝和超时转换为错误信息; 客户端取消时继续向上抛出"""
     try:
-        df = pd.read_csv(file_path)
-        df['时间戳'] = pd.to_datetime(df['时间戳'])
+        return await _compute_scheduler.run(func, *args, timeout_seconds=timeout_seconds)
+    except _ComputeRejected as e:
+        return {"error": str(e)}
+    except asyncio.TimeoutError:
+        return {"error": f"分析超时: 超过 {timeout_seconds or _compute_scheduler.timeout_seconds} 秒仍未完成, 已取消分析"}
+
+# --- 诊断: 可选的分阶段计时、内存高水位与性能剖析 ---
+
+_diagnostics_logger = logging.getLogger('battery.diagnostics')
+# 设置后每个请求的诊断记录都以一行JSON写入日志 (MCP stdio 模式下输出到标准错误)
+_DIAGNOSTICS_LOG_ENABLED = os.environ.get('BATTERY_DIAGNOSTICS_LOG', '').lower() in ('1', 'true', 'yes')
+# cProfile 在 Python 3.12+ 基于 sys.monitoring, 同一时刻只能有一个剖析器, 并发请求中只剖析其一
+_profile_lock = threading.Lock()
+
+def _max_rss_bytes() -> Optional[int]:
+    """(新增) 进程常驻内存的高水位 (字节); 平台不支持时返回None"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KiB 为单位, macOS 以字节为单位
+    return int(max_rss if sys.platform == 'darwin' else max_rss * 1024)
+
+class _StageDiagnostics:
+    """
+    (新增) 一次请求的分阶段诊断记录: 各阶段的墙钟时间、计算线程CPU时间、处理量(行数、列数等)
+    与进程内存高水位; 若进程已启用 tracemalloc (如 PYTHONTRACEMALLOC=1), 另记录各阶段的Python分配峰值。
+    未启用时 stage() 不做任何测量, 计算流程无需区分两种情况。
+    """
+
+    def __init__(self, include_in_report: bool, profile: bool):
+        self.include_in_report = include_in_report
+        self.log = _DIAGNOSTICS_LOG_ENABLED
+        self.profile = profile
+        self.enabled = include_in_report or profile or self.log
+        self.stages = []
+        self.created_at = time.perf_counter()
+        self.queue_wait_s = None
+        self.profile_result = None
+        self._profiler = None
+
+    @contextmanager
+    def stage(self, name: str, **counts):
+        """记录一个阶段; 可在阶段内向产出的字典写入处理量或缓存命中等附加信息"""
+        record = dict(counts)
+        if not self.enabled:
+            yield record
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            entry = {
+                "stage": name,
+                "wall_time_s": round(time.perf_counter() - wall_start, 6),
+                "cpu_time_s": round(time.thread_time() - cpu_start, 6),
+                **record,
+                "max_rss_bytes": _max_rss_bytes()
+            }
+            if tracing:
+                entry["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(entry)
+
+    def wrap(self, func):
+        """包装调度器执行的计算函数: 记录排队时长, 按需剖析, 并在结果中附加诊断信息"""
+        def run(*args):
+            if not self.enabled:
+                return func(*args)
+            self.queue_wait_s = round(time.perf_counter() - self.created_at, 6)
+            self._start_profile()
+            try:
+                try:
+                    result = func(*args)
+                finally:
+                    self._stop_profile()
+            except _ComputeCancelled:
+                self._emit("cancelled")
+                raise
+            if isinstance(result, dict):
+                # 估算响应体积与序列化耗时 (MCP框架随后会再序列化一次)
+                with self.stage('serialization') as info:
+                    info['payload_bytes'] = len(json.dumps(result, ensure_ascii=False, default=str).encode('utf-8'))
+            report = self._emit("error" if isinstance(result, dict) and 'error' in result else "ok")
+            if self.include_in_report and isinstance(result, dict):
+                result["_diagnostics"] = report
+            return result
+        return run
+
+    def _start_profile(self) -> None:
+        if not self.profile:
+            return
+        if not _profile_lock.acquire(blocking=False):
+            self.profile_result = {"error": "已有其他请求正在进行性能剖析, 本次未采集"}
+            return
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError as e:
+            # 其他剖析工具 (如调试器) 已占用 sys.monitoring
+            self._profiler = None
+            _profile_lock.release()
+            self.profile_result = {"error": f"无法启动性能剖析: {e}"}
+
+    def _stop_profile(self) -> None:
+        if self._profiler is None:
+            return
+        try:
+            self._profiler.disable()
+        finally:
+            _profile_lock.release()
+        profile_dir = os.environ.get('BATTERY_PROFILE_DIR') or tempfile.gettempdir()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"battery-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{id(self):x}.prof")
+        self._profiler.dump_stats(path)
+        stats = pstats.Stats(self._profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:20]
+        self.profile_result = {
+            "path": path,
+            "top_cumulative": [
+                {"function": f"{os.path.basename(filename)}:{line}({name})", "calls": calls,
+                 "total_time_s": round(total_time, 6), "cumulative_time_s": round(cumulative_time, 6)}
+                for (filename, line, name), (_, calls, total_time, cumulative_time, _) in top
+            ]
+        }
+        self._profiler = None
+
+    def _emit(self, status: str) -> Dict[str, Any]:
+        report = {
+            "status": status,
+            "queue_wait_s": self.queue_wait_s,
+            "total_wall_time_s": round(time.perf_counter() - self.created_at, 6),
+            "stages": self.stages
+        }
+        if self.profile_result is not None:
+            report["profile"] = self.profile_result
+        if self.log:
+            _diagnostics_logger.info(json.dumps(report, ensure_ascii=False, default=str))
+        return report
+
+# --- 解析缓存: 将CSV日志转为按列存储的内存映射文件, 重复分析时跳过CSV解析 ---
+
+_cache_logger = logging.getLogger('battery.cache')
+# 缓存目录与总大小上限, 上限设为0时不使用缓存
+_CACHE_DIR = os.environ.get('BATTERY_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'battery_log_cache')
+_CACHE_MAX_BYTES = int(float(os.environ.get('BATTERY_CACHE_MAX_MB', 2048)) * 2**20)
+_CACHE_MANIFEST = 'manifest.json'
+_CACHE_FORMAT_VERSION = 1
+# 写入中断留下的临时目录超过该时长后在淘汰时清理
+_CACHE_STALE_TEMP_SECONDS = 3600
+
+def _cache_key(file_path: str) -> Optional[str]:
+    """
+    (新增) 缓存条目名: 路径摘要-(大小, 修改时间)摘要。文件被修改后旧条目不再命中, 并在新条目写入时删除;
+    文件不存在时返回None, 由读取CSV时报告错误。
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    path_digest = hashlib.sha256(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    version_digest = hashlib.sha256(f"{_CACHE_FORMAT_VERSION}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    return f"{path_digest}-{version_digest}"
+
+def _cacheable_dtype(dtype) -> bool:
+    """(新增) 只有定长的数值、布尔与无时区时间列可以内存映射; 含文本列的日志不缓存"""
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufM'
+
+def _open_cached_log(key: str) -> Optional['pd.DataFrame']:
+    """(新增) 以内存映射方式打开缓存条目, 各列直接引用映射的数组, 不复制数据; 条目不存在或不完整时返回None"""
+    entry = os.path.join(_CACHE_DIR, key)
+    try:
+        with open(os.path.join(entry, _CACHE_MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        rows = manifest['rows']
+        columns = {}
+        for i, column in enumerate(manifest['columns']):
+            dtype = np.dtype(column['dtype'])
+            path = os.path.join(entry, f"c{i}.bin")
+            if os.path.getsize(path) != rows * dtype.itemsize:
+                raise ValueError(f"列文件大小与行数不符: {path}")
+            columns[column['name']] = np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+        os.utime(os.path.join(entry, _CACHE_MANIFEST))  # 记录最近使用时间, 供淘汰参考
     except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        _cache_logger.warning("缓存条目 %s 无法读取, 已删除: %s", key, e)
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+    return pd.DataFrame(columns, copy=False)
+
+class _LogCacheWriter:
+    """
+    (新增) 将解析后的数据块逐列追加写入临时目录, commit() 时原子地改名为缓存条目。
+    遇到不可缓存的列类型、各块列类型不一致或超过缓存上限时放弃写入, 不影响本次分析。
+    """
+
+    def __init__(self, key: str, source_file: str):
+        self.key = key
+        self.source_file = source_file
+        self.rows = 0
+        self.bytes = 0
+        self._columns = None
+        self._files = []
+        self._temp_dir = os.path.join(_CACHE_DIR, f".tmp-{os.getpid()}-{threading.get_ident()}-{key}")
+        self.active = True
+
+    def append(self, chunk: 'pd.DataFrame') -> None:
+        if not self.active:
+            return
+        try:
+            if self._columns is None:
+                if not all(_cacheable_dtype(dtype) for dtype in chunk.dtypes):
+                    self.abort()
+                    return
+                self._columns = [(column, chunk[column].dtype) for column in chunk.columns]
+                os.makedirs(self._temp_dir, exist_ok=True)
+                self._files = [open(os.path.join(self._temp_dir, f"c{i}.bin"), 'wb') for i in range(len(self._columns))]
+            if [(column, chunk[column].dtype) for column in chunk.columns] != self._columns:
+                self.abort()
+                return
+            for f, (column, _) in zip(self._files, self._columns):
+                values = np.ascontiguousarray(chunk[column].to_numpy())
+                values.tofile(f)
+                self.bytes += values.nbytes
+            self.rows += len(chunk)
+            if self.bytes > _CACHE_MAX_BYTES:
+                self.abort()
+        except (OSError, ValueError) as e:
+            _cache_logger.warning("写入缓存失败, 本次不缓存 '%s': %s", self.source_file, e)
+            self.abort()
+
+    def commit(self) -> None:
+        if not self.active:
+            return
+        if self._columns is None or self.rows == 0:
+            self.abort()
+            return
+        entry = os.path.join(_CACHE_DIR, self.key)
+        try:
+            for f in self._files:
+                f.close()
+            manifest = {
+                "format_version": _CACHE_FORMAT_VERSION,
+                "source_file": os.path.abspath(self.source_file),
+                "rows": self.rows,
+                "columns": [{"name": column, "dtype": dtype.str} for column, dtype in self._columns]
+            }
+            with open(os.path.join(self._temp_dir, _CACHE_MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.rename(self._temp_dir, entry)
+        except OSError as e:
+            # 并发请求已写入同一条目时改名失败, 直接使用已有条目
+            if not os.path.isdir(entry):
+                _cache_logger.warning("写入缓存失败, 本次不缓存 '%s': %s", self.source_file, e)
+            self.abort()
+            return
+        self.active = False
+        _evict_log_cache(keep=self.key)
+
+    def abort(self) -> None:
+        self.active = False
+        for f in self._files:
+            f.close()
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+def _evict_log_cache(keep: str) -> None:
+    """(新增) 删除同一文件的旧版本条目, 并按最近使用时间淘汰条目直至总大小不超过 BATTERY_CACHE_MAX_MB"""
+    entries = []
+    total_kept = 0
+    now = time.time()
+    with os.scandir(_CACHE_DIR) as it:
+        for item in it:
+            if not item.is_dir():
+                continue
+            try:
+                if item.name.startswith('.tmp-'):
+                    if now - item.stat().st_mtime > _CACHE_STALE_TEMP_SECONDS:
+                        shutil.rmtree(item.path, ignore_errors=True)
+                    continue
+                if item.name != keep and item.name.split('-')[0] == keep.split('-')[0]:
+                    shutil.rmtree(item.path, ignore_errors=True)
+                    continue
+                with os.scandir(item.path) as files:
+                    size = sum(f.stat().st_size for f in files)
+                last_used = os.stat(os.path.join(item.path, _CACHE_MANIFEST)).st_mtime
+            except OSError:
+                continue
+            if item.name != keep:
+                entries.append((last_used, size, item.path))
+            else:
+                total_kept = size
+
+    total = total_kept + sum(size for _, size, _ in entries)
+    # 当前条目保留, 其余按最近使用时间从旧到新淘汰
+    for _, size, path in sorted(entries):
+        if total <= _CACHE_MAX_BYTES:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def _read_battery_log(file_path: str, use_cache: bool) -> tuple:
+    """(新增) 读取整张日志表并解析时间戳; 命中缓存时直接内存映射。返回 (DataFrame, 是否命中缓存)"""
+    key = _cache_key(file_path) if use_cache and _CACHE_MAX_BYTES > 0 else None
+    if key is not None:
+        cached = _open_cached_log(key)
+        if cached is not None:
+            return cached, True
+    df = pd.read_csv(file_path)
+    df['时间戳'] = pd.to_datetime(df['时间戳'])
+    if key is not None:
+        writer = _LogCacheWriter(key, file_path)
+        writer.append(df)
+        writer.commit()
+    return df, False
+
+def _open_battery_log_chunks(file_path: str, chunk_rows: int, use_cache: bool) -> tuple:
+    """
+    (新增) 分块读取日志并解析时间戳; 命中缓存时按行切片内存映射的表, 未命中时边读边写入缓存,
+    全部读完才提交, 中途取消或出错时放弃写入。返回 (数据块迭代器, 是否命中缓存)
+    """
+    key = _cache_key(file_path) if use_cache and _CACHE_MAX_BYTES > 0 else None
+    cached = _open_cached_log(key) if key is not None else None
+    if cached is not None:
+        return (cached.iloc[start:start + chunk_rows] for start in range(0, len(cached), chunk_rows)), True
+
+    def read_chunks():
+        writer = _LogCacheWriter(key, file_path) if key is not None else None
+        try:
+            for chunk in pd.read_csv(file_path, chunksize=chunk_rows):
+                chunk['时间戳'] = pd.to_datetime(chunk['时间戳'])
+                if writer is not None:
+                    writer.append(chunk)
+                yield chunk
+            if writer is not None:
+                writer.commit()
+        finally:
+            if writer is not None and writer.active:
+                writer.abort()
+
+    return read_chunks(), False
+
+# 超过该大小的文件默认以流式模式分块读取
+_STREAMING_THRESHOLD_BYTES = int(float(os.environ.get('BATTERY_STREAMING_THRESHOLD_MB', 256)) * 2**20)
+_DEFAULT_CHUNK_ROWS = int(os.environ.get('BATTERY_CHUNK_ROWS', 200000))
+
+def _load_error(file_path: str, error: Exception) -> Dict[str, str]:
+    """(新增) 将读取/解析CSV时的异常转换为错误信息"""
+    if isinstance(error, FileNotFoundError):
         return {"error": f"文件未找到: '{file_path}'。请确保文件路径正确且程序有权限访问。"}
-    except KeyError:
+    if isinstance(error, KeyError):
         return {"error": f"CSV文件缺少必需的 '时间戳' 列。"}
+    return {"error": f"从文件 '{file_path}' 加载或解析数据失败: {error}. 请检查文件格式是否为标准CSV。"}
+
+def _analyze_battery_stream(file_path: str, chunk_rows: int, response_options: Dict[str, Any],
+                            series_options: Optional[Dict[str, Any]], use_cache: bool, diagnostics: _StageDiagnostics,
+                            cancel_event: threading.Event) -> Dict[str, Any]:
+    """(新增) 流式模式: 按 chunk_rows 行分块读取CSV并并入在线累加器, 内存占用与文件大小无关"""
+    accumulator = None
+    try:
+        with diagnostics.stage('stream', chunk_rows=chunk_rows) as info:
+            chunks, cache_hit = _open_battery_log_chunks(file_path, chunk_rows, use_cache)
+            for chunk in chunks:
+                if accumulator is None:
+                    accumulator = _BatteryStreamAccumulator(chunk.columns, response_options, series_options)
+                accumulator.update(chunk)
+                _raise_if_cancelled(cancel_event)
+            info.update(rows=accumulator.rows if accumulator else 0, chunks=accumulator.chunks if accumulator else 0,
+                        file_bytes=os.path.getsize(file_path), cache_hit=cache_hit)
+    except _ComputeCancelled:
+        raise
+    except Exception as e:
+        return _load_error(file_path, e)
+    if accumulator is None or accumulator.rows == 0:
+        return {"error": f"文件 '{file_path}' 中没有数据行。"}
+
+    with diagnostics.stage('finalize'):
+        return accumulator.finalize(file_path)
+
+def _analyze_battery_file(file_path: str, streaming: bool, chunk_rows: int, response_options: Dict[str, Any],
+                          series_options: Optional[Dict[str, Any]], use_cache: bool, diagnostics: _StageDiagnostics,
+                          cancel_event: threading.Event) -> Dict[str, Any]:
+    """
+    (新增) 电池性能分析的完整计算流程, 在调度器线程中执行, 各阶段之间检查取消标志; 启用诊断时逐阶段记录耗时与处理量。
+    streaming 为None时, 超过 BATTERY_STREAMING_THRESHOLD_MB 的文件自动使用流式模式。
+    """
+    if streaming is None:
+        streaming = os.path.isfile(file_path) and os.path.getsize(file_path) > _STREAMING_THRESHOLD_BYTES
+    if streaming:
+        return _analyze_battery_stream(file_path, chunk_rows or _DEFAULT_CHUNK_ROWS, response_options, series_options,
+                                      use_cache, diagnostics, cancel_event)
+
+    try:
+        with diagnostics.stage('load') as info:
+            df, cache_hit = _read_battery_log(file_path, use_cache)
+            info.update(rows=len(df), columns=len(df.columns), file_bytes=os.path.getsize(file_path), cache_hit=cache_hit)
     except Exception as e:
-        return {"error": f"从文件 '{file_path}' 加载或解析数据失败: {e}. 请检查文件格式是否为标准CSV。"}
+        return _load_error(file_path, e)
+    if df.empty:
+        return {"error": f"文件 '{file_path}' 中没有数据行。"}
 
+    _raise_if_cancelled(cancel_event)
     analysis_results = {}
 
     analysis_results["source_file"] = file_path    
-    energy_capacity = _calculate_energy_capacity(df)
-    analysis_results["energy_capacity_kwh"] = energy_capacity
-    
-    analysis_results["system_power_rating_kw"] = SYSTEM_MAX_POWER_KW
-    analysis_results["round_trip_efficiency_percent"] = _calculate_round_trip_efficiency(df)
- 
-    analysis_results["energy_density"] = _calculate_energy_density(energy_capacity)
-    analysis_results["power_density"] = _calculate_power_density()
+    with diagnostics.stage('capacity_and_efficiency'):
+        energy_capacity = _calculate_energy_capacity(df)
+        analysis_results["energy_capacity_kwh"] = energy_capacity
+        
+        analysis_results["system_power_rating_kw"] = SYSTEM_MAX_POWER_KW
+        analysis_results["round_trip_efficiency_percent"] = _calculate_round_trip_efficiency(df)
+     
+        analysis_results["energy_density"] = _calculate_energy_density(energy_capacity)
+        analysis_results["power_density"] = _calculate_power_density()
   
-    analysis_results["average_response_time_s"] = _calculate_average_response_time(df)
-    analysis_results["max_ramp_rate_kw_per_s"] = _calculate_ramp_rate(df)
-    analysis_results["c_rate"] = _calculate_c_rate(df)
+    with diagnostics.stage('response_time'):
+        analysis_results.update(_calculate_response_metrics(df, response_options))
+    _raise_if_cancelled(cancel_event)
+    with diagnostics.stage('ramp_and_c_rate'):
+        analysis_results["max_ramp_rate_kw_per_s"] = _calculate_ramp_rate(df)
+        analysis_results["c_rate"] = _calculate_c_rate(df)
     
     if '当前SOC(%)' in df.columns:
         analysis_results["soc_operating_range_percent"] = round(df['当前SOC(%)'].max() - df['当前SOC(%)'].min(), 2)
     else:
         analysis_results["soc_operating_range_percent"] = "无法计算 (缺少 '当前SOC(%)' 列)"
 
-    assumed_cycle_life = int((1 - 0.8) / 0.00004) # 假设80%寿命终止，每圈衰减0.004%
-    analysis_results["assumed_cycle_life"] = assumed_cycle_life
-    analysis_results["assumed_calendar_life_years"] = round((1 - 0.8) / 0.025, 1) # 假设年衰减率2.5%
-    analysis_results["lifetime_power_throughput_gwh"] = round(SYSTEM_DESIGN_CAPACITY_KWH * assumed_cycle_life / 1e6, 4)
-
-    # --- 电气与热力学特性 ---
-    if '系统内部温度(°C)' in df.columns:
-        analysis_results["temperature_characteristics_celsius"] = {
-            'average': round(df['系统内部温度(°C)'].mean(), 2),
-            'min': round(df['系统内部温度(°C)'].min(), 2),
-            'max': round(df['系统内部温度(°C)'].max(), 2)
-        }
-    else:
-        analysis_results["temperature_characteristics_celsius"] = "无法分析 (缺少'系统内部温度(°C)'列)"
-
-    # --- 辅助服务能力评估 (基于数据的简要判断) ---
-    if '电网频率(Hz)' in df.columns and '充电功率(kW)' in df.columns and '放电功率(kW)' in df.columns:
-        # 检查是否存在频率偏低时放电，或频率偏高时充电的情况
-        responsive_instances = df[
-            ((df['电网频率(Hz)'] < 49.95) & (df['放电功率(kW)'] > 10)) |
-            ((df['电网频率(Hz)'] > 50.05) & (df['充电功率(kW)'] > 10))
-        ]
-        analysis_results["frequency_support_capability"] = "检测到潜在的频率响应行为" if not responsive_instances.empty else "未检测到明显频率响应"
-    else:
-        analysis_results["frequency_support_capability"] = "无法评估 (缺少频率或功率数据)"
+    analysis_results.update(_calculate_assumed_lifetime())
+
+    _raise_if_cancelled(cancel_event)
+
+    with diagnostics.stage('thermal_and_ancillary'):
+        # --- 电气与热力学特性 ---
+        if '系统内部温度(°C)' in df.columns:
+            analysis_results["temperature_characteristics_celsius"] = {
+                'average': round(df['系统内部温度(°C)'].mean(), 2),
+                'min': round(df['系统内部温度(°C)'].min(), 2),
+                'max': round(df['系统内部温度(°C)'].max(), 2)
+            }
+        else:
+            analysis_results["temperature_characteristics_celsius"] = "无法分析 (缺少'系统内部温度(°C)'列)"
 
-    analysis_results["voltage_support_capability"] = "无法评估 (需要无功功率数据)"
-    analysis_results["ancillary_service_potential"] = "取决于市场规则和系统的综合性能(功率、能量、响应时间等)"
+        # --- 辅助服务能力评估 (基于数据的简要判断) ---
+        if '电网频率(Hz)' in df.columns and '充电功率(kW)' in df.columns and '放电功率(kW)' in df.columns:
+            # 检查是否存在频率偏低时放电，或频率偏高时充电的情况
+            responsive_instances = df[
+                ((df['电网频率(Hz)'] < 49.95) & (df['放电功率(kW)'] > 10)) |
+                ((df['电网频率(Hz)'] > 50.05) & (df['充电功率(kW)'] > 10))
+            ]
+            analysis_results["frequency_support_capability"] = "检测到潜在的频率响应行为" if not responsive_instances.empty else "未检测到明显频率响应"
+        else:
+            analysis_results["frequency_support_capability"] = "无法评估 (缺少频率或功率数据)"
+
+        analysis_results.update(_SERVICE_NOTES)
+
+    for series in _create_series_accumulators(df.columns, series_options):
+        _raise_if_cancelled(cancel_event)
+        if isinstance(series, _SocCycleAccumulator):
+            with diagnostics.stage('soc_cycles') as info:
+                series.update(df)
+                analysis_results.update(series.finalize())
+                info.update(rows=series.points, reversals=series.reversals)
+        else:
+            with diagnostics.stage('windowed_and_downsampled') as info:
+                series.update(df)
+                analysis_results.update(series.finalize())
+                info.update(window=series.window, downsample_points=series.downsample_points)
 
     return analysis_results
 
+# --- 增量跟踪: 持续追加的日志只解析新增的行 ---
+
+# 同时跟踪的文件数上限, 超出时丢弃最久未访问文件的状态
+_FOLLOW_MAX_FILES = int(os.environ.get('BATTERY_FOLLOW_MAX_FILES', 64))
+# 记录已读部分末尾的若干字节, 用于发现文件被原地改写
+_FOLLOW_SIGNATURE_BYTES = 64
+_follow_states = OrderedDict()
+_follow_states_lock = threading.Lock()
+
+class _FollowState:
+    """
+    (新增) 一个被跟踪文件的增量状态: 已读到的字节偏移、表头与流式累加器 (其中保留了
+    能量计数器首末值、爬坡率与响应检测所需的末尾衔接行)。同一文件的并发请求按顺序更新。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.accumulator = None
+        self.identity = None
+        self.header = b''
+        self.columns = None
+        self.offset = 0
+        self.signature = b''
+
+    def matches(self, f, stat: os.stat_result) -> bool:
+        """文件仍是上次读取的那个文件, 且已读部分未被改写 (轮转、截断或重写后需从头读取)"""
+        if self.accumulator is None or self.identity != (stat.st_dev, stat.st_ino) or stat.st_size < self.offset:
+            return False
+        f.seek(0)
+        if f.read(len(self.header)) != self.header:
+            return False
+        f.seek(self.offset - len(self.signature))
+        return f.read(len(self.signature)) == self.signature
+
+class _ByteRangeReader(io.RawIOBase):
+    """(新增) 只读出文件从当前位置到 end 的字节, 使 pandas 不会读到导出程序尚未写完的末行"""
+
+    def __init__(self, f, end: int):
+        self._f = f
+        self._remaining = end - f.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._f.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+def _last_line_end(f, start: int, end: int) -> int:
+    """(新增) 文件 [start, end) 范围内最后一个换行符之后的位置; 其中没有完整的行时返回 start"""
+    position = end
+    while position > start:
+        block_start = max(start, position - 65536)
+        f.seek(block_start)
+        index = f.read(position - block_start).rfind(b'\n')
+        if index >= 0:
+            return block_start + index + 1
+        position = block_start
+    return start
+
+def _follow_battery_file(state: _FollowState, file_path: str, chunk_rows: int, response_options: Dict[str, Any],
+                         series_options: Optional[Dict[str, Any]], diagnostics: _StageDiagnostics,
+                         cancel_event: threading.Event) -> Dict[str, Any]:
+    """(新增) 在持有 state.lock 时调用: 校验文件身份, 将上次读取位置之后新增的完整行并入累加器"""
+    with open(file_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        restarted = not state.matches(f, stat)
+        with diagnostics.stage('follow', chunk_rows=chunk_rows, restarted=restarted) as info:
+            if restarted:
+                state.reset()
+                f.seek(0)
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    return {"error": f"文件 '{file_path}' 中没有数据行。"}
+                columns = list(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+                if '时间戳' not in columns:
+                    raise KeyError('时间戳')
+                state.identity = (stat.st_dev, stat.st_ino)
+                state.header, state.columns, state.offset = header, columns, len(header)
+                state.accumulator = _BatteryStreamAccumulator(columns, response_options, series_options)
+
+            start = state.offset
+            end = _last_line_end(f, start, stat.st_size)
+            rows_before = state.accumulator.rows
+            if end > start:
+                f.seek(start)
+                reader = io.BufferedReader(_ByteRangeReader(f, end))
+                for chunk in pd.read_csv(reader, header=None, names=state.columns, chunksize=chunk_rows):
+                    chunk['时间戳'] = pd.to_datetime(chunk['时间戳'])
+                    state.accumulator.update(chunk)
+                    _raise_if_cancelled(cancel_event)
+                signature_start = max(0, end - _FOLLOW_SIGNATURE_BYTES)
+                f.seek(signature_start)
+                state.signature = f.read(end - signature_start)
+                state.offset = end
+            progress = {
+                "restarted": restarted,
+                "new_rows": state.accumulator.rows - rows_before,
+                "new_bytes": end - start,
+                "total_rows": state.accumulator.rows,
+                "offset_bytes": state.offset,
+                # 导出程序尚未写完的末行, 下次调用时再读取
+                "pending_bytes": stat.st_size - state.offset
+            }
+            info.update(rows=progress["new_rows"], file_bytes=stat.st_size, new_bytes=progress["new_bytes"])
+
+    if state.accumulator.rows == 0:
+        return {"error": f"文件 '{file_path}' 中没有数据行。"}
+    with diagnostics.stage('finalize'):
+        analysis_results = state.accumulator.finalize(file_path)
+    analysis_results["incremental"] = progress
+    return analysis_results
+
+def _analyze_battery_incremental(file_path: str, chunk_rows: int, response_options: Dict[str, Any],
+                                 series_options: Optional[Dict[str, Any]], diagnostics: _StageDiagnostics,
+                                 cancel_event: threading.Event) -> Dict[str, Any]:
+    """
+    (新增) 增量模式: 每个文件(及响应检测、分时段与循环计数参数)保留一份跟踪状态, 后续调用只解析新追加的行, 耗时与新增数据量成正比;
+    结果与对当前完整文件做流式分析一致。读取中途出错或被取消时丢弃该文件的状态, 下次从头读取。
+    """
+    key = (os.path.abspath(file_path), json.dumps([response_options, series_options], sort_keys=True))
+    with _follow_states_lock:
+        state = _follow_states.pop(key, None) or _FollowState()
+        _follow_states[key] = state
+        while len(_follow_states) > _FOLLOW_MAX_FILES:
+            _follow_states.popitem(last=False)
+
+    with state.lock:
+        try:
+            return _follow_battery_file(state, file_path, chunk_rows or _DEFAULT_CHUNK_ROWS, response_options,
+                                        series_options, diagnostics, cancel_event)
+        except _ComputeCancelled:
+            state.reset()
+            raise
+        except Exception as e:
+            state.reset()
+            return _load_error(file_path, e)
+
+@mcp.tool()
+async def analyze_storage_battery_performance(file_path: str, timeout_seconds: float = None, diagnostics: bool = False,
+                                             profile: bool = False, streaming: bool = None,
+                                             chunk_rows: int = None, response_detection: Dict[str, Any] = None,
+                                             use_cache: bool = True, incremental: bool = False, window: str = None,
+                                             downsample_points: int = None, cycle_counting: bool = False,
+                                             degradation_model: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    一个综合性的储能电池性能分析工具。
+    它接收一个CSV文件的【路径】，执行一系列性能指标计算，并返回一个包含所有分析结果的JSON对象。
+
+    分析在独立的计算线程中执行, 不阻塞MCP服务响应其他请求。
+
+    Args:
+        file_path: 指向要分析的CSV文件的本地路径 (例如: "C:/data/battery_log.csv" 或 "/home/user/data.csv")。
+        timeout_seconds: 本次请求的超时时间(秒, 含排队时间), 默认使用服务端配置。
+        diagnostics: 为True时在结果中附加 _diagnostics 字段: 排队时长, 以及数据加载、各项指标计算、序列化
+            各阶段的墙钟/CPU时间、行数/列数与内存高水位。
+        profile: 为True时对本次分析进行cProfile剖析, 剖析文件写入 BATTERY_PROFILE_DIR (默认系统临时目录),
+            路径与累计耗时最高的函数在 _diagnostics.profile 中给出 (隐含 diagnostics=True)。
+        streaming: 为True时分块读取CSV, 以在线累加器计算全部指标, 内存占用与文件大小无关, 结果与整表读取一致;
+            默认超过 BATTERY_STREAMING_THRESHOLD_MB(默认256MB) 的文件自动使用流式模式。
+        chunk_rows: 流式模式每块读取的行数, 默认由 BATTERY_CHUNK_ROWS(默认200000) 配置。
+        response_detection: 指令响应检测参数, 可选键:
+            change_threshold_kw (指令功率变化超过该值视为一次指令变化, 默认1.0),
+            response_threshold (实际功率达到指令功率的该比例视为响应, 默认0.9),
+            window_points / window_seconds (响应搜索窗口, 默认指令变化后5个数据点; 给出秒数时按时间戳计算, 要求时间戳递增),
+            settling_tolerance (调节带宽, 阶跃幅度的比例, 默认0.05),
+            settling_window_points / settling_window_seconds (调节评估窗口, 默认60个数据点, 且不超过下一次指令变化)。
+        use_cache: 为True时按 路径+文件大小+修改时间 复用已解析的按列缓存 (BATTERY_CACHE_DIR), 跳过CSV解析与时间戳转换;
+            首次读取时写入缓存, 总大小超过 BATTERY_CACHE_MAX_MB(默认2048) 时淘汰最久未使用的条目。
+        incremental: 为True时跟踪持续追加的日志: 服务端记住该文件已读到的位置与累加器状态, 再次调用只解析新追加的完整行,
+            结果与流式分析完整文件一致, 并在 incremental 字段中给出新增行数与读取位置; 文件被轮转、截断或改写时自动从头读取。
+            此时忽略 streaming 与 use_cache。
+        window: 给出 "hour"/"day"/"week"/"month" 时在 windowed_metrics 中附加逐时段的指标 (能量容量、往返效率、最大爬坡率、
+            C-rate、SOC工作范围、温度统计与频率响应, 含义与整段分析相同), 用于观察漂移与衰减; 各时段在一次分段归约中算出。
+        downsample_points: 给出时在 downsampled_series 中附加实际功率、SOC与温度曲线的LTTB降采样 (每条不超过该点数), 用于绘图。
+        cycle_counting: 为True时对SOC曲线做雨流计数, 在 soc_cycle_analysis 中给出循环深度直方图、完整/半循环数、
+            等效完整循环数, 以及按放电深度加权的容量衰减估计与寿命外推 (assumed_* 字段仍为固定假设, 不受影响)。
+        degradation_model: 衰减估计参数 (给出时隐含 cycle_counting=True), 可选键:
+            fade_per_full_cycle (参考放电深度下每个完整循环的容量衰减比例, 默认0.00004),
+            reference_dod_percent (参考放电深度, 默认100), dod_exponent (深度指数k, 单个循环衰减 ∝ (深度/参考深度)^k, 默认1.0),
+            calendar_fade_per_year (年日历衰减比例, 默认0.025), end_of_life_capacity (寿命终止时的容量比例, 默认0.8)。
+
+    Returns:
+        一个包含所有分析指标的字典。如果文件未找到或数据加载失败，则返回一个包含错误信息的字典。
+    """
+    if chunk_rows is not None and chunk_rows <= 0:
+        return {"error": f"chunk_rows 必须为正整数, 当前为 {chunk_rows}"}
+    try:
+        response_options = _resolve_response_options(response_detection)
+        series_options = _resolve_series_options(window, downsample_points, cycle_counting, degradation_model)
+    except ValueError as e:
+        return {"error": str(e)}
+    stage_diagnostics = _StageDiagnostics(include_in_report=diagnostics or profile, profile=profile)
+    if incremental:
+        return await _run_scheduled(stage_diagnostics.wrap(_analyze_battery_incremental), file_path, chunk_rows,
+                                    response_options, series_options, stage_diagnostics, timeout_seconds=timeout_seconds)
+    return await _run_scheduled(stage_diagnostics.wrap(_analyze_battery_file), file_path, streaming, chunk_rows,
+                                response_options, series_options, use_cache, stage_diagnostics,
+                                timeout_seconds=timeout_seconds)
+
+# --- 机组群分析: 多个日志文件分发到进程池并行分析, 汇总机组群指标 ---
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+# 稳健z分数 (基于中位数与MAD) 超过该值的机组指标视为离群
+_FLEET_OUTLIER_THRESHOLD = 3.5
+# 参与离群检测的指标: 名称 -> 从单机组结果中取值的路径
+_FLEET_OUTLIER_METRICS = {
+    "energy_capacity_kwh": ("energy_capacity_kwh",),
+    "round_trip_efficiency_percent": ("round_trip_efficiency_percent",),
+    "average_response_time_s": ("average_response_time_s",),
+    "max_ramp_rate_kw_per_s": ("max_ramp_rate_kw_per_s",),
+    "max_temperature_celsius": ("temperature_characteristics_celsius", "max")
+}
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """
+    (新增) 获取共享的进程池。进程池按CPU核心数一次性创建, 并发请求共用, 不随单个请求的 workers 重建或关闭
+    (各请求自行限制在途文件数); 只在进程池损坏 (工作进程异常退出) 后重建。
+    调度器线程运行时 fork 会把其他线程持有的锁复制进子进程, 因此以 forkserver (不支持时 spawn) 启动工作进程。
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None or getattr(_process_pool, '_broken', False):
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context(method))
+        return _process_pool
+
+def _resolve_fleet_files(path: str) -> list:
+    """(新增) 目录取其中全部 .csv 文件 (不含子目录), 否则按glob模式匹配 (支持 ** 递归), 按路径排序"""
+    if os.path.isdir(path):
+        path = os.path.join(path, '*.csv')
+    return sorted(file for file in glob.glob(path, recursive=True) if os.path.isfile(file))
+
+def _analyze_fleet_unit(file_path: str, streaming: bool, chunk_rows: int, response_options: Dict[str, Any],
+                        use_cache: bool) -> Dict[str, Any]:
+    """(新增) 在工作进程中分析单个机组的日志, 与单文件工具使用同一计算流程; 任何异常都只影响该机组"""
+    try:
+        return _analyze_battery_file(file_path, streaming, chunk_rows, response_options, None, use_cache,
+                                     _StageDiagnostics(include_in_report=False, profile=False), threading.Event())
+    except Exception as e:
+        return {"error": f"分析文件 '{file_path}' 时发生未知错误: {e}"}
+
+def _metric_value(result: Dict[str, Any], path: tuple) -> Optional[float]:
+    """(新增) 按路径取出数值指标; 指标缺失或为"无法计算"等说明时返回None"""
+    value = result
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    # 整数值的能量计数器得到 numpy 整数, 先转换为原生类型
+    value = _convert_to_python_type(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        return None
+    return float(value)
+
+def _fleet_distribution(values: list) -> Union[Dict[str, float], str]:
+    """(新增) 机组群内某项指标的分布"""
+    if not values:
+        return "无法计算 (无有效机组数据)"
+    values = np.asarray(values)
+    return {
+        "count": len(values),
+        "mean": round(float(values.mean()), 3),
+        "min": round(float(values.min()), 3),
+        "p5": round(float(np.percentile(values, 5)), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+def _fleet_extreme(units: list, path: tuple, pick) -> Union[Dict[str, Any], str]:
+    """(新增) 某项指标最差的机组"""
+    candidates = [(value, unit["source_file"]) for unit in units if (value := _metric_value(unit, path)) is not None]
+    if not candidates:
+        return "无法计算 (无有效机组数据)"
+    value, source_file = pick(candidates)
+    return {"source_file": source_file, "value": round(value, 3)}
+
+def _fleet_outliers(units: list, threshold: float) -> list:
+    """(新增) 以稳健z分数 0.6745 × (x - 中位数) / MAD 标记各项指标偏离机组群的机组; MAD为0的指标不判断"""
+    outliers = []
+    for metric, path in _FLEET_OUTLIER_METRICS.items():
+        observed = [(value, unit["source_file"]) for unit in units if (value := _metric_value(unit, path)) is not None]
+        if len(observed) < 3:
+            continue
+        values = np.array([value for value, _ in observed])
+        median = np.median(values)
+        mad = np.median(np.abs(values - median))
+        if mad == 0:
+            continue
+        scores = 0.6745 * (values - median) / mad
+        for (value, source_file), score in zip(observed, scores):
+            if abs(score) > threshold:
+                outliers.append({"source_file": source_file, "metric": metric, "value": round(value, 3),
+                                 "fleet_median": round(float(median), 3), "robust_z": round(float(score), 2)})
+    return sorted(outliers, key=lambda item: -abs(item["robust_z"]))
+
+def _summarize_fleet(units: list, outlier_threshold: float) -> Dict[str, Any]:
+    """(新增) 机组群汇总: 关键指标分布、最差机组与离群机组"""
+    def distribution(path: tuple) -> Union[Dict[str, float], str]:
+        return _fleet_distribution([value for unit in units if (value := _metric_value(unit, path)) is not None])
+
+    return {
+        "round_trip_efficiency_percent": distribution(("round_trip_efficiency_percent",)),
+        "energy_capacity_kwh": distribution(("energy_capacity_kwh",)),
+        "average_response_time_s": distribution(("average_response_time_s",)),
+        "soc_operating_range_percent": distribution(("soc_operating_range_percent",)),
+        "worst_case_temperature_celsius": _fleet_extreme(units, ("temperature_characteristics_celsius", "max"), max),
+        "lowest_round_trip_efficiency_percent": _fleet_extreme(units, ("round_trip_efficiency_percent",), min),
+        "slowest_average_response_time_s": _fleet_extreme(units, ("average_response_time_s",), max),
+        "slowest_response_time_p95_s": _fleet_extreme(units, ("response_time_distribution", "response_time_s", "p95"), max),
+        "outliers": _fleet_outliers(units, outlier_threshold)
+    }
+
+def _analyze_battery_fleet(files: list, workers: int, streaming: bool, chunk_rows: int, response_options: Dict[str, Any],
+                           use_cache: bool, include_units: bool, outlier_threshold: float,
+                           cancel_event: threading.Event) -> Dict[str, Any]:
+    """
+    (新增) 机组群分析的完整计算流程, 在调度器线程中执行。同时在途的文件数不超过工作进程数, 内存占用随进程数而非文件数增长;
+    单个文件读取失败、计算出错或工作进程异常退出时只记入该文件的错误, 其余文件照常分析。
+    """
+    results = {}
+    if workers > 1 and len(files) > 1:
+        workers = min(workers, len(files))
+        pool = _get_process_pool()
+        pending = {}
+        queued = deque(files)
+        # 工作进程异常退出时在途的文件都会失败, 无法确定是哪个文件导致; 这些文件随后在重建的进程池中逐个单独重试
+        suspects = deque()
+        isolated = set()
+        try:
+            while queued or suspects or pending:
+                while queued or suspects:
+                    if suspects:
+                        if pending:
+                            break
+                        file_path = suspects.popleft()
+                        isolated.add(file_path)
+                    elif len(pending) < workers:
+                        file_path = queued.popleft()
+                    else:
+                        break
+                    try:
+                        pending[pool.submit(_analyze_fleet_unit, file_path, streaming, chunk_rows, response_options,
+                                            use_cache)] = file_path
+                    except BrokenProcessPool:
+                        (suspects if file_path in isolated else queued).appendleft(file_path)
+                        isolated.discard(file_path)
+                        pool = _get_process_pool()
+                        break
+                    except Exception as e:
+                        # 提交失败 (如服务退出时进程池已关闭) 只记入该文件的错误
+                        isolated.discard(file_path)
+                        results[file_path] = {"error": f"分析文件 '{file_path}' 时无法提交到进程池: {e}"}
+                        continue
+                    if file_path in isolated:
+                        break
+                if not pending:
+                    continue
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                _raise_if_cancelled(cancel_event)
+                for future in done:
+                    file_path = pending.pop(future)
+                    try:
+                        results[file_path] = future.result()
+                    except BrokenProcessPool as e:
+                        if file_path in isolated:
+                            results[file_path] = {"error": f"分析文件 '{file_path}' 时工作进程异常退出 (可能内存不足): {e}"}
+                        else:
+                            suspects.append(file_path)
+                        pool = _get_process_pool()
+                    except Exception as e:
+                        results[file_path] = {"error": f"分析文件 '{file_path}' 时发生未知错误: {e}"}
+        except _ComputeCancelled:
+            for future in pending:
+                future.cancel()
+            raise
+    else:
+        for file_path in files:
+            _raise_if_cancelled(cancel_event)
+            results[file_path] = _analyze_fleet_unit(file_path, streaming, chunk_rows, response_options, use_cache)
+
+    units = [{"source_file": file_path, **results[file_path]} for file_path in files if "error" not in results[file_path]]
+    report = {
+        "num_files": len(files),
+        "num_analyzed": len(units),
+        "num_failed": len(files) - len(units),
+        "workers": min(workers, len(files)),
+        "fleet_summary": _summarize_fleet(units, outlier_threshold),
+        "errors": [{"source_file": file_path, "error": results[file_path]["error"]}
+                   for file_path in files if "error" in results[file_path]]
+    }
+    if include_units:
+        report["units"] = units
+    return report
+
+@mcp.tool()
+async def analyze_battery_fleet(path: str, workers: Union[int, str] = "auto", timeout_seconds: float = None,
+                                streaming: bool = None, chunk_rows: int = None,
+                                response_detection: Dict[str, Any] = None, use_cache: bool = True,
+                                include_units: bool = True, outlier_threshold: float = _FLEET_OUTLIER_THRESHOLD) -> Dict[str, Any]:
+    """
+    机组群电池性能分析工具。对一个目录(其中全部 .csv 文件)或glob模式(如 "/data/site_*/bms_*.csv", 支持 ** 递归)
+    匹配到的每个机组日志, 在进程池中并行执行与 analyze_storage_battery_performance 完全相同的分析,
+    返回各机组的指标以及机组群汇总。
+
+    Args:
+        path: 日志目录或glob模式。
+        workers: 并行进程数, 默认 "auto" 使用全部CPU核心; 为1时在计算线程中逐个分析。
+        timeout_seconds: 本次请求的超时时间(秒, 含排队时间), 默认使用服务端配置。
+        streaming, chunk_rows, response_detection, use_cache: 与 analyze_storage_battery_performance 相同, 应用于每个文件。
+        include_units: 为True(默认)时在 units 中给出各机组的完整分析结果, 机组很多时可设为False只看汇总。
+        outlier_threshold: 离群判断的稳健z分数阈值, 默认3.5。
+
+    Returns:
+        包含 fleet_summary (往返效率、能量容量、平均响应时间、SOC工作范围的分布, 最高温度、最低效率、最慢响应的机组,
+        以及离群机组)、units 与 errors (读取或分析失败的文件及原因) 的字典。
+    """
+    try:
+        workers = (os.cpu_count() or 1) if workers == 'auto' else int(workers)
+    except (TypeError, ValueError):
+        return {"error": f"workers 必须为正整数或 \"auto\", 当前为 {workers}"}
+    if workers <= 0:
+        return {"error": f"workers 必须为正整数或 \"auto\", 当前为 {workers}"}
+    if chunk_rows is not None and chunk_rows <= 0:
+        return {"error": f"chunk_rows 必须为正整数, 当前为 {chunk_rows}"}
+    if not outlier_threshold > 0:
+        return {"error": f"outlier_threshold 必须为正数, 当前为 {outlier_threshold}"}
+    try:
+        response_options = _resolve_response_options(response_detection)
+    except ValueError as e:
+        return {"error": str(e)}
+    files = _resolve_fleet_files(path)
+    if not files:
+        return {"error": f"'{path}' 未匹配到任何日志文件。请提供包含CSV文件的目录或有效的glob模式。"}
+    return await _run_scheduled(_analyze_battery_fleet, files, workers, streaming, chunk_rows, response_options, use_cache,
+                                include_units, outlier_threshold, timeout_seconds=timeout_seconds)
+
 if __name__ == "__main__":
+    # 导入占用GIL, 预热推迟到 initialize 握手之后开始; 延迟为负数时不预热, 完全按需导入
+    warmup_delay = float(os.environ.get('BATTERY_WARMUP_DELAY_SECONDS', 1.0))
+    if warmup_delay >= 0:
+        warmup = threading.Timer(warmup_delay, _warm_up_lazy_modules)
+        warmup.daemon = True
+        warmup.start()
     mcp.run(transport='stdio')
 
     
\ No newline at end of file
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# battery.py 是单文件服务, 测试直接从项目目录导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_battery_log(num_rows: int, seed: int, missing_values: bool = False, integer_columns: bool = False,
+                     drop: tuple = ()) -> pd.DataFrame:
+    """生成带指令阶跃、响应滞后、时间戳跳变与SOC循环的合成运行日志"""
+    rng = np.random.default_rng(seed)
+    steps = rng.choice([1, 1, 1, 2, 0, 400], num_rows)
+    timestamps = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.cumsum(steps), unit='s')
+    command = np.repeat(rng.choice([-400, -200, 0, 200, 400], num_rows // 7 + 1), 7)[:num_rows].astype(float)
+    actual = pd.Series(command).ewm(alpha=0.45).mean().to_numpy() + rng.normal(0, 3, num_rows)
+    discharge, charge = np.clip(actual, 0, None), np.clip(-actual, 0, None)
+    df = pd.DataFrame({
+        '时间戳': timestamps.strftime('%Y-%m-%d %H:%M:%S'),
+        '控制指令功率(kW)': command,
+        '实际输出功率(kW)': actual.round(3),
+        '充电功率(kW)': charge.round(3),
+        '放电功率(kW)': discharge.round(3),
+        '输入总能量(kWh)': (np.cumsum(charge) / 3600).round(4),
+        '输出总能量(kWh)': (np.cumsum(discharge) / 3600 * 0.9).round(4),
+        '当前SOC(%)': (50 + np.cumsum(charge - discharge) / 3600 / 20).round(2),
+        '系统内部温度(°C)': (25 + rng.normal(0, 1, num_rows)).round(1),
+        '电网频率(Hz)': (50 + rng.normal(0, 0.03, num_rows)).round(3)
+    })
+    if integer_columns:
+        # 前半段为整数、后半段为小数: 分块读取时各块的列类型不同
+        df['当前SOC(%)'] = df['当前SOC(%)'].round().astype(int)
+        df['系统内部温度(°C)'] = df['系统内部温度(°C)'].round()
+        df.loc[num_rows // 2:, '系统内部温度(°C)'] += 0.5
+    if missing_values:
+        for column in ('实际输出功率(kW)', '系统内部温度(°C)', '输出总能量(kWh)', '控制指令功率(kW)'):
+            df.loc[rng.choice(num_rows, num_rows // 20, replace=False), column] = np.nan
+    return df.drop(columns=list(drop))
+
+
+@pytest.fixture
+def write_battery_log(tmp_path):
+    def write(name: str = 'battery_log.csv', **options) -> str:
+        path = tmp_path / name
+        make_battery_log(**options).to_csv(path, index=False)
+        return str(path)
+    return write
@@ -0,0 +1,97 @@
+import asyncio
+import math
+
+import pandas as pd
+import pytest
+
+from battery import analyze_storage_battery_performance
+from conftest import make_battery_log
+
+# 同时开启分时段指标、降采样与循环计数, 覆盖流式累加器的全部分支
+SERIES_OPTIONS = dict(window='hour', downsample_points=50, cycle_counting=True)
+
+LOGS = {
+    "complete": dict(num_rows=3000, seed=1),
+    "missing_values": dict(num_rows=3000, seed=2, missing_values=True),
+    "mixed_dtypes": dict(num_rows=3001, seed=3, integer_columns=True),
+    "no_command_or_frequency": dict(num_rows=500, seed=4, drop=('控制指令功率(kW)', '电网频率(Hz)')),
+    "no_power_or_soc": dict(num_rows=3000, seed=7, drop=('实际输出功率(kW)', '当前SOC(%)'))
+}
+
+
+def _analyze(path, **options):
+    return asyncio.run(analyze_storage_battery_performance(path, use_cache=False, **options))
+
+
+def _assert_equivalent(actual, expected, where='result'):
+    """逐字段比较; 浮点数允许求和顺序带来的舍入差异 (温度均值、衰减累计等按块求和)"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and list(actual) == list(expected), where
+        for key in expected:
+            _assert_equivalent(actual[key], expected[key], f"{where}.{key}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), where
+        for index, (left, right) in enumerate(zip(actual, expected)):
+            _assert_equivalent(left, right, f"{where}[{index}]")
+    elif isinstance(expected, float) and not isinstance(actual, bool):
+        assert isinstance(actual, (int, float)), where
+        if math.isnan(expected):
+            assert math.isnan(actual), where
+        else:
+            assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9), where
+    else:
+        assert actual == expected, where
+
+
+def _assert_matches_whole_table(actual, whole, path):
+    """
+    流式/增量结果与整表结果逐字段一致; 降采样曲线在流式模式下先在每块内缩减, 只要求点数与首末点一致,
+    且每个点都是原始数据中的采样点
+    """
+    actual, whole = dict(actual), dict(whole)
+    actual_series = actual.pop('downsampled_series')['series']
+    whole_series = whole.pop('downsampled_series')['series']
+    _assert_equivalent(actual, whole)
+
+    source = pd.read_csv(path)
+    timestamps = pd.to_datetime(source['时间戳']).dt.strftime('%Y-%m-%dT%H:%M:%S')
+    assert list(actual_series) == list(whole_series)
+    for column, series in actual_series.items():
+        expected = whole_series[column]
+        assert len(series['values']) == len(expected['values']), column
+        for index in (0, -1):
+            assert series['timestamps'][index] == expected['timestamps'][index], column
+            assert series['values'][index] == expected['values'][index], column
+        samples = set(zip(timestamps, source[column].round(3)))
+        assert set(zip(series['timestamps'], series['values'])) <= samples, column
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 997, 100000])
+@pytest.mark.parametrize("log", LOGS.values(), ids=LOGS.keys())
+def test_streaming_matches_whole_table(write_battery_log, log, chunk_rows):
+    path = write_battery_log(**log)
+    whole = _analyze(path, streaming=False, **SERIES_OPTIONS)
+    assert 'error' not in whole
+    _assert_matches_whole_table(_analyze(path, streaming=True, chunk_rows=chunk_rows, **SERIES_OPTIONS), whole, path)
+
+
+def test_single_row_chunks_match_whole_table(write_battery_log):
+    path = write_battery_log(num_rows=200, seed=6)
+    whole = _analyze(path, streaming=False, **SERIES_OPTIONS)
+    _assert_matches_whole_table(_analyze(path, streaming=True, chunk_rows=1, **SERIES_OPTIONS), whole, path)
+
+
+def test_incremental_matches_streaming_after_appends(tmp_path):
+    df = make_battery_log(num_rows=3000, seed=5)
+    path = tmp_path / 'live.csv'
+    df.iloc[:1000].to_csv(path, index=False)
+
+    for end in (1000, 1800, 3000):
+        if end > 1000:
+            df.iloc[previous:end].to_csv(path, mode='a', header=False, index=False)
+        followed = _analyze(str(path), incremental=True, chunk_rows=300, **SERIES_OPTIONS)
+        progress = followed.pop('incremental')
+        assert progress['total_rows'] == end
+        assert progress['new_rows'] == end - (previous if end > 1000 else 0)
+        _assert_matches_whole_table(followed, _analyze(str(path), streaming=False, **SERIES_OPTIONS), str(path))
+        previous = end